@@ -5,14 +5,21 @@ import traceback
 from pathlib import Path
 
 import click
+import requests
 
 from apds_pusher import device_auth, filepusher
+from apds_pusher.config_parser import Configuration
+from apds_pusher.daemon import DeploymentDaemon
 from apds_pusher.get_version_info import get_current_version, get_github_tag_info, get_latest_install_command
+from apds_pusher.http_session import create_session
 from apds_pusher.systemlogger import SystemLogger
+from apds_pusher.token_refresher import TokenManager
 from apds_pusher.utils.deployment_utils import (
+    DeploymentSettings,
     check_add_active_deployments,
     check_delete_active_deployments,
     load_configuration_file,
+    write_deployment_settings,
 )
 
 
@@ -45,6 +52,34 @@ def initialise_system_logging() -> None:
     return
 
 
+def login(config: Configuration, session: requests.Session) -> tuple[str, str]:
+    """Follow the Auth device flow to allow a user to log in via a 3rd party system.
+
+    Returns:
+        The access token and refresh token.
+    """
+    device_code_dtls = device_auth.authenticate(config, session)
+
+    # Construct dictionary to hold data presented to end user for Authentication
+    device_code_keys = ["url", "user_code", "expires_in", "device_code", "interval"]
+    device_response = dict(zip(device_code_keys, device_code_dtls, strict=False))
+
+    click.echo(
+        f"URL to authenticate: {device_response['url']} \n"
+        f"User code: {device_response['user_code']} \n"
+        f"Expires in: {device_response['expires_in']} seconds"
+    )
+
+    # Filter dictionary to send necessary keys to get access token
+    response = {
+        key: value for key, value in device_response.items() if key in ["device_code", "interval", "expires_in"]
+    }
+
+    # Send dictionary and config to complete authentication
+    tokens = device_auth.receive_access_token_from_device_code(response, config, session)
+    return tokens["access_token"], tokens["refresh_token"]
+
+
 # pylint: disable=R0917
 def process_deployment(  # pylint: disable=too-many-arguments,too-many-locals
     deployment_id: str,
@@ -55,8 +90,13 @@ def process_deployment(  # pylint: disable=too-many-arguments,too-many-locals
     is_recursive: bool,
     trace_on: bool,
     command: str,
+    register_only: bool = False,
 ) -> None:
-    """Reusable function to handle start and recovery logic."""
+    """Reusable function to handle start and recovery logic.
+
+    With register_only the deployment is only added to the active deployments, to be
+    archived by a running daemon, rather than by this process.
+    """
     config = load_configuration_file(config_file)
 
     print(f"The trace is: {trace_on}")
@@ -66,6 +106,8 @@ def process_deployment(  # pylint: disable=too-many-arguments,too-many-locals
         config.log_file_location,
         config.deployment_location,
         trace=trace_on,
+        flush_interval=config.log_flush_interval,
+        fsync_interval=config.log_fsync_interval,
     )
     s_logger.debug("The system logger for %s has been setup!", deployment_id)
     s_logger.info("Current apds-pusher version: %s", get_current_version())
@@ -75,29 +117,18 @@ def process_deployment(  # pylint: disable=too-many-arguments,too-many-locals
     if result:
         click.echo(f"{command.capitalize()} for deployment id {deployment_id}")
 
-    # Follow the Auth device flow to allow a user to log in via a 3rd party system
-    device_code_dtls = device_auth.authenticate(config)
-
-    # Construct dictionary to hold data presented to end user for Authentication
-    device_code_keys = ["url", "user_code", "expires_in", "device_code", "interval"]
-    device_response = dict(zip(device_code_keys, device_code_dtls, strict=False))
-
-    click.echo(
-        f"URL to authenticate: {device_response['url']} \n"
-        f"User code: {device_response['user_code']} \n"
-        f"Expires in: {device_response['expires_in']} seconds"
-    )
-
-    # Filter dictionary to send necessary keys to get access token
-    response = {
-        key: value for key, value in device_response.items() if key in ["device_code", "interval", "expires_in"]
-    }
+    if register_only:
+        write_deployment_settings(
+            deployment_file,
+            DeploymentSettings(data_directory, command, is_production, is_dry_run, is_recursive),
+        )
+        click.echo(f"Deployment id {deployment_id} registered to be archived by the daemon")
+        return
 
-    # Send dictionary and config to complete authentication
-    tokens = device_auth.receive_access_token_from_device_code(response, config)
+    # One pooled HTTP session is shared by the auth calls and the pusher
+    session = create_session(config)
+    access_token, refresh_token = login(config, session)
     s_logger.debug("Auth setup complete")
-    access_token = tokens["access_token"]
-    refresh_token = tokens["refresh_token"]
 
     # Call the file archival passing the access_token
     try:
@@ -113,13 +144,17 @@ def process_deployment(  # pylint: disable=too-many-arguments,too-many-locals
             deployment_file,
             s_logger,
             command,
+            session=session,
         )
         s_logger.debug(
             "Starting the pusher for %s using data from %s",
             deployment_id,
             data_directory,
         )
-        pusher.run()
+        try:
+            pusher.run()
+        finally:
+            pusher.close()
     except Exception as e_obj:  # pylint: disable=broad-except
         s_logger.debug(
             "An error happened on deploy %s using data from %s",
@@ -205,6 +240,14 @@ def pusher_group(ctx: click.Context, version: bool) -> None:
     show_default=True,
     help="Set app off in trace move (very verbos logging) or not (default is not)",
 )
+@click.option(
+    "--register-only",
+    "register_only",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help="Only register the deployment, for it to be archived by a running daemon.",
+)
 @click.command()
 def start(  # pylint: disable=too-many-arguments, too-many-locals
     *,
@@ -215,6 +258,7 @@ def start(  # pylint: disable=too-many-arguments, too-many-locals
     is_dry_run: bool,
     is_recursive: bool,
     trace_on: bool,
+    register_only: bool,
 ) -> None:
     """Accept command line arguments and passes them to verification function."""
     process_deployment(
@@ -226,6 +270,7 @@ def start(  # pylint: disable=too-many-arguments, too-many-locals
         is_recursive,
         trace_on,
         "NRT",
+        register_only=register_only,
     )
 
 
@@ -311,6 +356,14 @@ def stop(
     show_default=True,
     help="Set app off in trace move (very verbos logging) or not (default is not)",
 )
+@click.option(
+    "--register-only",
+    "register_only",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help="Only register the deployment, for it to be archived by a running daemon.",
+)
 @click.command()
 def recovery(  # pylint: disable=too-many-arguments
     *,
@@ -321,6 +374,7 @@ def recovery(  # pylint: disable=too-many-arguments
     is_dry_run: bool,
     is_recursive: bool,
     trace_on: bool,
+    register_only: bool,
 ) -> None:
     """Accept command line arguments and passes them to verification function."""
     process_deployment(
@@ -332,12 +386,54 @@ def recovery(  # pylint: disable=too-many-arguments
         is_recursive,
         trace_on,
         "Recovery",
+        register_only=register_only,
+    )
+
+
+# to archive every registered deployment from one process
+@click.command()
+@click.option(
+    "--config-file",
+    required=True,
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="Full path to config file used for authentication.",
+)
+@click.option(
+    "-t",
+    "--trace",
+    "trace_on",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help="Set app off in trace move (very verbos logging) or not (default is not)",
+)
+def daemon(config_file: Path, trace_on: bool) -> None:
+    """Archive every deployment registered with --register-only, from one process."""
+    config = load_configuration_file(config_file)
+    deployment_location = config.create_deployment_location()
+
+    s_logger = SystemLogger(
+        "apds-daemon",
+        config.log_file_location,
+        deployment_location,
+        trace=trace_on,
+        flush_interval=config.log_flush_interval,
+        fsync_interval=config.log_fsync_interval,
     )
+    s_logger.info("Current apds-pusher version: %s", get_current_version())
+
+    # One login and one pooled HTTP session are shared by every deployment
+    session = create_session(config)
+    access_token, refresh_token = login(config, session)
+    s_logger.debug("Auth setup complete")
+
+    DeploymentDaemon(config, TokenManager(access_token, refresh_token), session, s_logger, trace=trace_on).run()
 
 
 pusher_group.add_command(start)
 pusher_group.add_command(stop)
 pusher_group.add_command(recovery)
+pusher_group.add_command(daemon)
 
 if __name__ == "__main__":
     pusher_group()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,371 @@
+"""Asyncio transfer engine, an alternative to the thread based requests backend.
+
+The engine runs one event loop in a background thread, on which any number of
+uploads, for any number of deployments, are driven at once without a thread for
+each. It talks HTTP/1.1 to the archive itself, using only the standard library,
+with keep-alive connections pooled per host. Files are read from disk in a
+worker thread a chunk at a time, so the event loop never waits on the disk.
+
+The upload coroutine keeps the contract of its requests based counterpart in
+'send_to_archive': the same results are returned and the same exceptions raised
+for the same responses. Transport failures are raised as
+AsyncTransportError, a ConnectionError, so they are retried like dropped
+connections of the requests backend.
+"""
+
+import asyncio
+import json
+import ssl
+import threading
+from collections import defaultdict
+from collections.abc import Coroutine, Iterable
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, NamedTuple
+from urllib.parse import urlencode, urlsplit
+
+import requests as rq
+
+from apds_pusher.bandwidth import BandwidthLimiter
+from apds_pusher.config_parser import Configuration
+from apds_pusher.http_session import DEFAULT_TIMEOUT
+from apds_pusher.multipart_stream import MultipartFileStream
+from apds_pusher.resumable_upload import ResumableUploadError, UploadProgress, send_resumable_upload
+from apds_pusher.send_to_archive import build_archive_url, check_archive_response
+from apds_pusher.systemlogger import SystemLogger
+
+# Seconds waited for a '100 Continue' before the body is sent regardless
+EXPECT_CONTINUE_TIMEOUT = 1.0
+
+
+class AsyncTransportError(ConnectionError):
+    """Raised when a request could not be sent or its response could not be read."""
+
+
+class AsyncResponse(NamedTuple):
+    """The response to a request made by the AsyncHTTPClient."""
+
+    status_code: int
+    headers: dict[str, str]
+    content: bytes
+
+    @property
+    def ok(self) -> bool:  # pylint: disable=invalid-name
+        """True if the status code is below 400, as with requests."""
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        """The body of the response decoded as text."""
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        """The body of the response decoded as JSON."""
+        return json.loads(self.content)
+
+
+class _Connection(NamedTuple):
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+
+
+class AsyncHTTPClient:
+    """A minimal HTTP/1.1 client keeping a pool of keep-alive connections per host."""
+
+    def __init__(self, max_connections_per_host: int = 10, timeout: tuple[float, float] = DEFAULT_TIMEOUT) -> None:
+        """Set the number of connections, and so requests, allowed at once to each host.
+
+        As with requests, the timeout is a pair of the seconds allowed to open a connection,
+        and the seconds allowed to wait for the host to accept or send data.
+        """
+        self.max_connections_per_host = max_connections_per_host
+        self.connect_timeout, self.read_timeout = timeout
+        self._idle: dict[tuple[str, str, int], list[_Connection]] = defaultdict(list)
+        self._limits: dict[tuple[str, str, int], asyncio.Semaphore] = {}
+        self._ssl_context: ssl.SSLContext | None = None
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        headers: dict[str, str] | None = None,
+        body: bytes | Iterable[bytes] | None = None,
+        params: dict | None = None,
+        expect_continue: bool = False,
+        deadline: float | None = None,
+    ) -> AsyncResponse:
+        """Send a request and read the whole response.
+
+        Args:
+            method: The HTTP method.
+            url: The absolute URL to request.
+            headers: Extra request headers.
+            body: The request body, either bytes or a re-iterable of chunks with a len(),
+                such as a MultipartFileStream, which is read in a worker thread.
+            params: Query parameters added to the URL.
+            expect_continue: Send 'Expect: 100-continue' and wait for the server to accept
+                the request before sending the body, so a refused request costs no upload.
+            deadline: Seconds allowed for the whole request, however quickly data is moving.
+
+        Raises:
+            AsyncTransportError: If the request fails or times out before a response is read.
+        """
+        if params:
+            url += ("&" if urlsplit(url).query else "?") + urlencode(params)
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        host = parts.hostname or ""
+        key = (scheme, host, parts.port or (443 if scheme == "https" else 80))
+        target = parts.path or "/"
+        if parts.query:
+            target += f"?{parts.query}"
+
+        request_headers = {"Host": parts.netloc, "Connection": "keep-alive", "Accept": "*/*"}
+        request_headers.update(headers or {})
+        if body is not None or method in ("POST", "PUT"):
+            request_headers["Content-Length"] = str(len(body) if body is not None else 0)  # type: ignore[arg-type]
+        expect_continue = expect_continue and body is not None
+        if expect_continue:
+            request_headers["Expect"] = "100-continue"
+        head = f"{method} {target} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in request_headers.items())
+        head_bytes = (head + "\r\n").encode("latin-1")
+
+        limit = self._limits.setdefault(key, asyncio.Semaphore(self.max_connections_per_host))
+        async with limit:
+            try:
+                return await asyncio.wait_for(self._send(key, method, head_bytes, body, expect_continue), deadline)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as exc:
+                raise AsyncTransportError(f"{method} {url} failed: {exc!r}") from exc
+
+    # pylint: disable=R0913,R0917
+    async def _send(  # pylint: disable=too-many-arguments
+        self,
+        key: tuple[str, str, int],
+        method: str,
+        head: bytes,
+        body: bytes | Iterable[bytes] | None,
+        expect_continue: bool,
+    ) -> AsyncResponse:
+        """Make the exchange on a pooled connection, or a new one if the pooled one was closed by the host."""
+        connection, reused = await self._acquire(key)
+        try:
+            try:
+                response, reusable = await self._exchange(connection, method, head, body, expect_continue)
+            except (OSError, asyncio.IncompleteReadError):
+                if not reused:
+                    raise
+                connection.writer.close()
+                connection, _ = await self._acquire(key, reuse=False)
+                response, reusable = await self._exchange(connection, method, head, body, expect_continue)
+        except BaseException:
+            connection.writer.close()
+            raise
+
+        if reusable:
+            self._idle[key].append(connection)
+        else:
+            connection.writer.close()
+        return response
+
+    async def _acquire(self, key: tuple[str, str, int], reuse: bool = True) -> tuple[_Connection, bool]:
+        idle = self._idle[key]
+        while reuse and idle:
+            connection = idle.pop()
+            if not connection.reader.at_eof() and not connection.writer.is_closing():
+                return connection, True
+            connection.writer.close()
+
+        scheme, host, port = key
+        if scheme == "https" and self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=self._ssl_context if scheme == "https" else None),
+            self.connect_timeout,
+        )
+        return _Connection(reader, writer), False
+
+    async def _exchange(
+        self,
+        connection: _Connection,
+        method: str,
+        head: bytes,
+        body: bytes | Iterable[bytes] | None,
+        expect_continue: bool = False,
+    ) -> tuple[AsyncResponse, bool]:
+        reader, writer = connection
+        writer.write(head)
+        if expect_continue:
+            await writer.drain()
+            try:
+                status_line = await asyncio.wait_for(reader.readline(), EXPECT_CONTINUE_TIMEOUT)
+            except asyncio.TimeoutError:
+                # Servers which do not support 100 Continue never answer, so the body is sent anyway
+                status_line = b""
+            if status_line and status_line.split(b" ", 2)[1:2] != [b"100"]:
+                # Refused before the body was sent; the connection cannot be reused without it
+                response, _ = await _read_response(reader, method, status_line)
+                return response, False
+            if status_line:
+                await _read_headers(reader)
+
+        await _write_body(writer, body, self.read_timeout)
+        status_line = await asyncio.wait_for(reader.readline(), self.read_timeout)
+        return await asyncio.wait_for(_read_response(reader, method, status_line), self.read_timeout)
+
+    async def close(self) -> None:
+        """Close every pooled connection."""
+        for connections in self._idle.values():
+            for connection in connections:
+                connection.writer.close()
+        self._idle.clear()
+
+
+async def _write_body(writer: asyncio.StreamWriter, body: bytes | Iterable[bytes] | None, timeout: float) -> None:
+    """Write the body, failing if the host takes more than timeout seconds to accept any chunk of it."""
+    if isinstance(body, bytes):
+        writer.write(body)
+    elif body is not None:
+        # The file is read in a worker thread so the event loop is never blocked on the disk
+        chunks = iter(body)
+        while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+            writer.write(chunk)
+            await asyncio.wait_for(writer.drain(), timeout)
+    await asyncio.wait_for(writer.drain(), timeout)
+
+
+async def _read_headers(reader: asyncio.StreamReader) -> dict[str, str]:
+    headers: dict[str, str] = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+async def _read_response(reader: asyncio.StreamReader, method: str, status_line: bytes) -> tuple[AsyncResponse, bool]:
+    """Read a response, returning it with whether the connection can be used again."""
+    if not status_line:
+        raise asyncio.IncompleteReadError(b"", None)
+    version, status, *_ = status_line.decode("latin-1").split(" ", 2)
+    status_code = int(status)
+    headers = await _read_headers(reader)
+
+    reusable = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+    if method == "HEAD" or status_code in (204, 304) or status_code < 200:
+        content = b""
+    elif headers.get("transfer-encoding", "").lower() == "chunked":
+        content = await _read_chunked(reader)
+    elif "content-length" in headers:
+        content = await reader.readexactly(int(headers["content-length"]))
+    else:
+        content, reusable = await reader.read(), False
+    return AsyncResponse(status_code, headers, content), reusable
+
+
+async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+    chunks = []
+    while size := int((await reader.readline()).split(b";")[0], 16):
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+    # Skip any trailers up to the blank line ending the response
+    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+        pass
+    return b"".join(chunks)
+
+
+class AsyncTransferEngine:
+    """An event loop in a background thread, with an AsyncHTTPClient, to run transfers on.
+
+    Coroutines are submitted from any thread and their results collected through
+    concurrent.futures Futures, so the engine can be shared by several pushers.
+    """
+
+    def __init__(self, config: Configuration) -> None:
+        """Start the event loop thread."""
+        self.client = AsyncHTTPClient(config.http_max_connections_per_host, config.http_timeout)
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="transfer-engine", daemon=True)
+        self._thread.start()
+
+    def submit(self, coroutine: Coroutine) -> Future:
+        """Schedule a coroutine on the engine's event loop."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def close(self) -> None:
+        """Close the pooled connections and stop the event loop."""
+        if self.loop.is_closed():
+            return
+        self.submit(self.client.close()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+# pylint: disable=R0917
+async def send_to_archive_async(  # pylint: disable=too-many-arguments
+    client: AsyncHTTPClient,
+    file_location: Path,
+    deployment_id: str,
+    access_token: str,
+    bodc_archive_url: str,
+    mode: str,
+    logger: SystemLogger,
+    config: Configuration,
+    session: rq.Session | None = None,
+    limiter: BandwidthLimiter | None = None,
+    digests: dict[Path, str] | None = None,
+    progress: UploadProgress | None = None,
+) -> str:
+    """Asyncio counterpart of 'send_to_archive.send_to_archive_api'.
+
+    Large Recovery mode files are sent by the requests based resumable upload, in
+    a worker thread using the given session. The file is read, and held back by the
+    bandwidth limiter, in worker threads, so the limiter never blocks the event loop.
+
+    Returns:
+        A string to inform the result of the API call.
+    """
+    url = build_archive_url(file_location, deployment_id, bodc_archive_url, mode, logger)
+
+    file_size = (await asyncio.to_thread(file_location.stat)).st_size
+    if mode == "Recovery" and 0 < config.resumable_upload_threshold <= file_size:
+        try:
+            sha256: str | None = await asyncio.to_thread(
+                send_resumable_upload,
+                file_location,
+                url,
+                deployment_id,
+                access_token,
+                logger,
+                config,
+                session,
+                limiter,
+                progress,
+            )
+            status_code, response_ok = 200, True
+        except ResumableUploadError as rue_obj:
+            logger.debug("Resumable upload of %s failed: %s", file_location, rue_obj)
+            status_code, response_ok, sha256 = rue_obj.status_code, False, None
+    else:
+        # The body enforces the deadline, extending it by the time spent held back by the limiter
+        body = MultipartFileStream(
+            file_location,
+            chunk_size=config.upload_chunk_size,
+            time_limit=config.upload_deadline(file_size),
+            limiter=limiter,
+        )
+        headers = {"Authorization": f"Bearer {access_token}", "Content-Type": body.content_type}
+        response = await client.request(
+            "POST",
+            url,
+            headers=headers,
+            body=body,
+            expect_continue=0 < config.expect_continue_threshold <= file_size,
+        )
+        logger.debug("Response from archive API: %s - %s", response.status_code, response.text)
+        status_code, response_ok, sha256 = response.status_code, response.ok, body.sha256
+
+    if digests is not None and sha256 is not None:
+        digests[file_location] = sha256
+    return await asyncio.to_thread(
+        check_archive_response, status_code, response_ok, deployment_id, mode, logger, config
+    )
@@ -0,0 +1,154 @@
+"""Writing of log files from a background thread, so uploads never wait on disk I/O."""
+
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+
+#: Queued to make the writer thread flush, close the file and stop
+_CLOSE = object()
+#: Seconds between checks that the writer thread is still running, while waiting for it to flush
+_ALIVE_CHECK_INTERVAL = 1.0
+
+
+class BackgroundFileWriter:
+    """Appends text to a file from a background thread, through one long-lived buffered handle.
+
+    Callers only put text on a queue. The writer thread writes it to the file, which is
+    flushed once the oldest unflushed text is 'flush_interval' seconds old, so a quiet
+    pusher's last lines still reach the file, and is fsynced when flushed at most once
+    every 'fsync_interval' seconds, 0 leaving it to the operating system. Everything
+    queued is written, flushed and fsynced when the writer is closed, which happens at
+    interpreter exit for writers still open. Errors writing the file, such as a full
+    disk, are reported on stderr, as logging handlers do, and the text is dropped
+    while the writer keeps taking more.
+    """
+
+    def __init__(
+        self, file_path: Path, flush_interval: float = 1.0, fsync_interval: float = 0.0, mode: str = "a"
+    ) -> None:
+        """Open the file and start the writer thread."""
+        self.file_path = Path(file_path)
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._file = open(self.file_path, mode, encoding=sys.getdefaultencoding())  # noqa: SIM115
+        self._last_fsync = time.monotonic()
+        self._closed = False
+        self._failing = False
+        self._thread = threading.Thread(target=self._run, name=f"log-writer-{self.file_path.name}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, text: str) -> None:
+        """Queue text to be appended to the file, without waiting for it to be written."""
+        self.queue.put(text)
+
+    def flush(self) -> None:
+        """Wait until everything queued so far has been written and flushed to the file."""
+        if self._closed:
+            return
+        written = threading.Event()
+        self.queue.put(written)
+        while not written.wait(_ALIVE_CHECK_INTERVAL):
+            if not self._thread.is_alive():
+                return
+
+    def close(self) -> None:
+        """Write everything queued, flush and fsync the file, and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        self.queue.put(_CLOSE)
+        self._thread.join()
+
+    def _run(self) -> None:
+        """Write queued text to the file until the writer is closed."""
+        flush_due: float | None = None
+        while True:
+            timeout = None if flush_due is None else max(0.0, flush_due - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _CLOSE:
+                self._close_file()
+                return
+            try:
+                if item is None or isinstance(item, threading.Event):
+                    self._flush()
+                    flush_due = None
+                else:
+                    self._file.write(item)
+                    if flush_due is None:
+                        flush_due = time.monotonic() + self.flush_interval
+                    elif time.monotonic() >= flush_due:
+                        # Kept busy by a steady stream of text, so the wait for the queue never times out
+                        self._flush()
+                        flush_due = None
+                self._failing = False
+            except Exception:  # pylint: disable=broad-except
+                flush_due = None
+                self._report_error()
+            finally:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _close_file(self) -> None:
+        """Flush, fsync and close the file."""
+        try:
+            self._flush(fsync=True)
+        except Exception:  # pylint: disable=broad-except
+            self._report_error()
+        finally:
+            try:
+                self._file.close()
+            except Exception:  # pylint: disable=broad-except
+                self._report_error()
+
+    def _report_error(self) -> None:
+        """Print the error being handled to stderr, once until a write succeeds again, as logging.Handler does."""
+        if self._failing or not logging.raiseExceptions:
+            return
+        self._failing = True
+        print(f"--- Error writing {self.file_path} ---", file=sys.stderr)
+        traceback.print_exc(file=sys.stderr)
+
+    def _flush(self, fsync: bool = False) -> None:
+        """Flush the file, fsyncing it too if forced or due."""
+        self._file.flush()
+        now = time.monotonic()
+        if fsync or (self.fsync_interval > 0 and now - self._last_fsync >= self.fsync_interval):
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+
+
+class BackgroundFileHandler(logging.Handler):
+    """A logging handler formatting records in the caller and writing them through a BackgroundFileWriter."""
+
+    def __init__(self, file_path: Path, flush_interval: float = 1.0, fsync_interval: float = 0.0) -> None:
+        """Open the log file for appending, as a logging.FileHandler does."""
+        super().__init__()
+        self.writer = BackgroundFileWriter(file_path, flush_interval, fsync_interval)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Queue the formatted record to be written."""
+        try:
+            self.writer.write(self.format(record) + "\n")
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+    def flush(self) -> None:
+        """Wait until the records queued so far are written to the file."""
+        self.writer.flush()
+
+    def close(self) -> None:
+        """Write the remaining records and close the file."""
+        self.writer.close()
+        super().close()
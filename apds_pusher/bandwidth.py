@@ -0,0 +1,144 @@
+"""Bandwidth limiting of uploads, with a token bucket shared by every upload in a process."""
+
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from datetime import datetime
+from datetime import time as time_of_day
+from typing import Any, NamedTuple
+
+from apds_pusher.config_parser import Configuration
+
+
+class ScheduleWindow(NamedTuple):
+    """A time of day during which a different bandwidth limit applies."""
+
+    start: time_of_day
+    end: time_of_day
+    limit: int
+
+    def contains(self, moment: time_of_day) -> bool:
+        """Whether the window covers a time of day, windows ending before they start run past midnight."""
+        if self.start <= self.end:
+            return self.start <= moment < self.end
+        return moment >= self.start or moment < self.end
+
+
+def parse_schedule(entries: Iterable[dict[str, Any]]) -> tuple[ScheduleWindow, ...]:
+    """Turn the 'bandwidth_schedule' entries of the config into schedule windows.
+
+    Each entry gives a 'start' and 'end' time as HH:MM, in the pusher's local time,
+    and the 'limit' in bytes per second during that time, 0 for no limit.
+
+    Raises:
+        ValueError: If an entry is missing a field, or a field is not valid.
+    """
+    windows = []
+    for entry in entries:
+        try:
+            window = ScheduleWindow(
+                time_of_day.fromisoformat(entry["start"]), time_of_day.fromisoformat(entry["end"]), int(entry["limit"])
+            )
+        except (KeyError, TypeError, ValueError) as exc:
+            raise ValueError(f"Invalid bandwidth schedule entry {entry}: {exc!r}") from None
+        if window.limit < 0:
+            raise ValueError(f"Invalid bandwidth schedule entry {entry}: the limit cannot be negative")
+        windows.append(window)
+    return tuple(windows)
+
+
+class BandwidthLimiter:  # pylint: disable=too-many-instance-attributes
+    """Caps the bytes per second sent by every upload sharing the limiter.
+
+    Bytes are taken from a bucket refilled at the current limit, holding at most
+    'burst_seconds' of it. The bucket starts empty, and senders taking more than it
+    holds are made to wait until their share has been refilled, so concurrent uploads
+    are paced together rather than each sending at the full limit. The limit is the
+    one of the first schedule window covering the time of day, or 'limit' outside
+    every window, and 0 means no limit.
+    """
+
+    # pylint: disable=R0913,R0917
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        limit: int = 0,
+        schedule: tuple[ScheduleWindow, ...] = (),
+        burst_seconds: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        now: Callable[[], datetime] = datetime.now,
+    ) -> None:
+        """Create a limiter with an empty bucket."""
+        self.limit = limit
+        self.schedule = schedule
+        self.burst_seconds = burst_seconds
+        self.clock = clock
+        self.sleep = sleep
+        self.now = now
+        self.lock = threading.Lock()
+        self.tokens = 0.0
+        self.updated_at = clock()
+
+    @classmethod
+    def from_config(cls, config: Configuration) -> "BandwidthLimiter":
+        """Create the limiter set by the bandwidth fields of the config.
+
+        Raises:
+            ValueError: If the bandwidth schedule is not valid.
+        """
+        return cls(config.bandwidth_limit, parse_schedule(config.bandwidth_schedule))
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any limit is ever applied."""
+        return self.limit > 0 or any(window.limit > 0 for window in self.schedule)
+
+    def current_limit(self) -> int:
+        """The limit in bytes per second at this time of day, 0 for no limit."""
+        if self.schedule:
+            moment = self.now().time()
+            for window in self.schedule:
+                if window.contains(moment):
+                    return window.limit
+        return self.limit
+
+    def reserve(self, size: int) -> float:
+        """Take size bytes from the bucket, returning the seconds to wait before sending them."""
+        limit = self.current_limit()
+        with self.lock:
+            now = self.clock()
+            elapsed, self.updated_at = now - self.updated_at, now
+            if limit <= 0:
+                self.tokens = 0.0
+                return 0.0
+            self.tokens = min(self.tokens + elapsed * limit, limit * self.burst_seconds) - size
+            return -self.tokens / limit if self.tokens < 0 else 0.0
+
+    def consume(self, size: int) -> float:
+        """Wait until size bytes may be sent, returning the seconds waited."""
+        delay = self.reserve(size)
+        if delay > 0:
+            self.sleep(delay)
+        return delay
+
+
+class ThrottledBytes:
+    """Bytes sent as a request body a chunk at a time, at the pace set by a limiter."""
+
+    def __init__(self, data: bytes, limiter: BandwidthLimiter, chunk_size: int) -> None:
+        """Set up the body for the data."""
+        self.data = data
+        self.limiter = limiter
+        self.chunk_size = chunk_size
+
+    def __len__(self) -> int:
+        """The length of the body in bytes."""
+        return len(self.data)
+
+    def __iter__(self) -> Iterator[bytes]:
+        """Yield the data a chunk at a time, waiting for the limiter before each one."""
+        view = memoryview(self.data)
+        for offset in range(0, len(self.data), self.chunk_size):
+            chunk = view[offset : offset + self.chunk_size]
+            self.limiter.consume(len(chunk))
+            yield bytes(chunk)
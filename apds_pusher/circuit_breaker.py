@@ -0,0 +1,184 @@
+"""Circuit breaker stopping calls to the archive while it is unavailable."""
+
+import logging
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any, TypeVar
+
+from apds_pusher.config_parser import Configuration
+from apds_pusher.retry_policy import TRANSPORT_ERRORS
+from apds_pusher.send_to_archive import FileUploadError, HoldingsAccessError
+
+T = TypeVar("T")
+
+#: Exceptions which count as failures of the archive, if they carry no status code or a server error one
+ARCHIVE_FAILURES: tuple[type[BaseException], ...] = TRANSPORT_ERRORS + (FileUploadError, HoldingsAccessError)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of making a call while the circuit breaker is open."""
+
+
+class CircuitBreaker:  # pylint: disable=too-many-instance-attributes
+    """Counts consecutive failed calls to the archive, and stops calls once there are too many.
+
+    A failure is an exception which is an instance of one of 'failure_on' and either
+    has no 'status_code' attribute, or a server error status code. Any other outcome,
+    including a refused token or a missing endpoint, shows the archive is up.
+
+    After 'failure_threshold' consecutive failures the breaker opens, and calls raise
+    CircuitOpenError without being made. Once 'reset_timeout' seconds have passed a
+    single call is let through as a probe: the breaker closes if it succeeds, or opens
+    again for twice as long, up to 'max_reset_timeout', if it fails. The breaker is
+    shared by every thread, and event loop, calling the archive.
+    """
+
+    # pylint: disable=R0913,R0917
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        max_reset_timeout: float = 600.0,
+        failure_on: tuple[type[BaseException], ...] = ARCHIVE_FAILURES,
+        logger: logging.Logger | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Create a closed breaker, a failure_threshold of 0 or less disables it."""
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.failure_on = failure_on
+        self.logger = logger
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.reset_timeout = reset_timeout
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.times_opened = 0
+        self.rejected_calls = 0
+
+    @classmethod
+    def from_config(cls, config: Configuration, logger: logging.Logger | None = None) -> "CircuitBreaker":
+        """Create the breaker set by the circuit fields of the config."""
+        return cls(
+            failure_threshold=config.circuit_failure_threshold,
+            reset_timeout=config.circuit_reset_timeout,
+            max_reset_timeout=config.circuit_max_reset_timeout,
+            logger=logger,
+        )
+
+    def is_failure(self, exc: BaseException) -> bool:
+        """Whether a call which raised exc shows the archive is unavailable."""
+        if not isinstance(exc, self.failure_on):
+            return False
+        status_code = getattr(exc, "status_code", None)
+        return status_code is None or status_code >= 500
+
+    def is_available(self) -> bool:
+        """Whether a call would currently be let through, without claiming the half-open probe."""
+        with self.lock:
+            if self.state == CLOSED or self.failure_threshold <= 0:
+                return True
+            return not self.probe_in_flight and self.clock() >= self.opened_at + self.reset_timeout
+
+    def check(self) -> None:
+        """Claim permission to make a call, which must be followed by a call to 'record'.
+
+        Raises:
+            CircuitOpenError: If the breaker is open, or another call is already probing it.
+        """
+        with self.lock:
+            if self.state == CLOSED or self.failure_threshold <= 0:
+                return
+            retry_in = self.opened_at + self.reset_timeout - self.clock()
+            if self.probe_in_flight or retry_in > 0:
+                self.rejected_calls += 1
+                raise CircuitOpenError(f"Archive unavailable, next attempt in {max(retry_in, 0):.0f} seconds")
+            self.probe_in_flight = True
+            self._transition(HALF_OPEN)
+
+    def record(self, exc: BaseException | None = None) -> None:
+        """Record the outcome of a call let through by 'check', None if it succeeded."""
+        with self.lock:
+            self.probe_in_flight = False
+            if exc is None or not self.is_failure(exc):
+                self.consecutive_failures = 0
+                self.reset_timeout = self.base_reset_timeout
+                self._transition(CLOSED)
+                return
+            self.consecutive_failures += 1
+            if self.failure_threshold <= 0:
+                return
+            if self.state == HALF_OPEN:
+                self.reset_timeout = min(self.reset_timeout * 2, self.max_reset_timeout)
+            elif self.state == OPEN or self.consecutive_failures < self.failure_threshold:
+                return
+            self.opened_at = self.clock()
+            self.times_opened += 1
+            self._transition(OPEN)
+
+    def call(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Call func with the given arguments, if the breaker lets the call through.
+
+        Raises:
+            CircuitOpenError: If the breaker is open.
+            The exception raised by func.
+        """
+        self.check()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as exc:
+            self.record(exc)
+            raise
+        self.record()
+        return result
+
+    async def call_async(self, func: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        """Await the coroutine function func with the given arguments, if the breaker lets the call through.
+
+        Raises:
+            CircuitOpenError: If the breaker is open.
+            The exception raised by func.
+        """
+        self.check()
+        try:
+            result = await func(*args, **kwargs)
+        except BaseException as exc:
+            self.record(exc)
+            raise
+        self.record()
+        return result
+
+    def metrics(self) -> dict[str, Any]:
+        """The state of the breaker and counts of its activity."""
+        with self.lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "times_opened": self.times_opened,
+                "rejected_calls": self.rejected_calls,
+                "reset_timeout": self.reset_timeout,
+            }
+
+    def _transition(self, state: str) -> None:
+        """Move to a new state, logging the change. Called with the lock held."""
+        if state == self.state:
+            return
+        previous, self.state = self.state, state
+        if self.logger is None:
+            return
+        if state == OPEN:
+            self.logger.warning(
+                "Circuit breaker opened after %s consecutive failures, archive calls paused for %.0f seconds",
+                self.consecutive_failures,
+                self.reset_timeout,
+            )
+        else:
+            self.logger.info("Circuit breaker moved from %s to %s", previous, state)
@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass, fields
+from dataclasses import MISSING, dataclass, fields
 from pathlib import Path
 from typing import Any
 
@@ -47,6 +47,45 @@ class Configuration:
     archive_checker_frequency: int  #: This should be passed in as minutes
     save_file_location: Path
     log_file_location: Path
+    upload_workers: int = 1  #: Number of files uploaded concurrently, 1 disables the worker pool
+    http_pool_connections: int = 4  #: Number of hosts to keep a pool of connections open for
+    http_max_connections_per_host: int = 10  #: Connections kept alive, and allowed at once, per host
+    http_connect_timeout: float = 10.0  #: Seconds allowed to open a connection to a host
+    http_read_timeout: float = 120.0  #: Seconds allowed to wait for data from a host before a call fails
+    upload_min_throughput: int = 16384  #: Slowest expected upload speed in bytes per second, 0 disables deadlines
+    bandwidth_limit: int = 0  #: Bytes per second all uploads in the process may send together, 0 for no limit
+    bandwidth_schedule: tuple[dict, ...] = ()  #: Times of day, as start, end and limit, with their own limit
+    upload_priority: tuple[str, ...] = ()  #: Rules uploads are ordered by: format, newest, smallest or weighted
+    upload_priority_weights: dict | None = None  #: Weight of each rule summed by the weighted rule, 1 if not given
+    upload_chunk_size: int = 65536  #: Bytes of a file read into memory at a time while it is uploaded
+    resumable_upload_threshold: int = 0  #: Recovery files of at least this many bytes are sent in parts, 0 disables
+    resumable_part_size: int = 8388608  #: Bytes sent in each part of a resumable upload
+    resumable_part_attempts: int = 3  #: Attempts made to send each part before the upload is abandoned
+    event_driven_uploads: bool = False  #: Send new files as inotify reports them, between periodic scans (Linux)
+    file_quiescence_period: float = 0.0  #: Seconds a file must go unmodified before it is sent, 0 sends it at once
+    warm_restart: bool = True  #: Resume the first cycle after a restart from the last scan kept in the local state
+    holdings_full_refresh_cycles: int = 10  #: Refreshes of the cached holdings between full downloads of the list
+    holdings_since_parameter: str = ""  #: Holdings query parameter to request only files added since a time
+    retry_max_attempts: int = 3  #: Attempts made at an upload, holdings or token refresh call before giving up
+    retry_base_delay: float = 1.0  #: Seconds waited after the first failed attempt, doubling after each one
+    retry_max_delay: float = 60.0  #: The longest wait, in seconds, between attempts
+    retry_jitter: bool = True  #: Wait a random time up to the delay, to spread out retries
+    retry_status_codes: tuple[int, ...] = (429, 500, 502, 503, 504)  #: HTTP statuses which are retried
+    retry_queue_base_delay: float = 300.0  #: Seconds before a file failing every attempt is sent again, doubling
+    retry_queue_max_delay: float = 21600.0  #: The longest wait, in seconds, before a failed file is sent again
+    retry_queue_max_failures: int = 10  #: Cycles a file may fail in before it is dead-lettered, 0 retries forever
+    token_refresh_margin: float = 300.0  #: Seconds before the access token expires that it is refreshed
+    preflight_probe: bool = False  #: Probe the archive endpoint before sending each cycle's files
+    expect_continue_threshold: int = 0  #: Size above which the asyncio engine waits for 100 Continue, 0 disables
+    circuit_failure_threshold: int = 5  #: Consecutive archive failures which pause calls to it, 0 disables
+    circuit_reset_timeout: float = 30.0  #: Seconds calls are paused for before the archive is probed again
+    circuit_max_reset_timeout: float = 600.0  #: Longest pause, doubling each time a probe of the archive fails
+    transfer_engine: str = "threads"  #: Backend uploads are sent with, "threads" (requests) or "asyncio"
+    log_flush_interval: float | None = None  #: Seconds a background writer may buffer log lines, unset writes at once
+    log_fsync_interval: float = 0.0  #: Least seconds between fsyncs of the log files by the background writer
+    ledger_max_bytes: int = 0  #: Size in bytes past which the ledger of uploads is rotated, 0 never rotates it
+    ledger_backups: int = 5  #: Rotated ledgers of uploads kept
+    daemon_max_concurrent_deployments: int = 4  #: Deployments the daemon runs a cycle for at the same time
 
     @classmethod
     def from_dict_validated(cls, data_dict: dict[str, Any]) -> Configuration:
@@ -59,13 +98,18 @@ class Configuration:
         if extra_keys:
             raise ExtraFieldError(f"Unexpected fields given: {extra_keys}") from None
 
-        # check no missing fields
-        missing_keys = class_fields - data_fields
+        # check no missing fields (fields with a default value are optional)
+        required_fields = {
+            field.name for field in fields(cls) if field.default is MISSING and field.default_factory is MISSING
+        }
+        missing_keys = required_fields - data_fields
         if missing_keys:
             raise MissingFieldError(f"Missing expected fields: {missing_keys}") from None
 
-        # check no blank values
-        blank_fields = {key for key, value in data_dict.items() if not value}
+        # check no blank values (numeric and boolean settings may legitimately be zero/false)
+        blank_fields = {
+            key for key, value in data_dict.items() if not value and not isinstance(value, (bool, int, float))
+        }
         if blank_fields:
             raise BlankValueError(f"Blank values found for fields: {blank_fields}") from None
 
@@ -78,6 +122,17 @@ class Configuration:
                 raise InvalidPathError(f"{field} is an invalid path.") from None
         return cls(**data_dict)
 
+    @property
+    def http_timeout(self) -> tuple[float, float]:
+        """The connect and read timeouts given to every HTTP call."""
+        return self.http_connect_timeout, self.http_read_timeout
+
+    def upload_deadline(self, file_size: int) -> float | None:
+        """Seconds allowed for sending a file of file_size bytes, None if uploads have no deadline."""
+        if self.upload_min_throughput <= 0:
+            return None
+        return self.http_read_timeout + file_size / self.upload_min_throughput
+
     @property
     def deployment_location(self) -> Path:
         """A getter to return the location of active_deployments directory."""
@@ -0,0 +1,198 @@
+"""Daemon serving every active deployment from one process."""
+
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from threading import Event
+
+import requests
+
+from apds_pusher.async_engine import AsyncTransferEngine
+from apds_pusher.bandwidth import BandwidthLimiter
+from apds_pusher.circuit_breaker import CircuitBreaker
+from apds_pusher.config_parser import Configuration
+from apds_pusher.filepusher import FilePusher
+from apds_pusher.retry_policy import TRANSPORT_ERRORS, RetryPolicy
+from apds_pusher.systemlogger import SystemLogger
+from apds_pusher.token_refresher import AccessCodeError, TokenManager, get_access_token_from_refresh_token
+from apds_pusher.utils.deployment_utils import DeploymentSettings, read_deployment_settings
+
+#: Seconds between looks at the active deployments directory for started and stopped deployments
+DISCOVERY_INTERVAL_SECONDS = 5.0
+
+
+class DeploymentDaemon:  # pylint: disable=too-many-instance-attributes
+    """Runs the file push cycles for all deployments registered in the active deployments directory.
+
+    The deployments share one login, one pooled HTTP session, one pool of upload
+    workers, one circuit breaker for the archive and one bandwidth limit. Cycles are
+    started earliest-due first, a limited number at a time, and each deployment may
+    only keep its fair share of the upload workers busy.
+    """
+
+    # pylint: disable=R0913,R0917
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        config: Configuration,
+        tokens: TokenManager,
+        session: requests.Session,
+        log: SystemLogger,
+        trace: bool = False,
+    ) -> None:
+        """Set up the shared worker pools."""
+        self.config = config
+        self.tokens = tokens
+        self.session = session
+        self.system_logger = log
+        self.trace = trace
+        self.pushers: dict[str, FilePusher] = {}
+        self.next_due: dict[str, float] = {}
+        self.cycle_numbers: dict[str, int] = {}
+        self.running: dict[str, Future] = {}
+        self.upload_executor = ThreadPoolExecutor(
+            max_workers=max(1, config.upload_workers), thread_name_prefix="upload"
+        )
+        # Uploads for every deployment share one event loop when the asyncio engine is used
+        self.engine = AsyncTransferEngine(config) if config.transfer_engine == "asyncio" else None
+        # An unavailable archive pauses the cycles of every deployment, not each in turn
+        self.breaker = CircuitBreaker.from_config(config, logger=log)
+        self.limiter = BandwidthLimiter.from_config(config)
+        # The tokens are shared by every pusher, so refresh them here rather than through any one of them
+        self.retry_policy = RetryPolicy.from_config(config, retry_on=TRANSPORT_ERRORS + (AccessCodeError,), logger=log)
+        if tokens.refresher is None:
+            tokens.refresher = self.request_access_token
+        if tokens.logger is None:
+            tokens.logger = log
+        tokens.refresh_margin = config.token_refresh_margin
+        if config.event_driven_uploads:
+            log.warning("event_driven_uploads is not used by the daemon, new files are found by the periodic scans")
+        self.cycle_executor = ThreadPoolExecutor(
+            max_workers=max(1, config.daemon_max_concurrent_deployments), thread_name_prefix="cycle"
+        )
+
+    def request_access_token(self, refresh_token: str) -> str:
+        """Request a new access token from the auth provider, retrying as set by the retry policy."""
+        return self.retry_policy.call(get_access_token_from_refresh_token, refresh_token, self.config, self.session)
+
+    def discover(self) -> None:
+        """Add pushers for newly registered deployments and remove those that have been stopped."""
+        deployment_location = self.config.deployment_location
+        active = {path.stem: path for path in deployment_location.glob("*.txt")} if deployment_location.is_dir() else {}
+
+        for deployment_id in list(self.pushers):
+            if deployment_id not in active and deployment_id not in self.running:
+                self.system_logger.info("Deployment %s has been stopped", deployment_id)
+                self.pushers.pop(deployment_id).close()
+                del self.next_due[deployment_id]
+                del self.cycle_numbers[deployment_id]
+
+        for deployment_id, deployment_file in sorted(active.items()):
+            if deployment_id in self.pushers:
+                continue
+            settings = read_deployment_settings(deployment_file)
+            if settings is None:
+                # Deployments started without --register-only are run by their own process
+                continue
+            self.system_logger.info("Adding deployment %s using data from %s", deployment_id, settings.data_directory)
+            try:
+                self.pushers[deployment_id] = self.create_pusher(deployment_id, deployment_file, settings)
+            except Exception as e_obj:  # pylint: disable=broad-except
+                # Tried again by the next discovery, the other deployments carry on meanwhile
+                self.system_logger.error("Unable to start deployment %s, it will be retried: %r", deployment_id, e_obj)
+                self.system_logger.debug("Full Traceback for deployment %s: %s", deployment_id, traceback.format_exc())
+                continue
+            self.next_due[deployment_id] = time.monotonic()
+            self.cycle_numbers[deployment_id] = 1
+
+        fair_share = max(1, self.config.upload_workers // max(1, len(self.pushers)))
+        for pusher in self.pushers.values():
+            pusher.max_in_flight = fair_share
+
+    def create_pusher(self, deployment_id: str, deployment_file: Path, settings: DeploymentSettings) -> FilePusher:
+        """Create a pusher for a deployment sharing the daemon's login, session, workers, breaker and limiter."""
+        s_logger = SystemLogger(
+            deployment_id,
+            self.config.log_file_location,
+            self.config.deployment_location,
+            trace=self.trace,
+            flush_interval=self.config.log_flush_interval,
+            fsync_interval=self.config.log_fsync_interval,
+        )
+        try:
+            return FilePusher(
+                deployment_id,
+                settings.data_directory,
+                self.config,
+                settings.is_production,
+                settings.is_recursive,
+                settings.is_dry_run,
+                self.tokens.access_token,
+                self.tokens.refresh_token,
+                deployment_file,
+                s_logger,
+                settings.mode,
+                session=self.session,
+                tokens=self.tokens,
+                executor=self.upload_executor,
+                engine=self.engine,
+                breaker=self.breaker,
+                limiter=self.limiter,
+            )
+        except Exception:
+            # The pusher is not created, so its log file is closed here rather than by the pusher
+            for handler in s_logger.handlers:
+                handler.close()
+            raise
+
+    def run_once(self) -> None:
+        """Collect finished cycles and start those that are due, earliest due first."""
+        for deployment_id, future in list(self.running.items()):
+            if future.done():
+                del self.running[deployment_id]
+                self.cycle_numbers[deployment_id] += 1
+                self.next_due[deployment_id] = time.monotonic() + self.config.archive_checker_frequency * 60
+
+        self.discover()
+
+        now = time.monotonic()
+        due = sorted(
+            (due_at, deployment_id)
+            for deployment_id, due_at in self.next_due.items()
+            if due_at <= now and deployment_id not in self.running
+        )
+        for _, deployment_id in due:
+            if len(self.running) >= self.config.daemon_max_concurrent_deployments:
+                break
+            self.running[deployment_id] = self.cycle_executor.submit(self.run_cycle, deployment_id)
+
+    def run_cycle(self, deployment_id: str) -> None:
+        """Run one cycle for a deployment, logging rather than raising any error."""
+        pusher = self.pushers[deployment_id]
+        try:
+            pusher.run_cycle(self.cycle_numbers[deployment_id])
+        except Exception:  # pylint: disable=broad-except
+            pusher.system_logger.error("Exception caught during file send loop: %s", traceback.format_exc())
+
+    def run(self, stop: Event | None = None) -> None:
+        """Serve the registered deployments until stopped."""
+        stop = stop or Event()
+        self.system_logger.info("Daemon serving deployments registered in %s", self.config.deployment_location)
+        self.tokens.start_background_refresh()
+        try:
+            while not stop.is_set():
+                self.run_once()
+                stop.wait(DISCOVERY_INTERVAL_SECONDS)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Wait for running cycles to finish and close every pusher."""
+        self.tokens.stop_background_refresh()
+        self.cycle_executor.shutdown(wait=True)
+        self.upload_executor.shutdown(wait=True)
+        for pusher in self.pushers.values():
+            pusher.close()
+        self.pushers.clear()
+        if self.engine is not None:
+            self.engine.close()
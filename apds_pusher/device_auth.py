@@ -6,6 +6,7 @@ import polling2  # type: ignore
 import requests
 
 from apds_pusher.config_parser import Configuration
+from apds_pusher.http_session import DEFAULT_TIMEOUT
 
 
 class DeviceCodeError(Exception):
@@ -13,7 +14,13 @@ class DeviceCodeError(Exception):
 
 
 # pylint: disable=R0801
-def get_device_code(client_id: str, auth2_audience: str, auth_domain: str) -> dict:
+def get_device_code(
+    client_id: str,
+    auth2_audience: str,
+    auth_domain: str,
+    session: requests.Session | None = None,
+    timeout: tuple[float, float] = DEFAULT_TIMEOUT,
+) -> dict:
     """Method to authorize the device.
 
     The verification url and the user code is returned for user to authorise his/her device. User has to
@@ -23,6 +30,8 @@ def get_device_code(client_id: str, auth2_audience: str, auth_domain: str) -> di
        auth_domain (str) : The url of the auth domain
        client_id (str) : client id of the APDS pusher application
        auth2_audience (str) : setting in 0auth2 to link request to target application
+       session (requests.Session) : The pusher's shared HTTP session, a new connection is made if not given
+       timeout (tuple) : The connect and read timeouts for the call, in seconds
 
     Returns :
         the response payload containing the user code and tinyurl else will raise an exception
@@ -34,11 +43,11 @@ def get_device_code(client_id: str, auth2_audience: str, auth_domain: str) -> di
     }
     headers = {"content-type": "application/json"}
     try:
-        res = requests.post(
+        res = (session or requests).post(
             "https://" + auth_domain + "/oauth/device/code",
             headers=headers,
             json=payload,
-            timeout=600,
+            timeout=timeout,
         )
         res.raise_for_status()
 
@@ -57,13 +66,14 @@ def get_device_code(client_id: str, auth2_audience: str, auth_domain: str) -> di
     return access_token_details
 
 
-def authenticate(config: Configuration) -> tuple[str, str, int, str, int]:
+def authenticate(config: Configuration, session: requests.Session | None = None) -> tuple[str, str, int, str, int]:
     """Method to return read config and authenticate config.
 
     The config section is read and generates a usercode for the device and later obtain a accesstoken
 
     Args:
        config :A configuration class object
+       session : The pusher's shared HTTP session, a new connection is made if not given
     Returns:
        A tuple of user code, tiny url and time before the code expires
     """
@@ -73,7 +83,7 @@ def authenticate(config: Configuration) -> tuple[str, str, int, str, int]:
     auth2_audience = config.auth2_audience
 
     # retrieves the URL and challenge code for device flow
-    device_data = get_device_code(client_id, auth2_audience, auth_domain)
+    device_data = get_device_code(client_id, auth2_audience, auth_domain, session, config.http_timeout)
 
     user_code = device_data["user_code"]
     url = device_data["verification_uri"]
@@ -103,12 +113,15 @@ def raise_if_err_contains_expired(err_description: str) -> None:
             raise DeviceCodeError("Device code is expired. Start APDS Pusher again to obtain new code")
 
 
-def receive_access_token_from_device_code(device_code_response: dict, config: Configuration) -> dict:
+def receive_access_token_from_device_code(
+    device_code_response: dict, config: Configuration, session: requests.Session | None = None
+) -> dict:
     """Start polling to recieve the access token.
 
     Args:
        device_code_response: a dict of all the required key-value for device auth
        config :A configuration class object
+       session : The pusher's shared HTTP session, a new connection is made if not given
     Returns:
        A dict containing the access code and related information
     """
@@ -126,7 +139,7 @@ def receive_access_token_from_device_code(device_code_response: dict, config: Co
     }
     try:
         access_token = polling2.poll(
-            lambda: requests.post(url, headers=headers, json=payload, timeout=600),
+            lambda: (session or requests).post(url, headers=headers, json=payload, timeout=config.http_timeout),
             check_success=is_correct_response,
             step=device_code_response["interval"],
             timeout=device_code_response["expires_in"],
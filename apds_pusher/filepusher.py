@@ -1,24 +1,64 @@
 """Program to orchestrate push of files to the Archive API."""
 
+import asyncio
+import hashlib
+import json
+import os
 import time
 import traceback
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime
+from itertools import islice
 from pathlib import Path
 from time import sleep
 
+import requests
 from requests.exceptions import ConnectTimeout, RequestException
 
+from apds_pusher.async_engine import AsyncTransferEngine, send_to_archive_async
+from apds_pusher.bandwidth import BandwidthLimiter
+from apds_pusher.circuit_breaker import CircuitBreaker, CircuitOpenError
 from apds_pusher.config_parser import Configuration
-from apds_pusher.savefilelogger import FileLogger
+from apds_pusher.holdings_cache import HoldingsCache
+from apds_pusher.http_session import create_session
+from apds_pusher.inotify_watcher import InotifyUnavailableError, InotifyWatcher
+from apds_pusher.multipart_stream import UploadDeadlineError
+from apds_pusher.resumable_upload import UploadProgress
+from apds_pusher.retry_policy import TRANSPORT_ERRORS, RetryPolicy
+from apds_pusher.savefilelogger import FileLogger, throughput
+from apds_pusher.scanner import ScannedFile, scan_deployment
+from apds_pusher.scheduler import prioritise
 from apds_pusher.send_to_archive import (
     AuthenticationError,
     FileUploadError,
     HoldingsAccessError,
-    return_existing_glider_files,
+    probe_archive,
     send_to_archive_api,
 )
 from apds_pusher.systemlogger import SystemLogger
-from apds_pusher.token_refresher import get_access_token_from_refresh_token
+from apds_pusher.token_refresher import AccessCodeError, TokenManager, get_access_token_from_refresh_token
+from apds_pusher.upload_state import DEAD_LETTER, FAILED, UPLOADED, UploadStateStore, file_sha256
+
+#: Marker in the upload state store of when the files found by a scan were last spooled
+SPOOLED_SCAN_MARKER = "last_spooled_scan"
+#: Seconds the watermark is set before the scan started, for filesystems which store mtimes coarsely
+WATERMARK_OVERLAP = 2.0
+#: Files found by a scan which are added to the spool together, before any of them are sent
+SPOOL_BATCH_SIZE = 500
+#: Paths included in debug messages summarising a list of files
+LISTED_PATHS = 10
+
+
+def scan_marker(deployment_location: Path, file_formats: Iterable[str], is_recursive: bool) -> str:
+    """The name of the marker of when a scan with these settings was last spooled.
+
+    A scan with other settings may not have found every file this one would, so it is
+    not resumed from by a warm restart.
+    """
+    settings = json.dumps([str(Path(deployment_location).resolve()), sorted(file_formats), is_recursive])
+    return f"{SPOOLED_SCAN_MARKER}:{hashlib.sha256(settings.encode()).hexdigest()[:16]}"
 
 
 class FilePusher:  # pylint: disable=too-many-instance-attributes
@@ -38,22 +78,65 @@ class FilePusher:  # pylint: disable=too-many-instance-attributes
         deployment_file: Path,
         log: SystemLogger,
         mode: str,
+        session: requests.Session | None = None,
+        tokens: TokenManager | None = None,
+        executor: ThreadPoolExecutor | None = None,
+        engine: AsyncTransferEngine | None = None,
+        breaker: CircuitBreaker | None = None,
+        limiter: BandwidthLimiter | None = None,
     ):
-        """Setup for File Pusher."""
+        """Setup for File Pusher.
+
+        A pooled HTTP session is created for the pusher unless a shared one is given.
+        When several pushers run in one process they can also share their tokens, and
+        a pool of upload workers of which each pusher uses at most 'max_in_flight', or
+        an asyncio transfer engine when 'transfer_engine' is set to asyncio in the config.
+        Every call to the archive goes through a circuit breaker, and every upload through
+        a bandwidth limiter, which pushers in the same process should share.
+        """
         self.deployment_id = deployment_id
         self.deployment_location = deployment_location
         self.config = config
         self.is_production = is_production
         self.is_recursive = is_recursive
         self.is_dry_run = is_dry_run
-        self.access_token = access_token
-        self.refresh_token = refresh_token
+        self._owns_tokens = tokens is None
+        self.tokens = tokens if tokens is not None else TokenManager(access_token, refresh_token)
         self.deployment_file = deployment_file
         self.system_logger = log
         self.mode = mode
+        self.file_stats: dict[Path, os.stat_result] = {}
+        # The sha256 of each file sent, computed as it is uploaded, until it is recorded
+        self.digests: dict[Path, str] = {}
+        self.watcher: InotifyWatcher | None = None
+        self.session = session if session is not None else create_session(config)
+        self.executor = executor
+        self.max_in_flight = config.upload_workers
+        self._owns_engine = engine is None and config.transfer_engine == "asyncio"
+        self.engine = AsyncTransferEngine(config) if self._owns_engine else engine
+        self.breaker = breaker if breaker is not None else CircuitBreaker.from_config(config, logger=log)
+        self.limiter = limiter if limiter is not None else BandwidthLimiter.from_config(config)
+        self.retry_policy = RetryPolicy.from_config(
+            config,
+            retry_on=TRANSPORT_ERRORS + (AuthenticationError, FileUploadError, HoldingsAccessError, AccessCodeError),
+            logger=log,
+        )
+        # Backoff between the cycles a file is sent in, once every attempt within a cycle has failed
+        self.requeue_policy = RetryPolicy(
+            max_attempts=config.retry_queue_max_failures,
+            base_delay=config.retry_queue_base_delay,
+            max_delay=config.retry_queue_max_delay,
+            jitter=False,
+        )
+        if self._owns_tokens:
+            # Shared tokens are set up by their owner, as they outlive any one pusher
+            self.tokens.refresher = self.request_access_token
+            self.tokens.logger = log
+            self.tokens.refresh_margin = config.token_refresh_margin
 
         # Begin the logging
         self.initialise_logging()
+        self.initialise_local_state()
         self.system_logger.debug("Finished the setup of the FilePusher class")
 
     def run(self) -> None:
@@ -64,46 +147,82 @@ class FilePusher:  # pylint: disable=too-many-instance-attributes
         for x minutes and perform a new send.
         """
         self.system_logger.info(
-            f"Program will wait {self.config.archive_checker_frequency} minutes between checking for new files."
+            "Program will wait %s minutes between checking for new files.", self.config.archive_checker_frequency
         )
+        self.start_watcher()
+        self.tokens.start_background_refresh()
         file_push_cycles = 1
 
         while True:
             try:
-                self.system_logger.debug(f"starting loop for deployment {self.deployment_id}")
+                self.system_logger.debug("starting loop for deployment %s", self.deployment_id)
                 # start archival if there was no request to stop the archival
                 if self.check_deployment_not_stopped(self.deployment_id):
-                    self.system_logger.info(f"Starting cycle number: {file_push_cycles}")
-
-                    if self.is_dry_run:
-                        self.system_logger.debug(f"{self.deployment_id} is set to dry run")
-                        self.dry_run_send(file_push_cycles)
-                    else:
-                        self.system_logger.debug(f"{self.deployment_id} will be sending files to BODC's Archive API")
-                        self.send_files_to_api(file_push_cycles)
-
-                    self.system_logger.info(f"Cycle number {file_push_cycles} complete.")
+                    self.run_cycle(file_push_cycles)
                     file_push_cycles += 1
-                    self.system_logger.debug(f"Moving to cycle number {file_push_cycles}.")
+                    self.system_logger.debug("Moving to cycle number %s.", file_push_cycles)
                     self.system_logger.debug("sleep starting")
-                    sleep(self.config.archive_checker_frequency * 60)
+                    self.wait_for_next_cycle()
                     self.system_logger.debug("sleep over")
                 else:
-                    self.system_logger.debug(f"{self.deployment_id} has failed the check_deployment_not_stopped check")
+                    self.system_logger.debug("%s has failed the check_deployment_not_stopped check", self.deployment_id)
                     self.system_logger.info("'check_deployment_not_stopped' returned False, program exiting.")
                     raise SystemExit
             except Exception as e_obj:  # pylint: disable=broad-except
                 # Log the full traceback to the system logger.
-                self.system_logger.error(f"Exception caught during file send loop: {traceback.format_exc()}")
+                self.system_logger.error("Exception caught during file send loop: %s", traceback.format_exc())
                 self.system_logger.debug("Unknown error has happen.")
-                self.system_logger.debug(f"{str(e_obj)}.")
+                self.system_logger.debug("%s.", e_obj)
 
                 # For clarity, write the full traceback to its own file.
                 with open(f"Error_cycle_{file_push_cycles}.txt", mode="w", encoding="utf-8") as error_file:
                     error_file.write(traceback.format_exc())
 
                 file_push_cycles += 1
-                self.system_logger.debug(f"Moving to cycle number {file_push_cycles}.")
+                self.system_logger.debug("Moving to cycle number %s.", file_push_cycles)
+
+    def run_cycle(self, cycle_number: int) -> None:
+        """Perform a single dry run or send of files to the Archive API."""
+        self.system_logger.info("Starting cycle number: %s", cycle_number)
+        if not self.breaker.is_available():
+            self.system_logger.warning("Archive unavailable, cycle number %s skipped", cycle_number)
+            self.system_logger.info("Archive circuit breaker: %s", self.breaker.metrics())
+            return
+
+        try:
+            if self.is_dry_run:
+                self.system_logger.debug("%s is set to dry run", self.deployment_id)
+                self.dry_run_send(cycle_number)
+            else:
+                self.system_logger.debug("%s will be sending files to BODC's Archive API", self.deployment_id)
+                self.send_files_to_api(cycle_number)
+        except CircuitOpenError as coe:
+            self.system_logger.warning("Skipping the rest of cycle number %s: %s", cycle_number, coe)
+        except (AuthenticationError, FileNotFoundError) as e_obj:
+            # Refused by the preflight probe, so the cycle ends and waits rather than being retried at once
+            self.system_logger.error(
+                "Archive refused the uploads, skipping the rest of cycle number %s: %r", cycle_number, e_obj
+            )
+        except AccessCodeError as ace:
+            # The token could not be refreshed for the preflight probe, the files stay spooled for a later cycle
+            self.system_logger.error(
+                "Unable to refresh the access token, skipping the rest of cycle number %s: %r", cycle_number, ace
+            )
+
+        self.system_logger.debug("Archive circuit breaker: %s", self.breaker.metrics())
+        self.system_logger.info("Cycle number %s complete.", cycle_number)
+
+    def close(self) -> None:
+        """Stop watching for new files and close the local state."""
+        if self.watcher is not None:
+            self.watcher.close()
+            self.watcher = None
+        self.upload_state.close()
+        self.file_logger.close()
+        if self._owns_tokens:
+            self.tokens.stop_background_refresh()
+        if self._owns_engine and self.engine is not None:
+            self.engine.close()
 
     def check_deployment_not_stopped(self, deployment_id: str) -> bool:
         """Check if there was a request to stop the archival for the deployment id."""
@@ -113,213 +232,724 @@ class FilePusher:  # pylint: disable=too-many-instance-attributes
 
     def initialise_logging(self) -> None:
         """Sets up the file and system logging."""
-        self.file_logger = FileLogger(self.config.save_file_location, self.deployment_location, self.deployment_id)
-        self.system_logger.info(f"File Logger located at: {self.file_logger.file_path}")
+        self.file_logger = FileLogger(
+            self.config.save_file_location,
+            self.deployment_location,
+            self.deployment_id,
+            self.config.log_flush_interval,
+            self.config.log_fsync_interval,
+            self.config.ledger_max_bytes,
+            self.config.ledger_backups,
+        )
+        self.system_logger.info("File Logger located at: %s", self.file_logger.file_path)
+
+    def initialise_local_state(self) -> None:
+        """Sets up the upload state store, the resumable upload progress and the holdings cache."""
+        self.upload_state = UploadStateStore(
+            self.config.save_file_location, self.deployment_location, self.deployment_id
+        )
+        self.system_logger.info("Upload state store located at: %s", self.upload_state.file_path)
+        self.upload_progress = UploadProgress(
+            self.config.save_file_location, self.deployment_location, self.deployment_id
+        )
+        self.scan_marker = scan_marker(self.deployment_location, self.config.file_formats, self.is_recursive)
+        self.holdings_cache = HoldingsCache(
+            self.config.save_file_location,
+            self.deployment_location,
+            self.deployment_id,
+            self.config.holdings_full_refresh_cycles,
+            self.config.holdings_since_parameter,
+            self.config.http_timeout,
+        )
 
     def retrieve_file_paths(self, cycle_number: int) -> list[Path]:
         """Retrieve a list of absolute paths for desired glider files."""
-        self.system_logger.debug(f"Starting glider file search for {self.deployment_id} on cycle {cycle_number}")
+        self.file_stats = {scanned.path: scanned.stat for scanned in self.scan_files(cycle_number)}
+        file_paths = list(self.file_stats)
+
+        # Summarised, as listing every path of a large deployment would fill the log
+        self.system_logger.debug("Found %s files, the first being: %s", len(file_paths), file_paths[:LISTED_PATHS])
+        return file_paths
+
+    def scan_files(self, cycle_number: int) -> Iterator[ScannedFile]:
+        """Yield the desired glider files, with their stat results, as the deployment is scanned.
+
+        After the first cycle only files modified since the time in the deployment file
+        are yielded. On the first cycle of a warm restart, once a previous run spooled
+        every file its scan found, only files modified since that scan are yielded.
+        """
+        self.system_logger.debug("Starting glider file search for %s on cycle %s", self.deployment_id, cycle_number)
         recursive_state = "Active" if self.is_recursive else "Not active"
-        self.system_logger.info(f"Recursive folder searching is {recursive_state}")
+        self.system_logger.info("Recursive folder searching is %s", recursive_state)
 
         self.system_logger.debug("Opening deployment file to look for last run time")
         with open(Path(self.deployment_file), encoding="utf-8") as deployment_file:
             deployment_time = float(deployment_file.read())
-            self.system_logger.debug(f"deployment time is: {deployment_time}")
-            self.system_logger.debug(f"which in machine local time is {datetime.fromtimestamp(deployment_time)}")
-            self.system_logger.debug(f"which in UTC is {datetime.utcfromtimestamp(deployment_time)} ")
-
-        file_paths: list[Path] = []
-        self.system_logger.debug(f"file_paths start as empty: {file_paths}")
-        glob_prefix = "**/*" if self.is_recursive else "*"
-        self.system_logger.debug(f"search prefix is set to: {glob_prefix}")
-        self.system_logger.debug(f"searching for the the following formats: {self.config.file_formats}")
-        for file_format in self.config.file_formats:
-            unfiltered = list(self.deployment_location.glob(f"{glob_prefix}{file_format}"))
-            self.system_logger.debug(f"unfiltered set of files for {file_format} is: {str(unfiltered)}")
-            if not unfiltered:
-                self.system_logger.debug(f"No files found for {file_format}")
-                continue
-
-            if cycle_number > 1:
-                self.system_logger.debug(f"{cycle_number} is greater than 1 - this mean we will filter results")
-                file_paths.extend(
-                    list(
-                        filter(
-                            lambda file: file.lstat().st_mtime > deployment_time,
-                            unfiltered,
-                        )
-                    )
-                )
-            else:
-                self.system_logger.debug(f"{cycle_number} is less than 1 - this mean we will not filter results")
-                file_paths.extend(unfiltered)
-
-        self.system_logger.debug(f"checking the final object: {str(file_paths)}")
-        return file_paths
+            self.system_logger.debug("deployment time is: %s", deployment_time)
+            self.system_logger.debug("which in machine local time is %s", datetime.fromtimestamp(deployment_time))
+            self.system_logger.debug("which in UTC is %s ", datetime.utcfromtimestamp(deployment_time))
+
+        self.system_logger.debug("searching for the the following formats: %s", self.config.file_formats)
+        last_scan = self.upload_state.get_marker(self.scan_marker)
+        if cycle_number > 1:
+            self.system_logger.debug("%s is greater than 1 - this mean we will filter results", cycle_number)
+            modified_after: float | None = deployment_time
+        elif self.config.warm_restart and not self.is_dry_run and last_scan is not None:
+            # The deployment file is rewritten when the pusher is started, so the last scan is resumed from instead
+            self.system_logger.info(
+                "Warm restart, only files modified since the last scan at %s are scanned",
+                datetime.fromtimestamp(last_scan),
+            )
+            modified_after = last_scan - WATERMARK_OVERLAP
+        else:
+            self.system_logger.debug("%s is less than 1 - this mean we will not filter results", cycle_number)
+            modified_after = None
+
+        # A single walk of the directory covers every format, keeping the stat results from the listing
+        yield from scan_deployment(
+            self.deployment_location, self.config.file_formats, self.is_recursive, modified_after
+        )
 
     def dry_run_send(self, cycle_number: int) -> None:
         """Perform a dry run send of the files."""
-        self.system_logger.debug(f"Starting dry run for {self.deployment_id}")
+        self.system_logger.debug("Starting dry run for %s", self.deployment_id)
         files_currently_in_archive = self.get_existing_glider_files_for_deployment()
         duplicates, files_added = 0, 0
-        self.system_logger.info(f"Starting a dry run for deployment id: {self.deployment_id}")
-        self.system_logger.info(f"There are currently {len(files_currently_in_archive)} files in the BODC archive.")
+        self.system_logger.info("Starting a dry run for deployment id: %s", self.deployment_id)
+        self.system_logger.info("There are currently %s files in the BODC archive.", len(files_currently_in_archive))
 
-        for file in self.retrieve_file_paths(cycle_number):
+        scan_started = time.time()
+        for file, _ in self.scan_files(cycle_number):
             if file.name in files_currently_in_archive:
-                self.system_logger.warn(f"{file} already exists in deployment")
+                self.system_logger.warning("%s already exists in deployment", file)
                 duplicates += 1
             else:
-                self.system_logger.info(f"{file} will be sent to the archive in non dry-run mode")
+                self.system_logger.info("%s will be sent to the archive in non dry-run mode", file)
                 files_added += 1
 
         self.system_logger.info(
-            f"A total of {files_added} files would have been sent to the BODC archive in non dry-run mode"
+            "A total of %s files would have been sent to the BODC archive in non dry-run mode", files_added
         )
-        self.update_timestamp_in_deployment_file()
+        self.update_timestamp_in_deployment_file(scan_started)
         self.system_logger.info("Time updated for the next push.")
-        self.system_logger.info(f"A total of {duplicates} duplicates were detected")
+        self.system_logger.info("A total of %s duplicates were detected", duplicates)
 
     def get_existing_glider_files_for_deployment(self) -> set:
         """Handle the call to the program which retrieves the set of existing glider filenames."""
-        self.system_logger.debug(f"Starting fetch for glider file names for {self.deployment_id}")
+        self.system_logger.debug("Starting fetch for glider file names for %s", self.deployment_id)
         try:
             self.system_logger.debug(
-                f"Calling bodc archive endpoint to " f"get list of files BODC already hold for {self.deployment_id}"
+                "Calling bodc archive endpoint to get list of files BODC already hold for %s", self.deployment_id
+            )
+            files_in_current_deployment = self.retry_policy.call(
+                self.breaker.call,
+                self.holdings_cache.refresh,
+                self.config.bodc_archive_url,
+                self.session,
+                self.system_logger,
             )
-            files_in_current_deployment = return_existing_glider_files(self.config.bodc_archive_url, self.deployment_id)
         except HoldingsAccessError as hae:
-            self.system_logger.debug(f"Error for: {self.deployment_id} which is: {str(hae)}")
+            self.system_logger.debug("Error for: %s which is: %s", self.deployment_id, hae)
             self.system_logger.error(
                 "Unable to get existing files. A file send will not be attempted to avoid sending duplicated files."
             )
-            self.system_logger.debug(f"Full Traceback for holdings endpoint error: {traceback.format_exc()}")
+            self.system_logger.debug("Full Traceback for holdings endpoint error:", exc_info=True)
             raise HoldingsAccessError from None
 
-        self.system_logger.info(f"Filenames retrieved successfully for deployment: {self.deployment_id}")
+        self.system_logger.info("Filenames retrieved successfully for deployment: %s", self.deployment_id)
         return files_in_current_deployment
 
-    def _token_refresh(self) -> None:
-        """Private method to refresh access token."""
-        self.access_token = get_access_token_from_refresh_token(self.refresh_token, self.config)
+    @property
+    def access_token(self) -> str:
+        """The current access token."""
+        return self.tokens.access_token
+
+    @access_token.setter
+    def access_token(self, access_token: str) -> None:
+        self.tokens.access_token = access_token
+
+    @property
+    def refresh_token(self) -> str:
+        """The refresh token used to renew the access token."""
+        return self.tokens.refresh_token
 
-    def update_timestamp_in_deployment_file(self) -> None:
+    def request_access_token(self, refresh_token: str) -> str:
+        """Request a new access token from the auth provider, retrying as set by the retry policy."""
+        return self.retry_policy.call(get_access_token_from_refresh_token, refresh_token, self.config, self.session)
+
+    def _token_refresh(self, stale_token: str | None = None) -> None:
+        """Private method to refresh access token.
+
+        Args:
+            stale_token: The access token that was rejected. When upload workers run
+                concurrently, only the first to report a given token refreshes it.
+        """
+        self.tokens.refresh(stale_token)
+
+    def update_timestamp_in_deployment_file(self, scan_started: float | None = None) -> None:
         """Update timestamp in the DEP.txt file.
 
-        This method is called after each file send loop, and when called
-        it will write the current timestamp to each file.
+        This method is called after each file send loop, and when called it will
+        write the time the loop's scan started to the file, less WATERMARK_OVERLAP.
+        Files modified while the loop was running are then found by the next scan,
+        and files found again in the overlap are skipped as already sent.
 
+        Args:
+            scan_started: The time the loop's scan started, the current time if not given.
         """
-        self.system_logger.debug(f"Opening deployment file @ {str(Path(self.deployment_file))} for changing time")
-        current_time = time.time()
-        self.system_logger.debug(f"Current time set at: {current_time}")
-        self.system_logger.debug(f"which in machine local time is {datetime.fromtimestamp(current_time)}")
-        self.system_logger.debug(f"which in UTC is {datetime.utcfromtimestamp(current_time)} ")
+        self.system_logger.debug("Opening deployment file @ %s for changing time", Path(self.deployment_file))
+        current_time = (time.time() if scan_started is None else scan_started) - WATERMARK_OVERLAP
+        self.system_logger.debug("Current time set at: %s", current_time)
+        self.system_logger.debug("which in machine local time is %s", datetime.fromtimestamp(current_time))
+        self.system_logger.debug("which in UTC is %s ", datetime.utcfromtimestamp(current_time))
 
         with open(Path(self.deployment_file), "w", encoding="utf-8") as file:
             file.write(str(current_time))
 
-    def send_files_to_api(self, cycle_number: int) -> None:  # pylint: disable=R0912, R0915, too-many-locals  # noqa: C901
+    def send_files_to_api(self, cycle_number: int) -> None:
         """Manages the sending of files to the API."""
-        self.system_logger.debug(f"Starting file push for {self.deployment_id}")
+        self.system_logger.debug("Starting file push for %s", self.deployment_id)
         try:
             files_currently_in_archive = self.get_existing_glider_files_for_deployment()
         except HoldingsAccessError as hae:
             self.system_logger.debug("An error has happen on the holding Access")
-            self.system_logger.debug(f"{str(hae)}.")
+            self.system_logger.debug("%s.", hae)
             return
 
-        files_to_send_to_archive = self.retrieve_file_paths(cycle_number)
-        self.system_logger.info(f"There are {len(files_to_send_to_archive )} files locally")
+        self.system_logger.info(
+            "There are currently %s files in BODC archive for deploymentID: %s",
+            len(files_currently_in_archive),
+            self.deployment_id,
+        )
+        # The watermark for the next cycle, so files modified while this one runs are not missed
+        scan_started = time.time()
+        # Uploads start as the scan finds files, rather than once the whole deployment has been listed
+        files_to_send_to_archive = self._spooled_files(self.scan_files(cycle_number), scan_started)
+        files_added, duplicates = self.push_files(files_to_send_to_archive, files_currently_in_archive)
 
         self.system_logger.info(
-            f"There are currently {len(files_currently_in_archive)} "
-            f"files in BODC archive for deploymentID: {self.deployment_id}"
+            "There are %s files in archive after %s new files",
+            files_added + len(files_currently_in_archive),
+            files_added,
         )
-        duplicates, files_added = 0, 0
-        for file in files_to_send_to_archive:  # pylint: disable=too-many-nested-blocks
-            self.system_logger.info(f"Starting file transfer of {file} to BODC.")
-            if file.name in files_currently_in_archive:
-                duplicates += 1
-                self.system_logger.warn(f"{file} already exists in deployment")
+        self.system_logger.debug("about to set new time in deployment file")
+        self.update_timestamp_in_deployment_file(scan_started)
+        self.system_logger.debug("Have set new time in deployment file")
+        self.system_logger.info("Time updated for the next push.")
+        self.system_logger.info("A total of %s duplicates were detected", duplicates)
+
+    def _spooled_files(self, scanned_files: Iterable[ScannedFile], scan_started: float) -> Iterator[Path]:
+        """Yield the files to send this cycle, adding the files found by a scan to the spool as they are found.
+
+        The files already in the spool and due to be sent are yielded first. Each batch
+        of scanned files is spooled before any of it is yielded, so none are lost if the
+        pusher stops part way through the cycle, and once the whole scan is spooled a
+        later run can rely on the spool rather than scanning everything again.
+        """
+        waiting = self.upload_state.pending()
+        self.system_logger.info("There are %s files waiting in the spool", len(waiting))
+        yield from waiting
+
+        already_yielded = set(waiting)
+        files_found = 0
+        scanned = iter(scanned_files)
+        while True:
+            batch = list(islice(scanned, SPOOL_BATCH_SIZE))
+            files_found += len(batch)
+            due = set(self.upload_state.enqueue(file for file, _ in batch))
+            scan_finished = len(batch) < SPOOL_BATCH_SIZE
+            if scan_finished:
+                self.upload_state.set_marker(self.scan_marker, scan_started)
+                self.system_logger.info("There are %s files locally", files_found)
+            for file, file_stat in batch:
+                if file in due and file not in already_yielded:
+                    self.file_stats[file] = file_stat
+                    yield file
+            if scan_finished:
+                return
+
+    def push_files(self, files: Iterable[Path], files_currently_in_archive: set) -> tuple[int, int]:
+        """Send the files which are neither already sent by the pusher nor held by the archive.
+
+        Files leave the spool once they are sent, found to be held, or found to be removed.
+        Those which fail to send, or are modified within the last file_quiescence_period
+        seconds and so may still be being written, stay in the spool for a later cycle.
+        Uploads start while files is still being iterated, unless upload priority rules
+        are set, as every file must be known before they can be put in order.
+
+        Returns:
+            The number of files sent and the number of duplicates found in the archive.
+
+        Raises:
+            CircuitOpenError: If the archive became unavailable, once the uploads in flight have finished.
+        """
+        skipped: Counter[str] = Counter()
+        files_to_upload: Iterable[Path] = self._files_to_upload(files, files_currently_in_archive, skipped)
+        if self.config.upload_priority:
+            # Started in this order, so the most wanted files reach the archive first if the cycle is cut short
+            files_to_upload = prioritise(
+                list(files_to_upload),
+                self.config.upload_priority,
+                self.config.file_formats,
+                self.file_stats,
+                self.config.upload_priority_weights,
+                self.upload_state.retried(),
+            )
+        if self.config.preflight_probe:
+            files_to_upload = self._after_preflight(files_to_upload)
+
+        files_added, uploads_finished = 0, 0
+        for file, sent in self.upload_files(files_to_upload):
+            uploads_finished += 1
+            if sent:
+                files_added += 1
+                self.holdings_cache.add(file.name)
+                self.system_logger.info("File transfer complete for: %s", file)
+        self.holdings_cache.save()
+        self.file_stats.clear()
+        if files_added:
+            self._log_throughput(uploads_finished)
+        self.system_logger.info("%s files were skipped as already sent and unchanged", skipped["already_sent"])
+        self.system_logger.info("%s files were held back as they may still be being written", skipped["unsettled"])
+        if not self.breaker.is_available():
+            raise CircuitOpenError(
+                f"Archive unavailable, {uploads_finished - files_added} files failed and the files "
+                "not yet attempted will be sent by a later cycle"
+            )
+        return files_added, skipped["duplicates"]
+
+    def _files_to_upload(
+        self, files: Iterable[Path], files_currently_in_archive: set, skipped: Counter[str]
+    ) -> Iterator[Path]:
+        """Yield the files to be uploaded, counting those skipped by the reason in skipped."""
+        quiescence_period = self.config.file_quiescence_period
+        settled_before = time.time() - quiescence_period if quiescence_period > 0 else float("inf")
+        for file in files:
+            file_stat = self._spooled_file_stat(file)
+            if file_stat is None:
+                continue
+            if self.upload_state.is_uploaded(file, file_stat):
+                skipped["already_sent"] += 1
+                self.system_logger.debug("%s has already been sent and is unchanged", file)
+                self.upload_state.dequeue(file)
+            elif file.name in files_currently_in_archive:
+                skipped["duplicates"] += 1
+                self.system_logger.warning("%s already exists in deployment", file)
+                self.upload_state.mark_held(file, file_stat)
+            elif file_stat.st_mtime > settled_before:
+                skipped["unsettled"] += 1
+                self.system_logger.debug("%s was modified recently and may still be being written", file)
             else:
-                attempts = 0
-                self.system_logger.debug(f"Attempt {attempts}.")
-                while attempts < 3:
+                self.system_logger.info("Starting file transfer of %s to BODC.", file)
+                # Kept to put the files in order, and to record the file as it was when it was sent
+                self.file_stats[file] = file_stat
+                yield file
+
+    def _after_preflight(self, files: Iterable[Path]) -> Iterator[Path]:
+        """Yield files, probing the archive once the first is ready, before it is sent."""
+        remaining = iter(files)
+        for file in islice(remaining, 1):
+            self.preflight()
+            yield file
+        yield from remaining
+
+    def preflight(self) -> None:
+        """Probe the archive endpoint before any file is sent, refreshing a refused token once.
+
+        Raises:
+            AuthenticationError: If the token is still refused after being refreshed.
+            FileNotFoundError: If the archive has no endpoint for the deployment.
+            AccessCodeError: If the access token could not be refreshed.
+        """
+        access_token = self.tokens.get()
+        try:
+            self.breaker.call(
+                probe_archive,
+                self.deployment_id,
+                access_token,
+                self.config.bodc_archive_url,
+                self.mode,
+                self.system_logger,
+                self.session,
+                self.config.http_timeout,
+            )
+        except AuthenticationError:
+            self.system_logger.warning("Access token refused by the preflight probe, refreshing it")
+            self._token_refresh(access_token)
+            self.breaker.call(
+                probe_archive,
+                self.deployment_id,
+                self.tokens.access_token,
+                self.config.bodc_archive_url,
+                self.mode,
+                self.system_logger,
+                self.session,
+                self.config.http_timeout,
+            )
+
+    def _spooled_file_stat(self, file: Path) -> os.stat_result | None:
+        """The stat result of a file to be sent, taking it off the spool if it has been removed."""
+        try:
+            return self.file_stats.pop(file, None) or file.stat()
+        except FileNotFoundError:
+            self.system_logger.warning("%s was removed before it could be sent", file)
+            self.upload_state.dequeue(file)
+            return None
+
+    def send_new_files(self, files: list[Path]) -> None:
+        """Send files reported by the watcher straight away, between the periodic scans.
+
+        The time in the deployment file is left for the periodic scan to update, files
+        sent here are recognised by the upload state store when that scan finds them.
+        """
+        self.system_logger.info("%s new files detected in %s", len(files), self.deployment_location)
+        if self.is_dry_run:
+            for file in files:
+                self.system_logger.info("%s will be sent to the archive in non dry-run mode", file)
+            return
+        self.upload_state.enqueue(files)
+        try:
+            files_currently_in_archive = self.get_existing_glider_files_for_deployment()
+            files_added, duplicates = self.push_files(files, files_currently_in_archive)
+        except HoldingsAccessError:
+            self.system_logger.debug("An error has happen on the holding Access, files will be sent by the next scan")
+            return
+        except CircuitOpenError as coe:
+            self.system_logger.warning("New files will be sent by the next scan: %s", coe)
+            return
+        except (AuthenticationError, FileNotFoundError) as e_obj:
+            self.system_logger.error("Archive refused the uploads, new files will be sent by the next scan: %r", e_obj)
+            return
+        except AccessCodeError as ace:
+            self.system_logger.error(
+                "Unable to refresh the access token, new files will be sent by the next scan: %r", ace
+            )
+            return
+        self.system_logger.info("%s new files sent, %s duplicates were detected", files_added, duplicates)
+
+    def start_watcher(self) -> None:
+        """Start watching the deployment directory for new files, if enabled in the config."""
+        self.watcher = None
+        if not self.config.event_driven_uploads:
+            return
+        try:
+            self.watcher = InotifyWatcher(self.deployment_location, self.config.file_formats, self.is_recursive)
+        except InotifyUnavailableError as iue:
+            self.system_logger.warning("Event driven uploads unavailable, only periodic scans will be made: %s", iue)
+            return
+        self.system_logger.info("Watching %s for new files", self.deployment_location)
+
+    def wait_for_next_cycle(self) -> None:
+        """Wait until the next periodic scan is due.
+
+        When the watcher is running, new files it reports are sent as they arrive
+        instead of waiting for the next scan, which then acts as a safety net.
+        """
+        interval = self.config.archive_checker_frequency * 60
+        if self.watcher is None:
+            sleep(interval)
+            return
+
+        next_scan = time.monotonic() + interval
+        while (remaining := next_scan - time.monotonic()) > 0:
+            new_files = self.watcher.wait(remaining)
+            if not self.check_deployment_not_stopped(self.deployment_id):
+                return
+            if new_files:
+                self.send_new_files(new_files)
+            if self.watcher.overflowed:
+                self.system_logger.warning("File events were missed, starting a full scan")
+                self.watcher.overflowed = False
+                return
+
+    def upload_files(self, files: Iterable[Path]) -> Iterator[tuple[Path, bool]]:
+        """Upload files, yielding each file with whether it was sent as the uploads finish.
+
+        With 'upload_workers' set above 1 in the config the files are fanned out across
+        a bounded pool of threads, otherwise they are sent one at a time. A pusher given
+        a shared pool keeps at most 'max_in_flight' of its files in the pool at once.
+        With the asyncio transfer engine up to 'max_in_flight' files are sent at once
+        on the engine's event loop instead. No more files are started once the archive
+        circuit breaker has opened.
+        """
+        available = self._while_archive_available(files)
+        if self.engine is not None:
+            engine = self.engine
+            yield from self._upload_in_pool(
+                lambda file: engine.submit(self.send_file_with_retries_async(file)),
+                available,
+                max(1, self.max_in_flight),
+            )
+            return
+
+        if self.executor is not None:
+            executor = self.executor
+            yield from self._upload_in_pool(
+                lambda file: executor.submit(self.send_file_with_retries, file),
+                available,
+                max(1, self.max_in_flight),
+            )
+            return
+
+        workers = self.config.upload_workers
+        if workers <= 1:
+            for file in available:
+                yield file, self.send_file_with_retries(file)
+            return
+
+        self.system_logger.debug("Uploading files using %s workers", workers)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"upload-{self.deployment_id}") as pool:
+            yield from self._upload_in_pool(
+                lambda file: pool.submit(self.send_file_with_retries, file), available, workers
+            )
+
+    def _while_archive_available(self, files: Iterable[Path]) -> Iterator[Path]:
+        """Yield files to be uploaded until the archive circuit breaker opens."""
+        for file in files:
+            if not self.breaker.is_available():
+                return
+            yield file
+
+    @staticmethod
+    def _upload_in_pool(
+        submit: Callable[[Path], Future], files: Iterable[Path], max_in_flight: int
+    ) -> Iterator[tuple[Path, bool]]:
+        """Submit uploads of files, keeping no more than max_in_flight queued or running."""
+        remaining = iter(files)
+        in_flight: dict[Future, Path] = {}
+        for file in islice(remaining, max_in_flight):
+            in_flight[submit(file)] = file
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                file = in_flight.pop(future)
+                for next_file in islice(remaining, 1):
+                    in_flight[submit(next_file)] = next_file
+                yield file, future.result()
+
+    def _log_throughput(self, uploads_finished: int) -> None:
+        """Log the throughput of the files sent this cycle, from the records last written to the ledger."""
+        summary = throughput(self.file_logger.tail(uploads_finished))
+        self.system_logger.info(
+            "Sent %s files, %s bytes, at %.0f bytes per second with a mean latency of %.3f seconds",
+            summary["files"],
+            summary["bytes"],
+            summary["bytes_per_second"],
+            summary["mean_latency"],
+        )
+
+    def send_file_with_retries(self, file: Path) -> bool:
+        """Send a single file to the API, retrying as set by the retry policy.
+
+        Retryable failures, and uploads the archive answered with a status that is
+        not raised, are attempted again after a backoff delay, or straight away with
+        a new token if the access token was refused. The outcome is
+        recorded in the upload state store once the attempts are over.
+
+        Returns:
+            True if the file was archived, otherwise False.
+        """
+        policy = self.retry_policy
+        attempts, result = 0, "Fail"
+        started = time.monotonic()
+        self.system_logger.debug("Attempt %s.", attempts)
+        while attempts < policy.max_attempts:
+            access_token = self.tokens.access_token
+            attempts += 1
+            try:
+                # Refreshed here if it is about to expire, rather than sending the file to be refused
+                access_token = self.tokens.get()
+                result = self.breaker.call(  # pylint: disable=too-many-arguments,
+                    send_to_archive_api,
+                    file,
+                    self.deployment_id,
+                    access_token,
+                    self.config.bodc_archive_url,
+                    self.mode,
+                    self.system_logger,
+                    self.config,
+                    session=self.session,
+                    limiter=self.limiter,
+                    digests=self.digests,
+                    progress=self.upload_progress,
+                )
+                if result == "Success":
+                    self.system_logger.debug("ok")
+                    break
+                # Refused with a status that is not raised, such as 400, which is tried again as it always was
+                self.system_logger.debug("Oh dear something went wrong now on %s.", attempts)
+                if attempts < policy.max_attempts:
+                    policy.sleep(policy.delay(attempts))
+            except Exception as e_obj:  # pylint: disable=broad-except
+                result = repr(e_obj)
+                self._log_failed_attempt(file, e_obj, attempts)
+                if isinstance(e_obj, AuthenticationError):
                     try:
-                        response = send_to_archive_api(  # pylint: disable=too-many-arguments,
-                            file,
-                            self.deployment_id,
-                            self.access_token,
-                            self.config.bodc_archive_url,
-                            self.mode,
-                            self.system_logger,
-                            self.config,
-                        )
-                        if response == "Success":
-                            self.system_logger.debug("ok")
-                            files_added += 1
-                            self.file_logger.write_to_log_file(str(file))
-                            self.system_logger.info(f"File transfer complete for: {file}")
-                            break
-                    except AuthenticationError as ae_obj:
-                        self.system_logger.warn("Auth failed, attempting to reset token")
-                        self.system_logger.debug(f"{str(ae_obj)}")
-                        self.system_logger.debug("There was an error with the token: lets refresh")
-                        self._token_refresh()
+                        self._token_refresh(access_token)
                         self.system_logger.debug("Ok we have done the refresh")
+                    except AccessCodeError as ace:
+                        result = repr(ace)
+                        self._log_failed_attempt(file, ace, attempts)
+                        if attempts < policy.max_attempts:
+                            policy.sleep(policy.delay(attempts))
+                elif policy.is_retryable(e_obj) and attempts < policy.max_attempts:
+                    policy.sleep(policy.delay(attempts))
+                if not policy.is_retryable(e_obj):
+                    break
+
+        return self._record_outcome(file, result, attempts, time.monotonic() - started)
+
+    async def _fresh_token_async(self) -> str:
+        """The access token, refreshed off the event loop if it is about to expire, so the file is not refused."""
+        if self.tokens.is_expiring():
+            return await asyncio.to_thread(self.tokens.get)
+        return self.tokens.access_token
+
+    async def send_file_with_retries_async(self, file: Path) -> bool:
+        """Asyncio counterpart of send_file_with_retries, run on the transfer engine's event loop."""
+        policy = self.retry_policy
+        attempts, result = 0, "Fail"
+        started = time.monotonic()
+        while attempts < policy.max_attempts:
+            access_token = self.tokens.access_token
+            attempts += 1
+            try:
+                access_token = await self._fresh_token_async()
+                result = await self.breaker.call_async(  # pylint: disable=too-many-arguments,
+                    send_to_archive_async,
+                    self.engine.client,  # type: ignore[union-attr]
+                    file,
+                    self.deployment_id,
+                    access_token,
+                    self.config.bodc_archive_url,
+                    self.mode,
+                    self.system_logger,
+                    self.config,
+                    session=self.session,
+                    limiter=self.limiter,
+                    digests=self.digests,
+                    progress=self.upload_progress,
+                )
+                if result == "Success":
+                    break
+                self.system_logger.debug("Oh dear something went wrong now on %s.", attempts)
+                if attempts < policy.max_attempts:
+                    await asyncio.sleep(policy.delay(attempts))
+            except Exception as e_obj:  # pylint: disable=broad-except
+                result = repr(e_obj)
+                self._log_failed_attempt(file, e_obj, attempts)
+                if isinstance(e_obj, AuthenticationError):
+                    try:
+                        # The refresh is single-flight under a lock, so it is made off the event loop
+                        await asyncio.to_thread(self._token_refresh, access_token)
+                    except AccessCodeError as ace:
+                        result = repr(ace)
+                        self._log_failed_attempt(file, ace, attempts)
+                        if attempts < policy.max_attempts:
+                            await asyncio.sleep(policy.delay(attempts))
+                elif policy.is_retryable(e_obj) and attempts < policy.max_attempts:
+                    await asyncio.sleep(policy.delay(attempts))
+                if not policy.is_retryable(e_obj):
+                    break
+
+        return await asyncio.to_thread(self._record_outcome, file, result, attempts, time.monotonic() - started)
+
+    def _log_failed_attempt(self, file: Path, exc: Exception, attempts: int) -> None:
+        """Log why an attempt to send a file failed."""
+        if isinstance(exc, CircuitOpenError):
+            self.system_logger.warning("%s not sent: %s", file, exc)
+        elif isinstance(exc, AuthenticationError):
+            self.system_logger.warning("Auth failed, attempting to reset token")
+            self.system_logger.debug("%s", exc)
+            self.system_logger.debug("There was an error with the token: lets refresh")
+        elif isinstance(exc, UploadDeadlineError):
+            self.system_logger.error("%s was sent too slowly and is left for a later cycle", file)
+            self.system_logger.debug("%s", exc)
+        elif isinstance(exc, AccessCodeError):
+            self.system_logger.error("Unable to refresh the access token to send %s", file)
+            self.system_logger.debug("%s", exc)
+        elif isinstance(exc, FileUploadError):
+            self.system_logger.error("File transfer Failed for: %s", file)
+            self.system_logger.debug("%s", exc)
+        elif isinstance(exc, FileNotFoundError):
+            self.system_logger.error("Archive Endpoint not Found for: %s", file)
+            self.system_logger.debug("%s", exc)
+        elif isinstance(exc, ConnectTimeout):
+            self.system_logger.error("Connection timed out during transfer of %s", file)
+            if exc.request:
+                self.system_logger.error("This attempt failed with the following full URL: %s", exc.request.url)
+            self.system_logger.error("This attempt failed with the following output: %s", traceback.format_exc())
+            self.system_logger.debug("%s", exc)
+        elif isinstance(exc, (ConnectionError, RequestException)):
+            self.system_logger.error(
+                "Failed to connect to %s during transfer of %s", self.config.bodc_archive_url, file
+            )
+            self.system_logger.error("This attempt failed with the following output: %s", traceback.format_exc())
+            self.system_logger.debug("%s", exc)
+        else:
+            self.system_logger.debug("This is a catch all then:")
+            self.system_logger.debug("%s", exc)
+            self.system_logger.error("This attempt failed with the following output: %s", traceback.format_exc())
+        self.system_logger.debug("Oh dear something went wrong now on %s.", attempts)
+
+    def _record_outcome(self, file: Path, result: str, attempts: int, elapsed: float = 0.0) -> bool:
+        """Record the outcome of sending a file in the upload state store and the ledger.
+
+        A file which was not sent stays in the spool, to be sent again by a later cycle
+        once its backoff has passed, or is moved to the dead-letter status once it has
+        failed in retry_queue_max_failures cycles. Failures while the archive is
+        unavailable are not held against the file, it is sent once the archive is back.
+        """
+        # As the file was scanned, a file modified while it was sent is then sent again
+        file_stat = self.file_stats.pop(file, None)
+        if result == "Success":
+            sha256 = self._record_in_ledger(file, result, attempts, elapsed, UPLOADED)
+            self.upload_state.mark_uploaded(file, result, attempts, sha256, file_stat)
+            return True
+        if not self.breaker.is_available():
+            self._record_in_ledger(file, result, attempts, elapsed, FAILED)
+            self.upload_state.mark_failed(file, result, attempts, file_stat=file_stat)
+            return False
+
+        policy = self.requeue_policy
+        failures = self.upload_state.spooled_failures(file) + 1
+        if 0 < policy.max_attempts <= failures:
+            self.system_logger.error("%s failed to send in %s cycles and will not be retried", file, failures)
+            self._record_in_ledger(file, result, attempts, elapsed, DEAD_LETTER)
+            self.upload_state.mark_dead_letter(file, result, attempts, file_stat)
+            return False
+        delay = policy.delay(failures)
+        self.system_logger.warning("%s failed to send in %s cycles, retrying in %.0f seconds", file, failures, delay)
+        self._record_in_ledger(file, result, attempts, elapsed, FAILED)
+        self.upload_state.mark_failed(file, result, attempts, retry_at=time.time() + delay, file_stat=file_stat)
+        return False
 
-                    except FileUploadError as fue_obj:
-                        self.system_logger.error(f"File transfer Failed for: {file}")
-                        self.system_logger.debug(f"{str(fue_obj)}")
-
-                    except FileNotFoundError as fue_obj:
-                        self.system_logger.error(f"Archive Endpoint not Found for: {file}")
-                        self.system_logger.debug(f"{str(fue_obj)}")
-
-                    except ConnectTimeout as exc_obj:
-                        self.system_logger.error(f"Connection timed out during transfer of {file}")
-                        if exc_obj.request:
-                            self.system_logger.error(
-                                f"This attempt failed with the following full URL: {exc_obj.request.url}"
-                            )
-                        self.system_logger.error(
-                            f"This attempt failed with the following output: {traceback.format_exc()}"
-                        )
-                        self.system_logger.debug(f"{str(exc_obj)}")
-                    except ConnectionError as ce_obj:
-                        self.system_logger.error(
-                            f"Failed to connect to {self.config.bodc_archive_url} during transfer of {file}"
-                        )
-                        self.system_logger.error(
-                            f"This attempt failed with the following output: {traceback.format_exc()}"
-                        )
-                        self.system_logger.debug(f"{str(ce_obj)}")
-                    except RequestException as re_obj:
-                        self.system_logger.error(
-                            f"Failed to connect to {self.config.bodc_archive_url} during transfer of {file}"
-                        )
-                        self.system_logger.error(
-                            f"This attempt failed with the following output: {traceback.format_exc()}"
-                        )
-                        self.system_logger.debug(f"{str(re_obj)}")
-                    except Exception as e_obj:  # pylint: disable=broad-except
-                        self.system_logger.debug("This is a catch all then:")
-                        self.system_logger.debug(f"{str(e_obj)}")
-                        self.system_logger.error(
-                            f"This attempt failed with the following output: {traceback.format_exc()}"
-                        )
-                        break
-                    finally:
-                        attempts += 1
-                        self.system_logger.debug(f"Oh dear something went wrong now on {attempts}.")
+    # pylint: disable=R0913,R0917
+    def _record_in_ledger(  # pylint: disable=too-many-arguments
+        self, file: Path, result: str, attempts: int, elapsed: float, status: str
+    ) -> str | None:
+        """Append the outcome of sending a file to the ledger, returning the sha256 of a file sent.
 
-        self.system_logger.info(
-            f"There are {files_added + len(files_currently_in_archive)} files in archive after {files_added} new files"
+        The sha256 computed while the file was uploaded is used, the file only being read
+        again for it if the upload did not give one.
+        """
+        sha256 = self.digests.pop(file, None)
+        if status != UPLOADED:
+            sha256 = None
+        try:
+            size: int | None = file.stat().st_size
+            if status == UPLOADED and sha256 is None:
+                sha256 = file_sha256(file)
+        except OSError:
+            size = None
+        self.file_logger.write_to_log_file(
+            str(file),
+            status=status,
+            response=result,
+            bytes=size,
+            sha256=sha256,
+            latency=round(elapsed, 6),
+            attempts=attempts,
+            mode=self.mode,
         )
-        self.system_logger.debug("about to set new time in deployment file")
-        self.update_timestamp_in_deployment_file()
-        self.system_logger.debug("Have set new time in deployment file")
-        self.system_logger.info("Time updated for the next push.")
-        self.system_logger.info(f"A total of {duplicates} duplicates were detected")
+        return sha256
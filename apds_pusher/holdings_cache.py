@@ -0,0 +1,141 @@
+"""Local cache of the files the archive holds for a deployment."""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+from apds_pusher.http_session import DEFAULT_TIMEOUT
+from apds_pusher.send_to_archive import fetch_holdings, holdings_file_count, parse_holdings
+from apds_pusher.systemlogger import SystemLogger
+from apds_pusher.utils.deployment_utils import state_file_location
+
+
+class HoldingsCache:
+    """The archive's holdings for a deployment, cached on disk between cycles.
+
+    The holdings are refreshed with a conditional request each cycle, so an unchanged
+    list is not downloaded again. If 'since_parameter' is set, only the files added
+    since the last refresh are requested and merged into the cache instead. Files the
+    pusher uploads are added to the cache as they are sent. The whole list is fetched
+    again every 'full_refresh_cycles' refreshes, or as soon as the cache is found to be
+    missing files the archive reports holding.
+    """
+
+    # pylint: disable=R0917
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        save_file_location: Path,
+        deployment_location: Path,
+        deployment_id: str,
+        full_refresh_cycles: int,
+        since_parameter: str = "",
+        timeout: tuple[float, float] = DEFAULT_TIMEOUT,
+    ) -> None:
+        """Load the cached holdings for a deployment, if there are any.
+
+        The cache file is kept in the first of these locations that exists
+        - The location specified in the config file (save_file_location)
+        - The location of the deployment
+        - The current working directory.
+        """
+        valid = state_file_location(save_file_location, deployment_location)
+        self.file_path = valid / f"deployment-{deployment_id}-holdings.json"
+        self.deployment_id = deployment_id
+        self.full_refresh_cycles = full_refresh_cycles
+        self.since_parameter = since_parameter
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self.filenames: set[str] | None = None
+        self.etag: str | None = None
+        self.fetched_at: float | None = None
+        self.refreshes_since_full = 0
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            cached = json.loads(self.file_path.read_text(encoding="utf-8"))
+            self.filenames = set(cached["filenames"])
+            self.etag = cached["etag"]
+            self.fetched_at = cached["fetched_at"]
+            self.refreshes_since_full = cached["refreshes_since_full"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+            # No usable cache, so the first refresh fetches everything
+            self.filenames = None
+
+    def save(self) -> None:
+        """Write the cache to disk."""
+        with self._lock:
+            cached = {
+                "filenames": sorted(self.filenames or ()),
+                "etag": self.etag,
+                "fetched_at": self.fetched_at,
+                "refreshes_since_full": self.refreshes_since_full,
+            }
+        temporary_path = self.file_path.with_suffix(".tmp")
+        temporary_path.write_text(json.dumps(cached), encoding="utf-8")
+        os.replace(temporary_path, self.file_path)
+
+    def add(self, filename: str) -> None:
+        """Record a file the pusher has sent as held by the archive."""
+        with self._lock:
+            if self.filenames is not None:
+                self.filenames.add(filename)
+
+    def refresh(self, bodc_archive_url: str, session: requests.Session | None, logger: SystemLogger) -> set[str]:
+        """Bring the cache up to date with the archive and return the held filenames.
+
+        Raises:
+            HoldingsAccessError: If the holdings endpoint could not be called.
+        """
+        started_at = time.time()
+        full = self.filenames is None or self.refreshes_since_full + 1 >= self.full_refresh_cycles
+        if full:
+            logger.debug("Fetching the full holdings for %s", self.deployment_id)
+            self._fetch_full(bodc_archive_url, session)
+        elif self.since_parameter:
+            since = datetime.fromtimestamp(self.fetched_at or 0, tz=timezone.utc).isoformat()
+            holdings, _ = fetch_holdings(
+                bodc_archive_url,
+                self.deployment_id,
+                session,
+                params={self.since_parameter: since},
+                timeout=self.timeout,
+            )
+            files = holdings["files"]  # type: ignore[index]
+            with self._lock:
+                self.filenames |= parse_holdings(files)  # type: ignore[operator]
+                missing = holdings_file_count(files) > len(self.filenames)  # type: ignore[arg-type]
+            if missing:
+                logger.warning("Cached holdings for %s are missing files, fetching them all", self.deployment_id)
+                self._fetch_full(bodc_archive_url, session)
+            else:
+                self.refreshes_since_full += 1
+        else:
+            holdings, etag = fetch_holdings(
+                bodc_archive_url, self.deployment_id, session, etag=self.etag, timeout=self.timeout
+            )
+            if holdings is None:
+                logger.debug("Holdings for %s are unchanged since the last refresh", self.deployment_id)
+            else:
+                with self._lock:
+                    self.filenames = parse_holdings(holdings["files"])
+                self.etag = etag
+            self.refreshes_since_full += 1
+
+        self.fetched_at = started_at
+        self.save()
+        with self._lock:
+            return set(self.filenames)  # type: ignore[arg-type]
+
+    def _fetch_full(self, bodc_archive_url: str, session: requests.Session | None) -> None:
+        holdings, etag = fetch_holdings(bodc_archive_url, self.deployment_id, session, timeout=self.timeout)
+        with self._lock:
+            self.filenames = parse_holdings(holdings["files"])  # type: ignore[index]
+        self.etag = etag
+        self.refreshes_since_full = 0
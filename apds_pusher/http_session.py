@@ -0,0 +1,33 @@
+"""Shared HTTP session used for every call made by a pusher."""
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from apds_pusher.config_parser import Configuration
+
+#: Seconds allowed to connect, and to wait for data, in calls made without a configuration
+DEFAULT_TIMEOUT: tuple[float, float] = (10.0, 120.0)
+
+
+def create_session(config: Configuration) -> requests.Session:
+    """Create a pooled HTTP session for the holdings, upload and token endpoints.
+
+    A single session is created per pusher so that TCP and TLS connections are kept
+    alive and reused between calls rather than renegotiated for every request.
+
+    Args:
+        config: A configuration class object, used to size the connection pools.
+
+    Returns:
+        A requests session with pooled adapters mounted for http and https.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=config.http_pool_connections,
+        pool_maxsize=config.http_max_connections_per_host,
+        pool_block=True,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Connection"] = "keep-alive"
+    return session
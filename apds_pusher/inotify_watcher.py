@@ -0,0 +1,150 @@
+"""Event driven detection of new glider files using Linux inotify."""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+from apds_pusher.scanner import compile_format_matcher, scan_deployment
+
+# Event masks from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+#: Time spent gathering further events once one arrives, so files landing together are sent together.
+EVENT_BATCH_SECONDS = 1.0
+
+
+class InotifyUnavailableError(Exception):
+    """Raised when inotify cannot be used on this system."""
+
+
+class InotifyWatcher:
+    """Report glider files as they are finished being written to a deployment directory.
+
+    A file is reported once it is closed after writing, or moved into the directory,
+    and its name matches one of the configured file formats. In recursive mode new
+    sub-directories are watched as they appear.
+    """
+
+    def __init__(self, deployment_location: Path, file_formats: list[str], recursive: bool) -> None:
+        """Start watching the deployment directory.
+
+        Raises:
+            InotifyUnavailableError: If not on Linux, or the inotify instance cannot be created.
+        """
+        if not sys.platform.startswith("linux"):
+            raise InotifyUnavailableError(f"inotify is not available on {sys.platform}")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise InotifyUnavailableError(os.strerror(ctypes.get_errno()))
+
+        self.deployment_location = deployment_location
+        self.file_formats = file_formats
+        self.recursive = recursive
+        self._matches = compile_format_matcher(file_formats)
+        self._watches: dict[int, Path] = {}
+        #: Set when the kernel dropped events, meaning a full scan is needed to catch up.
+        self.overflowed = False
+
+        self._add_watch(deployment_location)
+        if recursive:
+            for directory, _, _ in os.walk(deployment_location):
+                self._add_watch(Path(directory))
+
+    def _add_watch(self, directory: Path) -> None:
+        watch = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+        if watch < 0:
+            errno = ctypes.get_errno()
+            if directory == self.deployment_location:
+                raise InotifyUnavailableError(f"Cannot watch {directory}: {os.strerror(errno)}")
+            # A sub-directory removed before it could be watched
+            return
+        self._watches[watch] = directory
+
+    def _read_events(self) -> list[Path]:
+        try:
+            buffer = os.read(self._fd, _READ_SIZE)
+        except BlockingIOError:
+            return []
+
+        found: list[Path] = []
+        offset = 0
+        while offset < len(buffer):
+            watch, mask, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(watch, None)
+                continue
+            directory = self._watches.get(watch)
+            if directory is None or not name:
+                continue
+            path = directory / name
+            if mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_new_directory(path, found)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and self._matches(name):
+                found.append(path)
+        return found
+
+    def _watch_new_directory(self, directory: Path, found: list[Path]) -> None:
+        """Watch a new sub-directory, picking up any files written before the watch was added."""
+        self._add_watch(directory)
+        for sub_directory, _, _ in os.walk(directory):
+            if Path(sub_directory) != directory:
+                self._add_watch(Path(sub_directory))
+        found.extend(scanned.path for scanned in scan_deployment(directory, self.file_formats, True))
+
+    def wait(self, timeout: float) -> list[Path]:
+        """Wait for new files, returning as soon as any arrive or the timeout passes.
+
+        Once a first file arrives, further events are gathered for a short while so
+        that files landing together are returned together.
+
+        Args:
+            timeout: The longest time to wait, in seconds.
+
+        Returns:
+            The new files, without duplicates, in the order they arrived.
+        """
+        deadline = time.monotonic() + timeout
+        found: list[Path] = []
+        while (remaining := deadline - time.monotonic()) > 0 and not self.overflowed:
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if not readable:
+                break
+            found.extend(self._read_events())
+            if found:
+                deadline = min(deadline, time.monotonic() + EVENT_BATCH_SECONDS)
+        return list(dict.fromkeys(found))
+
+    def close(self) -> None:
+        """Stop watching and release the inotify instance."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
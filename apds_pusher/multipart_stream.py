@@ -0,0 +1,116 @@
+"""Streamed multipart/form-data request bodies for file uploads."""
+
+import hashlib
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+from urllib3.fields import RequestField
+from urllib3.filepost import choose_boundary
+
+from apds_pusher.bandwidth import BandwidthLimiter
+
+#: Size of the file chunks read and sent at a time when no size is given.
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class UploadDeadlineError(Exception):
+    """Raised when a file is still being sent once its deadline has passed.
+
+    Not an OSError, so it reaches the caller as it is rather than wrapped as a failure
+    to connect, and is neither retried straight away nor counted against the archive.
+    """
+
+
+class MultipartFileStream:
+    """An iterable multipart/form-data body containing a single file.
+
+    The body is produced as the multipart headers, the file contents read in
+    fixed size chunks, and the closing boundary. Only one chunk of the file is
+    held in memory at a time, however large the file is. The total length is
+    known up front so the request is still sent with a Content-Length header.
+
+    A new read of the file is started each time the body is iterated, so the
+    same instance can be sent again if a request is retried. With a time limit,
+    each send of the body fails once it has taken longer than that. The file's
+    sha256 is computed from the chunks as they are read, so the file need not be
+    read again to record what was sent.
+    """
+
+    # pylint: disable=R0917
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        file_location: Path,
+        field_name: str = "data",
+        file_content_type: str = "multipart/form-data",
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        boundary: str | None = None,
+        time_limit: float | None = None,
+        limiter: BandwidthLimiter | None = None,
+    ) -> None:
+        """Set up the multipart body for a file.
+
+        Args:
+            file_location: The file to be sent.
+            field_name: The name of the form field the file is sent as.
+            file_content_type: The Content-Type given for the file part.
+            chunk_size: The number of bytes read from the file at a time.
+            boundary: The multipart boundary, a random one is chosen if not given.
+            time_limit: Seconds allowed for sending the body, without limit if not given.
+            limiter: Paces the file's chunks to the bandwidth limit, if given.
+        """
+        self.file_location = file_location
+        self.chunk_size = chunk_size
+        self.time_limit = time_limit
+        self.limiter = limiter
+        self.boundary = boundary or choose_boundary()
+
+        field = RequestField(name=field_name, data=b"", filename=file_location.name)
+        field.make_multipart(content_type=file_content_type)
+        self._preamble = f"--{self.boundary}\r\n".encode("latin-1") + field.render_headers().encode("utf-8")
+        self._epilogue = f"\r\n--{self.boundary}--\r\n".encode("latin-1")
+
+        # The size is fixed here so the body always matches the Content-Length sent.
+        self.file_size = file_location.stat().st_size
+        #: The sha256 of the file, once the body has been read to its end
+        self.sha256: str | None = None
+
+    @property
+    def content_type(self) -> str:
+        """The Content-Type header value for the request."""
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        """The total length of the encoded body in bytes."""
+        return len(self._preamble) + self.file_size + len(self._epilogue)
+
+    def __iter__(self) -> Iterator[bytes]:
+        """Yield the encoded body, reading the file a chunk at a time.
+
+        Raises:
+            UploadDeadlineError: If the body has taken longer than its time limit to send.
+        """
+        deadline = None if self.time_limit is None else time.monotonic() + self.time_limit
+        yield self._preamble
+        remaining = self.file_size
+        digest = hashlib.sha256()
+        with open(self.file_location, "rb") as file:
+            while remaining > 0:
+                if deadline is not None and time.monotonic() > deadline:
+                    raise UploadDeadlineError(
+                        f"{self.file_location} was not sent within {self.time_limit:.0f} seconds, "
+                        f"{remaining} bytes were left"
+                    )
+                chunk = file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    raise OSError(f"{self.file_location} was truncated while being sent")
+                remaining -= len(chunk)
+                digest.update(chunk)
+                if self.limiter is not None:
+                    # Time spent held back by the limiter does not count towards the deadline
+                    waited = self.limiter.consume(len(chunk))
+                    if deadline is not None:
+                        deadline += waited
+                yield chunk
+        self.sha256 = digest.hexdigest()
+        yield self._epilogue
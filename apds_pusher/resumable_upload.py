@@ -0,0 +1,235 @@
+"""Resumable, chunked uploads of large Recovery mode archives.
+
+Large files are sent to the archive as a series of numbered parts rather than in
+a single request, using the following endpoints below the Recovery archive URL
+(``archiveRecovery/{deployment_id}``):
+
+- ``POST uploads`` starts an upload session and returns its ``uploadId``.
+- ``GET uploads/{uploadId}`` returns the part numbers the archive already holds.
+- ``PUT uploads/{uploadId}/parts/{part_number}`` sends one part of the file.
+- ``POST uploads/{uploadId}/commit`` assembles the parts into the archived file.
+
+The parts already sent are recorded on disk, so an upload which is interrupted,
+even by the pusher being restarted, carries on from the first missing part.
+"""
+
+import json
+import math
+import os
+import threading
+from pathlib import Path
+
+import requests as rq
+
+from apds_pusher.bandwidth import BandwidthLimiter, ThrottledBytes
+from apds_pusher.config_parser import Configuration
+from apds_pusher.systemlogger import SystemLogger
+from apds_pusher.upload_state import file_sha256
+from apds_pusher.utils.deployment_utils import state_file_location
+
+# Guards the read-modify-write of progress files shared by concurrent uploads.
+_PROGRESS_LOCK = threading.Lock()
+
+
+class ResumableUploadError(Exception):
+    """Raised when the archive rejects a step of a resumable upload."""
+
+    def __init__(self, message: str, status_code: int | None = None) -> None:
+        """Store the HTTP status code returned by the archive."""
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UploadProgress:
+    """A record of the resumable uploads in progress for a deployment."""
+
+    def __init__(self, save_file_location: Path, deployment_location: Path, deployment_id: str) -> None:
+        """Set the location of the progress file.
+
+        The file is kept in the first of these locations that exists
+        - The location specified in the config file (save_file_location)
+        - The location of the deployment
+        - The current working directory.
+        """
+        self.file_path = state_file_location(save_file_location, deployment_location) / (
+            f"deployment-{deployment_id}-resumable.json"
+        )
+
+    def _load(self) -> dict:
+        try:
+            return json.loads(self.file_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self, uploads: dict) -> None:
+        # Written to a temporary file and renamed so a crash never leaves a partial record.
+        temporary_path = self.file_path.with_suffix(".tmp")
+        temporary_path.write_text(json.dumps(uploads), encoding="utf-8")
+        os.replace(temporary_path, self.file_path)
+
+    def get(self, file_location: Path) -> dict | None:
+        """Return the upload in progress for a file, if the file is unchanged since it started."""
+        with _PROGRESS_LOCK:
+            entry = self._load().get(str(file_location.resolve()))
+        file_stat = file_location.stat()
+        if entry and entry["size"] == file_stat.st_size and entry["mtime"] == file_stat.st_mtime:
+            return entry
+        return None
+
+    def start(self, file_location: Path, upload_id: str, part_size: int) -> None:
+        """Record the start of a new upload session for a file."""
+        file_stat = file_location.stat()
+        with _PROGRESS_LOCK:
+            uploads = self._load()
+            uploads[str(file_location.resolve())] = {
+                "upload_id": upload_id,
+                "size": file_stat.st_size,
+                "mtime": file_stat.st_mtime,
+                "part_size": part_size,
+                "parts": [],
+            }
+            self._save(uploads)
+
+    def add_part(self, file_location: Path, part_number: int) -> None:
+        """Record a part of a file as received by the archive."""
+        with _PROGRESS_LOCK:
+            uploads = self._load()
+            uploads[str(file_location.resolve())]["parts"].append(part_number)
+            self._save(uploads)
+
+    def remove(self, file_location: Path) -> None:
+        """Forget the upload for a file, once it is committed or can no longer be resumed."""
+        with _PROGRESS_LOCK:
+            uploads = self._load()
+            if uploads.pop(str(file_location.resolve()), None) is not None:
+                self._save(uploads)
+
+
+def _check_response(response: rq.Response, step: str) -> None:
+    """Raise a ResumableUploadError if the archive did not accept a step of the upload."""
+    if not response.ok:
+        raise ResumableUploadError(f"{step} failed with status {response.status_code}", response.status_code)
+
+
+# pylint: disable=R0917
+def _send_part(  # pylint: disable=too-many-arguments
+    part_url: str,
+    data: bytes | ThrottledBytes,
+    headers: dict,
+    attempts: int,
+    logger: SystemLogger,
+    session: rq.Session | None,
+    timeout: tuple[float, float],
+) -> None:
+    """Send one part, retrying on connection errors and server errors."""
+    for attempt in range(1, attempts + 1):
+        try:
+            response = (session or rq).put(part_url, data=data, headers=headers, timeout=timeout)  # type: ignore
+            _check_response(response, "Sending part")
+            return
+        except ResumableUploadError as rue_obj:
+            if (rue_obj.status_code is not None and rue_obj.status_code < 500) or attempt == attempts:
+                raise
+            logger.warning("Part upload to %s failed (attempt %s of %s): %s", part_url, attempt, attempts, rue_obj)
+        except (rq.exceptions.ConnectionError, rq.exceptions.Timeout) as exc_obj:
+            if attempt == attempts:
+                raise
+            logger.warning("Part upload to %s failed (attempt %s of %s): %s", part_url, attempt, attempts, exc_obj)
+
+
+# pylint: disable=R0917
+def send_resumable_upload(  # pylint: disable=too-many-arguments,too-many-locals
+    file_location: Path,
+    archive_url: str,
+    deployment_id: str,
+    access_token: str,
+    logger: SystemLogger,
+    config: Configuration,
+    session: rq.Session | None = None,
+    limiter: BandwidthLimiter | None = None,
+    progress: UploadProgress | None = None,
+) -> str:
+    """Send a file to the archive as a resumable, chunked upload.
+
+    Args:
+        file_location: The file to be archived.
+        archive_url: The Recovery archive URL for the deployment.
+        deployment_id: Used to name the progress file.
+        access_token: Sent in the headers to the Archive API.
+        logger: A system logger.
+        config: A configuration class object, giving the part size and attempts per part.
+        session: The pusher's shared HTTP session, a new connection is made if not given.
+        limiter: The bandwidth limiter shared by every upload in the process, if any.
+        progress: The record of the deployment's uploads in progress. If not given it is kept
+            as if the file's directory were the deployment's.
+
+    Returns:
+        The sha256 of the file, as sent to commit the upload.
+
+    Raises:
+        ResumableUploadError: If the archive rejects any step of the upload.
+    """
+    http = session or rq
+    uploads_url = archive_url.rstrip("/") + "/uploads"
+    headers = {"Authorization": f"Bearer {access_token}"}
+    if progress is None:
+        progress = UploadProgress(config.save_file_location, file_location.parent, deployment_id)
+    file_size = file_location.stat().st_size
+
+    upload_id, completed_parts = None, set()
+    entry = progress.get(file_location)
+    if entry:
+        status = http.get(f"{uploads_url}/{entry['upload_id']}", headers=headers, timeout=config.http_timeout)
+        if status.status_code == 404:
+            logger.info("Upload session for %s has expired, starting again", file_location)
+            progress.remove(file_location)
+        else:
+            _check_response(status, "Resuming upload")
+            upload_id, part_size = entry["upload_id"], entry["part_size"]
+            completed_parts = set(status.json()["parts"])
+
+    if upload_id is None:
+        part_size = config.resumable_part_size
+        response = http.post(
+            uploads_url,
+            headers=headers,
+            json={"filename": file_location.name, "size": file_size, "partSize": part_size},
+            timeout=config.http_timeout,
+        )
+        _check_response(response, "Starting upload")
+        upload_id = response.json()["uploadId"]
+        progress.start(file_location, upload_id, part_size)
+
+    total_parts = max(1, math.ceil(file_size / part_size))
+    if completed_parts:
+        logger.info("Resuming upload of %s with %s of %s parts sent", file_location, len(completed_parts), total_parts)
+
+    part_headers = {**headers, "Content-Type": "application/octet-stream"}
+    with open(file_location, "rb") as file:
+        for part_number in range(total_parts):
+            if part_number in completed_parts:
+                continue
+            file.seek(part_number * part_size)
+            data = file.read(part_size)
+            _send_part(
+                f"{uploads_url}/{upload_id}/parts/{part_number}",
+                ThrottledBytes(data, limiter, config.upload_chunk_size) if limiter is not None else data,
+                part_headers,
+                config.resumable_part_attempts,
+                logger,
+                session,
+                config.http_timeout,
+            )
+            progress.add_part(file_location, part_number)
+            logger.debug("Sent part %s of %s for %s", part_number + 1, total_parts, file_location)
+
+    sha256 = file_sha256(file_location, config.upload_chunk_size)
+    response = http.post(
+        f"{uploads_url}/{upload_id}/commit",
+        headers=headers,
+        json={"parts": total_parts, "sha256": sha256},
+        timeout=config.http_timeout,
+    )
+    _check_response(response, "Committing upload")
+    progress.remove(file_location)
+    return sha256
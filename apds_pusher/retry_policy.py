@@ -0,0 +1,102 @@
+"""Retry policy with exponential backoff and jitter for calls to the archive and auth APIs."""
+
+import logging
+import random
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any, TypeVar
+
+import requests as rq
+
+from apds_pusher.config_parser import Configuration
+
+T = TypeVar("T")
+
+#: Transport failures, from both the requests and asyncio backends, which are always worth retrying
+TRANSPORT_ERRORS: tuple[type[BaseException], ...] = (
+    ConnectionError,
+    TimeoutError,
+    rq.exceptions.ConnectionError,
+    rq.exceptions.Timeout,
+)
+
+#: HTTP status codes which are retried by default: too many requests and server errors
+DEFAULT_RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """How many times, and how long apart, a failing call is attempted.
+
+    Exceptions are retried if they are instances of one of 'retry_on' and either have
+    no 'status_code' attribute, or a status code in 'retry_status_codes'. The delay
+    before the nth retry is base_delay * 2 ** (n - 1), capped at max_delay. With
+    jitter, a random delay between 0 and that is used instead, so the retries of many
+    uploads which failed together are spread out rather than sent at the same moment.
+    """
+
+    max_attempts: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+    jitter: bool = True
+    retry_on: tuple[type[BaseException], ...] = TRANSPORT_ERRORS
+    retry_status_codes: frozenset[int] = frozenset(DEFAULT_RETRY_STATUS_CODES)
+    logger: logging.Logger | None = field(default=None, compare=False)
+    sleep: Callable[[float], None] = field(default=time.sleep, compare=False)
+
+    @classmethod
+    def from_config(
+        cls,
+        config: Configuration,
+        retry_on: tuple[type[BaseException], ...] = TRANSPORT_ERRORS,
+        logger: logging.Logger | None = None,
+    ) -> "RetryPolicy":
+        """Create the policy set by the retry fields of the config."""
+        return cls(
+            max_attempts=max(1, config.retry_max_attempts),
+            base_delay=config.retry_base_delay,
+            max_delay=config.retry_max_delay,
+            jitter=config.retry_jitter,
+            retry_on=retry_on,
+            retry_status_codes=frozenset(config.retry_status_codes),
+            logger=logger,
+        )
+
+    def is_retryable(self, exc: BaseException) -> bool:
+        """Whether a call which raised exc is worth attempting again."""
+        if not isinstance(exc, self.retry_on):
+            return False
+        status_code = getattr(exc, "status_code", None)
+        return status_code is None or status_code in self.retry_status_codes
+
+    def delay(self, attempt: int) -> float:
+        """The number of seconds to wait after the given failed attempt, counting from 1."""
+        capped = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, capped) if self.jitter else capped  # noqa: S311
+
+    def call(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Call func with the given arguments, retrying it while it raises retryable exceptions.
+
+        Raises:
+            The exception raised by the last attempt, or by the first not worth retrying.
+        """
+        attempt = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as exc:  # pylint: disable=broad-except
+                if attempt >= self.max_attempts or not self.is_retryable(exc):
+                    raise
+                delay = self.delay(attempt)
+                if self.logger is not None:
+                    self.logger.warning(
+                        "Attempt %s of %s at %s failed with %r, retrying in %.1f seconds",
+                        attempt,
+                        self.max_attempts,
+                        getattr(func, "__name__", func),
+                        exc,
+                        delay,
+                    )
+                self.sleep(delay)
+                attempt += 1
@@ -1,17 +1,58 @@
 """Logging class used keep track files of sent files."""
 
+import json
+import os
 import sys
-from datetime import datetime as dt
+import threading
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any
 
+from apds_pusher.async_logging import BackgroundFileWriter
+from apds_pusher.upload_state import UPLOADED
+from apds_pusher.utils.deployment_utils import state_file_location
 
-class FileLogger:
-    """Class to handle the logging of files that have been sent to Archive."""
+#: Bytes read at a time from the end of the ledger when reading its last records
+TAIL_BLOCK_SIZE = 64 * 1024
 
-    def __init__(self, save_file_location: Path, deployment_location: Path, deployment_id: str) -> None:
-        """Perform setup for FileLogger."""
+
+class FileLogger:  # pylint: disable=too-many-instance-attributes
+    """Class to handle the logging of files that have been sent to Archive.
+
+    The log is an append-only ledger in JSON lines, one record for the outcome of each
+    upload, kept across restarts of the pusher. Once it would grow past 'max_bytes' it is rotated,
+    keeping 'backups' older ledgers named with the suffixes .1, the most recent, to
+    .<backups>. The most recent records are read from the end of the ledger without
+    reading the rest of it, see 'tail'.
+    """
+
+    # pylint: disable=R0913,R0917
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        save_file_location: Path,
+        deployment_location: Path,
+        deployment_id: str,
+        flush_interval: float | None = None,
+        fsync_interval: float = 0.0,
+        max_bytes: int = 0,
+        backups: int = 5,
+    ) -> None:
+        """Perform setup for FileLogger.
+
+        With a flush_interval the ledger is kept open and written by a background
+        thread, which flushes it once lines are this many seconds old, instead of the
+        file being opened, appended to and closed for every file sent. A max_bytes of 0
+        or less never rotates the ledger.
+        """
+        self.deployment_id = deployment_id
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
         self.set_filelog_filename(save_file_location, deployment_location, deployment_id)
-        self.write_initial_line_to_file()
+        self._lock = threading.Lock()
+        self._size = self.file_path.stat().st_size if self.file_path.exists() else 0
+        self.writer = self._open_writer()
 
     def set_filelog_filename(self, save_file_location: Path, deployment_location: Path, deployment_id: str) -> None:
         """Determine and set the save location of the savefile.
@@ -25,30 +66,116 @@ class FileLogger:
         Which is used by by the self.write_to_log_file method.
 
         """
-        # A list of locations to try to create the savefile
-        locations = [save_file_location, deployment_location, Path.cwd()]
-
         # Getting the first valid path from the available choices
-        valid = [loc for loc in locations if loc.is_dir()][0]
+        valid = state_file_location(save_file_location, deployment_location)
 
         # using the chosen path to return the savefile name
-        log_file_name = valid / f"deployment-{deployment_id}-log.out"
+        log_file_name = valid / f"deployment-{deployment_id}-ledger.jsonl"
 
         # Set the attribute to file path, to allow for file writing later on
         self.file_path = log_file_name
 
-    def write_initial_line_to_file(self) -> None:
-        """Write a summary line to the top of the save file."""
-        with open(self.file_path, "w", encoding=sys.getdefaultencoding()) as file:
-            file.write("This file will contain a record of all files sent to the BODC archive.\n")
+    def write_to_log_file(self, filename: str, **details: Any) -> None:
+        """Append a record of a file sent to the archive to the ledger.
 
-    def write_to_log_file(self, filename: str) -> None:
-        """Write filename and current date/time to file.
+        May be called from any thread.
 
         Args:
             filename: The full path to the file that has been submitted.
+            details: Further fields of the record, such as the bytes, sha256, latency,
+                attempts and response of the upload.
+        """
+        record = {
+            "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "deployment_id": self.deployment_id,
+            "path": filename,
+            **details,
+        }
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            if 0 < self.max_bytes < self._size + len(line.encode()) and self._size > 0:
+                self._rotate()
+            self._size += len(line.encode())
+            if self.writer is not None:
+                self.writer.write(line)
+                return
+            with open(self.file_path, "a", encoding=sys.getdefaultencoding()) as file:
+                file.write(line)
+
+    def tail(self, count: int) -> list[dict[str, Any]]:
+        """Return the last count records of the current ledger, oldest first.
+
+        The ledger is read backwards from its end a block at a time, so the time taken
+        depends on count rather than on the size of the ledger.
         """
-        time_string = dt.now().strftime("%d-%m-%Y %H:%M:%S")
-        string_to_write = f"File: {filename} Uploaded at: {time_string}\n"
-        with open(self.file_path, "a", encoding=sys.getdefaultencoding()) as file:
-            file.write(string_to_write)
+        if count <= 0:
+            return []
+        if self.writer is not None:
+            self.writer.flush()
+        try:
+            file = open(self.file_path, "rb")  # noqa: SIM115
+        except FileNotFoundError:
+            return []
+        with file:
+            position = file.seek(0, os.SEEK_END)
+            data = b""
+            # One more line break than records is needed, as the first block may start mid record
+            while position > 0 and data.count(b"\n") <= count:
+                step = min(TAIL_BLOCK_SIZE, position)
+                position -= step
+                file.seek(position)
+                data = file.read(step) + data
+        return [json.loads(line) for line in data.splitlines()[-count:] if line.strip()]
+
+    def close(self) -> None:
+        """Write any lines still queued for the background writer and close the file."""
+        with self._lock:
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+
+    def _open_writer(self) -> BackgroundFileWriter | None:
+        """Start the background writer, if one is used."""
+        if self.flush_interval is None:
+            return None
+        return BackgroundFileWriter(self.file_path, self.flush_interval, self.fsync_interval)
+
+    def _rotate(self) -> None:
+        """Move the ledger to the .1 backup, shifting older backups along. Called with the lock held."""
+        if self.writer is not None:
+            self.writer.close()
+        for number in range(self.backups - 1, 0, -1):
+            backup = self.file_path.with_name(f"{self.file_path.name}.{number}")
+            if backup.exists():
+                backup.replace(self.file_path.with_name(f"{self.file_path.name}.{number + 1}"))
+        if self.backups > 0:
+            self.file_path.replace(self.file_path.with_name(f"{self.file_path.name}.1"))
+        else:
+            self.file_path.unlink()
+        self._size = 0
+        self.writer = self._open_writer()
+
+
+def throughput(records: list[dict[str, Any]]) -> dict[str, float]:
+    """Summarise the files sent to the archive in ledger records.
+
+    Uploads made by several workers overlap, so the rate is taken over the time from
+    the first upload starting to the last one finishing, rather than the sum of their
+    latencies. Each record is written as its upload finishes, 'latency' seconds after
+    it started.
+
+    Returns:
+        The number of files sent and their bytes, the mean latency of their uploads in
+        seconds, and the bytes sent per second over the time they were being sent.
+    """
+    sent = [record for record in records if record.get("status") == UPLOADED and record.get("bytes") is not None]
+    total_bytes = sum(record["bytes"] for record in sent)
+    total_latency = sum(record.get("latency", 0.0) for record in sent)
+    finished = [(datetime.fromisoformat(record["time"]).timestamp(), record.get("latency", 0.0)) for record in sent]
+    elapsed = max(end for end, _ in finished) - min(end - latency for end, latency in finished) if finished else 0.0
+    return {
+        "files": len(sent),
+        "bytes": total_bytes,
+        "mean_latency": total_latency / len(sent) if sent else 0.0,
+        "bytes_per_second": total_bytes / elapsed if elapsed > 0 else 0.0,
+    }
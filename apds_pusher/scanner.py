@@ -0,0 +1,84 @@
+"""Single pass search of a deployment directory for glider files."""
+
+import fnmatch
+import os
+import re
+import stat
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import NamedTuple
+
+
+class ScannedFile(NamedTuple):
+    """A file found by the scanner, with the stat result taken during the scan."""
+
+    path: Path
+    stat: os.stat_result
+
+
+def compile_format_matcher(file_formats: list[str]) -> Callable[[str], bool]:
+    """Build a single matcher for file names ending in any of the configured formats.
+
+    Each entry in 'file_formats' is treated as the end of a glob pattern, exactly as
+    when searching with ``glob("*" + file_format)``, so both ".cac" and "*.cac" work.
+    All of the formats are combined into one compiled regular expression.
+
+    Args:
+        file_formats: The file formats from the configuration.
+
+    Returns:
+        A function returning True for a file name matching any of the formats.
+    """
+    pattern = "|".join(fnmatch.translate(f"*{file_format}") for file_format in file_formats)
+    # Match case the way the file system does, as glob would
+    flags = re.IGNORECASE if os.path.normcase("A") == "a" else 0
+    return re.compile(pattern, flags).match  # type: ignore[return-value]
+
+
+def scan_deployment(
+    deployment_location: Path,
+    file_formats: list[str],
+    recursive: bool,
+    modified_after: float | None = None,
+) -> Iterator[ScannedFile]:
+    """Walk a deployment directory once, yielding files matching any of the formats.
+
+    Symbolic links to directories are not followed, and directories which cannot be
+    read are skipped, as they would be by glob. Symbolic links to files are found with
+    the stat result of the file they link to.
+
+    Args:
+        deployment_location: The directory to search.
+        file_formats: The file formats from the configuration.
+        recursive: Whether sub-directories are searched.
+        modified_after: If given, only files modified after this timestamp are returned.
+
+    Yields:
+        Each matching file, with the stat result from the directory listing.
+    """
+    matches = compile_format_matcher(file_formats)
+    directories = [os.fspath(deployment_location)]
+    while directories:
+        try:
+            entries = os.scandir(directories.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            directories.append(entry.path)
+                        continue
+                    if not matches(entry.name):
+                        continue
+                    # The target's size and mtime, as recorded by the upload state store and sent
+                    entry_stat = entry.stat()
+                except OSError:
+                    # Removed between being listed and being checked, or a broken link
+                    continue
+                if not stat.S_ISREG(entry_stat.st_mode):
+                    # A link to a directory named like a glider file
+                    continue
+                if modified_after is None or entry_stat.st_mtime > modified_after:
+                    yield ScannedFile(Path(entry.path), entry_stat)
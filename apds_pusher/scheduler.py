@@ -0,0 +1,98 @@
+"""Ordering of a cycle's uploads, so the most wanted files reach the archive first."""
+
+import os
+from collections.abc import Callable, Collection, Mapping
+from pathlib import Path
+
+from apds_pusher.scanner import compile_format_matcher
+
+#: The rules files can be ordered by, each putting the most wanted files first
+PRIORITY_RULES = ("format", "newest", "smallest", "weighted")
+
+
+def check_priority_rules(rules: tuple[str, ...] | list[str], weights: Mapping[str, float] | None = None) -> None:
+    """Check the 'upload_priority' and 'upload_priority_weights' settings.
+
+    Raises:
+        ValueError: If a rule, or a rule given a weight, is not known.
+    """
+    unknown = [rule for rule in rules if rule not in PRIORITY_RULES]
+    if unknown:
+        raise ValueError(f"Unknown upload priority rules {unknown}, expected some of {list(PRIORITY_RULES)}")
+    unknown = [rule for rule in weights or {} if rule not in PRIORITY_RULES[:-1]]
+    if unknown:
+        raise ValueError(f"Unknown upload priority weights {unknown}, expected some of {list(PRIORITY_RULES[:-1])}")
+
+
+def _format_rank(file_formats: list[str]) -> Callable[[Path], int]:
+    """The position in file_formats of the first format a file matches."""
+    matchers = [compile_format_matcher([file_format]) for file_format in file_formats]
+
+    def rank(file: Path) -> int:
+        return next((index for index, matches in enumerate(matchers) if matches(file.name)), len(matchers))
+
+    return rank
+
+
+def _normalised_ranks(files: list[Path], key: Callable[[Path], float]) -> dict[Path, float]:
+    """The rank of each file by key, scaled to between 0 for the first and 1 for the last."""
+    ordered = sorted(files, key=key)
+    last = max(1, len(ordered) - 1)
+    return {file: index / last for index, file in enumerate(ordered)}
+
+
+def prioritise(
+    files: list[Path],
+    rules: tuple[str, ...] | list[str],
+    file_formats: list[str],
+    stats: Mapping[Path, os.stat_result] | None = None,
+    weights: Mapping[str, float] | None = None,
+    retried: Collection[Path] = (),
+) -> list[Path]:
+    """Order files for upload by the priority rules, most wanted first.
+
+    Files being retried come before all others, so they are not held back by new
+    files behind them. Files are then compared by the first rule, ties being broken
+    by the ones after it, and are left in the order given when every rule ties.
+
+    - format: by the position of the file's format in 'file_formats'.
+    - newest: the most recently modified first.
+    - smallest: the smallest first.
+    - weighted: by the sum of the file's rank under each of the other rules, scaled
+      from 0 to 1 and multiplied by the rule's weight in 'weights', 1 if not given.
+
+    Args:
+        files: The files to be uploaded.
+        rules: The priority rules, from the 'upload_priority' setting.
+        file_formats: The file formats from the configuration.
+        stats: Stat results already taken for the files, others are taken here.
+        weights: The weight of each rule making up the weighted rule.
+        retried: The files which failed to be sent in an earlier cycle.
+
+    Returns:
+        The files in the order they should be uploaded.
+    """
+    if not rules or len(files) <= 1:
+        return list(files)
+
+    stats = dict(stats or {})
+    for file in files:
+        if file not in stats:
+            try:
+                stats[file] = file.stat()
+            except OSError:
+                # Gone since being found, the upload will report it
+                stats[file] = os.stat_result((0,) * 10)
+
+    criteria: dict[str, Callable[[Path], float]] = {
+        "format": _format_rank(file_formats),
+        "newest": lambda file: -stats[file].st_mtime,
+        "smallest": lambda file: stats[file].st_size,
+    }
+    if "weighted" in rules:
+        weights = weights or {}
+        ranks = {rule: _normalised_ranks(files, key) for rule, key in criteria.items() if weights.get(rule, 1.0)}
+        criteria["weighted"] = lambda file: sum(weights.get(rule, 1.0) * rank[file] for rule, rank in ranks.items())
+
+    keys = [criteria[rule] for rule in rules]
+    return sorted(files, key=lambda file: (file not in retried, *(key(file) for key in keys)))
@@ -5,7 +5,11 @@ from urllib.parse import urljoin
 
 import requests as rq
 
+from apds_pusher.bandwidth import BandwidthLimiter
 from apds_pusher.config_parser import Configuration
+from apds_pusher.http_session import DEFAULT_TIMEOUT
+from apds_pusher.multipart_stream import MultipartFileStream
+from apds_pusher.resumable_upload import ResumableUploadError, UploadProgress, send_resumable_upload
 from apds_pusher.systemlogger import SystemLogger
 from apds_pusher.utils.deployment_utils import check_delete_active_deployments
 
@@ -13,39 +17,106 @@ from apds_pusher.utils.deployment_utils import check_delete_active_deployments
 class HoldingsAccessError(Exception):
     """Raised if response to an unsuccessful call to holdings endpoint."""
 
+    def __init__(self, *args: object, status_code: int | None = None) -> None:
+        """Store the HTTP status code returned by the archive, if there was a response."""
+        super().__init__(*args)
+        self.status_code = status_code
+
 
 class FileUploadError(Exception):
-    """Raised in response to the API returning a 500."""
+    """Raised in response to the API returning a server error, or asking for requests to slow down."""
+
+    def __init__(self, *args: object, status_code: int | None = None) -> None:
+        """Store the HTTP status code returned by the archive."""
+        super().__init__(*args)
+        self.status_code = status_code
 
 
 class AuthenticationError(Exception):
     """Raised in response to the API refusing the access token."""
 
 
-def call_holdings_endpoint(bodc_archive_url: str, deployment_id: str) -> dict:
+def fetch_holdings(
+    bodc_archive_url: str,
+    deployment_id: str,
+    session: rq.Session | None = None,
+    etag: str | None = None,
+    params: dict | None = None,
+    timeout: tuple[float, float] = DEFAULT_TIMEOUT,
+) -> tuple[dict | None, str | None]:
+    """Call the holdings endpoint, only downloading the holdings if they have changed.
+
+    Args:
+        bodc_archive_url: The url for the archive, passed in from config file.
+        deployment_id: The deployment_id of the file in question.
+        session: The pusher's shared HTTP session, a new connection is made if not given.
+        etag: The ETag of holdings already held, sent as If-None-Match.
+        params: Extra query parameters for the call.
+        timeout: The connect and read timeouts for the call, in seconds.
+
+    Returns:
+        The raw JSON response as a dict, or None if unchanged since the ETag, and the new ETag.
+    """
+    url = urljoin(bodc_archive_url, f"holdings/{deployment_id}")
+    headers = {"If-None-Match": etag} if etag else {}
+    try:
+        response = (session or rq).get(url, headers=headers, params=params, timeout=timeout)
+        if response.status_code == 304:
+            return None, etag
+        response.raise_for_status()
+        return response.json(), response.headers.get("ETag")
+    except rq.exceptions.RequestException as re_obj:
+        status_code = re_obj.response.status_code if re_obj.response is not None else None
+        raise HoldingsAccessError(status_code=status_code)  # pylint: disable=W0707  # noqa: B904
+
+
+def call_holdings_endpoint(bodc_archive_url: str, deployment_id: str, session: rq.Session | None = None) -> dict:
     """Call endpoint to attempt to retrieve all held files for a deployment ID.
 
     Function will attempt to call the holdings endpoint, and then return
     a dict of files, to then be parsed by the 'parse_holdings' function.
-    Function is also called from within 'parse_holdings'.
 
     Args:
         bodc_archive_url: The url for the archive, passed in from config file.
         deployment_id: The deployment_id of the file in question.
+        session: The pusher's shared HTTP session, a new connection is made if not given.
 
     Returns:
         The raw JSON response as a dict.
     """
-    url = urljoin(bodc_archive_url, f"holdings/{deployment_id}")
-    try:
-        response = rq.get(url, timeout=600)
-        response.raise_for_status()
-        return response.json()
-    except rq.exceptions.RequestException:
-        raise HoldingsAccessError  # pylint: disable=W0707  # noqa: B904
+    return fetch_holdings(bodc_archive_url, deployment_id, session)[0]  # type: ignore[return-value]
+
 
+def parse_holdings(holdings: dict) -> set[str]:
+    """Return the set of filenames in the 'files' section of a holdings response.
 
-def return_existing_glider_files(bodc_archive_url: str, deployment_id: str) -> set[str]:
+    Args:
+        holdings: The 'files' section of the holdings JSON.
+
+    Returns:
+        A set of strings, with all the filenames listed.
+    """
+    # Extract keys which contain the arrays of filenames
+    keys_required = [file for file in holdings if (file.endswith("files") and "rxf" not in file)]
+
+    # Build a master set to hold filenames
+    all_filenames: set[str] = set()
+
+    # Iterate through each filetype, adding all filenames to master set
+    for keys in keys_required:
+        all_filenames = all_filenames | ({i["name"] for i in holdings[keys]})
+
+    return all_filenames
+
+
+def holdings_file_count(holdings: dict) -> int:
+    """Return the total of the per file type counts in the 'files' section of a holdings response."""
+    return sum(value for key, value in holdings.items() if key.endswith("_Count") and "rxf" not in key)
+
+
+def return_existing_glider_files(
+    bodc_archive_url: str, deployment_id: str, session: rq.Session | None = None
+) -> set[str]:
     """Return all filenames for a given deployment.
 
     Function first calls 'call_holdings_endpoint' to handle
@@ -56,24 +127,114 @@ def return_existing_glider_files(bodc_archive_url: str, deployment_id: str) -> s
     Args:
         bodc_archive_url: The url for the archive, passed in from config file.
         deployment_id: The deployment_id of the file in question.
+        session: The pusher's shared HTTP session, a new connection is made if not given.
 
     Returns:
         A set of strings, with all the filenames for a deployment.
     """
     # Grab the raw response
-    response = call_holdings_endpoint(bodc_archive_url, deployment_id)["files"]
+    response = call_holdings_endpoint(bodc_archive_url, deployment_id, session)["files"]
+    return parse_holdings(response)
 
-    # Extract keys which contain the arrays of filenames
-    keys_required = [file for file in response if (file.endswith("files") and "rxf" not in file)]
 
-    # Build a master set to hold filenames
-    all_filenames: set[str] = set()
+def archive_endpoint(deployment_id: str, bodc_archive_url: str, mode: str, logger: SystemLogger) -> str:
+    """Return the URL of the deployment's archive endpoint for the given mode.
 
-    # Iterate through each filetype, adding all filenames to master set
-    for keys in keys_required:
-        all_filenames = all_filenames | ({i["name"] for i in response[keys]})
+    Raises:
+        ValueError: If the mode is not NRT or Recovery.
+    """
+    if mode == "NRT":
+        archive_mode = "archiveFile"
+    elif mode == "Recovery":
+        archive_mode = "archiveRecovery"
+    else:
+        logger.error("Mode selected via the command option is invalid❌")
+        raise ValueError("Invalid mode")
+
+    return urljoin(bodc_archive_url, f"{archive_mode}/{deployment_id}")
 
-    return all_filenames
+
+def build_archive_url(
+    file_location: Path, deployment_id: str, bodc_archive_url: str, mode: str, logger: SystemLogger
+) -> str:
+    """Build the URL a file is sent to for the given mode.
+
+    Raises:
+        ValueError: If the mode is not NRT or Recovery.
+    """
+    url = archive_endpoint(deployment_id, bodc_archive_url, mode, logger)
+
+    if mode == "NRT":
+        url += f"?relativePath={file_location.name}&hostPath=/{file_location.parent.resolve()}/"
+    return url
+
+
+# pylint: disable=R0917
+def probe_archive(  # pylint: disable=too-many-arguments
+    deployment_id: str,
+    access_token: str,
+    bodc_archive_url: str,
+    mode: str,
+    logger: SystemLogger,
+    session: rq.Session | None = None,
+    timeout: tuple[float, float] = DEFAULT_TIMEOUT,
+) -> None:
+    """Check with one small authenticated request that files can be sent for the deployment.
+
+    A HEAD request is made to the deployment's archive endpoint, so that a refused
+    token or a wrong endpoint is found before any file body is sent.
+
+    Raises:
+        AuthenticationError: If the archive refused the access token.
+        FileNotFoundError: If the archive has no endpoint for the deployment.
+    """
+    url = archive_endpoint(deployment_id, bodc_archive_url, mode, logger)
+    response = (session or rq).head(url, headers={"Authorization": f"Bearer {access_token}"}, timeout=timeout)
+    logger.debug("Response to preflight probe of %s: %s", url, response.status_code)
+    if response.status_code == 401:
+        logger.error("Authentication Error caught by the preflight probe ❌")
+        raise AuthenticationError
+    if response.status_code == 404:
+        logger.error("Archive endpoint %s not found by the preflight probe 👀", url)
+        raise FileNotFoundError(url)
+
+
+# pylint: disable=R0917
+def check_archive_response(  # pylint: disable=too-many-arguments
+    status_code: int | None,
+    response_ok: bool,
+    deployment_id: str,
+    mode: str,
+    logger: SystemLogger,
+    config: Configuration,
+) -> str:
+    """Turn the status of an archive call into the result of the send, or an exception.
+
+    Raises:
+        FileUploadError: If the archive returned a server error or 429 Too Many Requests.
+        AuthenticationError: If the archive refused the access token.
+        FileNotFoundError: If the archive endpoint was not found.
+    """
+    if status_code == 500:
+        logger.error(f"Internal Server Error caught during archive ❌")
+        raise FileUploadError(status_code=status_code)
+    if status_code is not None and (status_code > 500 or status_code == 429):
+        logger.error("Archive unavailable (%s) during archive ❌", status_code)
+        raise FileUploadError(status_code=status_code)
+    if status_code == 401:
+        logger.error(f"Authentication Error caught during archive ❌")
+        raise AuthenticationError
+    if status_code == 404:
+        logger.error(f"FileNotFound Exception caught during archive 👀")
+        raise FileNotFoundError
+    if response_ok:
+        logger.info("Successfully archived 🎉")
+        if mode == "Recovery" and check_delete_active_deployments(deployment_id, config):
+            logger.info("%s is now going to be stopped on the pusher.", deployment_id)
+        return "Success"
+
+    logger.info("Failed to archive 🙁")
+    return "Fail"
 
 
 # pylint: disable=R0917
@@ -85,6 +246,10 @@ def send_to_archive_api(  # pylint: disable=too-many-arguments,  # noqa: D417
     mode: str,
     logger: SystemLogger,
     config: Configuration,
+    session: rq.Session | None = None,
+    limiter: BandwidthLimiter | None = None,
+    digests: dict[Path, str] | None = None,
+    progress: UploadProgress | None = None,
 ) -> str:
     """Send a file to the Archive API.
 
@@ -98,56 +263,39 @@ def send_to_archive_api(  # pylint: disable=too-many-arguments,  # noqa: D417
         bodc_archive_url: The url for the archive, passed in from config file.
         mode: The mode can be NRT or Recovery.
         log: A system logger
+        session: The pusher's shared HTTP session, a new connection is made if not given.
+        limiter: The bandwidth limiter shared by every upload in the process, if any.
+        digests: If given, the sha256 of the file is stored in it, computed as the file is sent.
+        progress: The record of the deployment's resumable uploads in progress.
 
 
     Returns:
         A string to inform the result of the API call.
     """
-    if mode == "NRT":
-        archive_mode = "archiveFile"
-    elif mode == "Recovery":
-        archive_mode = "archiveRecovery"
-    else:
-        logger.error("Mode selected via the command option is invalid❌")
-        raise ValueError("Invalid mode")
-
-    url = urljoin(bodc_archive_url, f"{archive_mode}/{deployment_id}")
-
-    if mode == "NRT":
-        url += f"?relativePath={file_location.name}&hostPath=/{file_location.parent.resolve()}/"
+    url = build_archive_url(file_location, deployment_id, bodc_archive_url, mode, logger)
 
-    # Populate the headers with the access token
-    headers = {"Authorization": f"Bearer {access_token}"}
-    with open(
-        file_location,
-        "rb",
-    ) as file:
-        files = [
-            (
-                "data",
-                (
-                    file_location.name,
-                    file.read(),
-                    "multipart/form-data",
-                ),
+    if mode == "Recovery" and 0 < config.resumable_upload_threshold <= file_location.stat().st_size:
+        # Large recovery archives are sent in parts so a dropped connection only loses one part
+        try:
+            sha256: str | None = send_resumable_upload(
+                file_location, url, deployment_id, access_token, logger, config, session, limiter, progress
             )
-        ]
-    response = rq.request("POST", url, headers=headers, files=files, timeout=600)  # type: ignore
-    logger.debug("Response from archive API: %s - %s", response.status_code, response.text)
-    if response.status_code == 500:
-        logger.error(f"Internal Server Error caught during archive ❌")
-        raise FileUploadError
-    if response.status_code == 401:
-        logger.error(f"Authentication Error caught during archive ❌")
-        raise AuthenticationError
-    if response.status_code == 404:
-        logger.error(f"FileNotFound Exception caught during archive 👀")
-        raise FileNotFoundError
-    if response.ok:
-        logger.info("Successfully archived 🎉")
-        if mode == "Recovery" and check_delete_active_deployments(deployment_id, config):
-            logger.info("%s is now going to be stopped on the pusher.", deployment_id)
-        return "Success"
-
-    logger.info("Failed to archive 🙁")
-    return "Fail"
+            status_code, response_ok = 200, True
+        except ResumableUploadError as rue_obj:
+            logger.debug("Resumable upload of %s failed: %s", file_location, rue_obj)
+            status_code, response_ok, sha256 = rue_obj.status_code, False, None
+    else:
+        # Populate the headers with the access token, the body is streamed from disk in chunks
+        body = MultipartFileStream(file_location, chunk_size=config.upload_chunk_size, limiter=limiter)
+        # A stalled upload fails after the read timeout, a slow one once it is too slow for its size
+        body.time_limit = config.upload_deadline(body.file_size)
+        headers = {"Authorization": f"Bearer {access_token}", "Content-Type": body.content_type}
+        response = (session or rq).request(  # type: ignore
+            "POST", url, headers=headers, data=body, timeout=config.http_timeout
+        )
+        logger.debug("Response from archive API: %s - %s", response.status_code, response.text)
+        status_code, response_ok, sha256 = response.status_code, response.ok, body.sha256
+
+    if digests is not None and sha256 is not None:
+        digests[file_location] = sha256
+    return check_archive_response(status_code, response_ok, deployment_id, mode, logger, config)
@@ -3,6 +3,9 @@
 import logging
 from pathlib import Path
 
+from apds_pusher.async_logging import BackgroundFileHandler
+from apds_pusher.utils.deployment_utils import state_file_location
+
 
 class SystemLogger(logging.getLoggerClass()):  # type: ignore
     """A class used to log messages to console and file."""
@@ -13,12 +16,20 @@ class SystemLogger(logging.getLoggerClass()):  # type: ignore
         log_file_location: Path,
         deployment_location: Path,
         trace: bool = False,
+        flush_interval: float | None = None,
+        fsync_interval: float = 0.0,
     ) -> None:
-        """Set up the SystemLogger."""
-        super().__init__("APDS")
+        """Set up the SystemLogger.
+
+        The logger's level is that of its most verbose handler, so debug messages are
+        discarded before a record is made for them unless trace is on. With a
+        flush_interval the log file is written by a background thread, see
+        configure_file_logger.
+        """
+        super().__init__("APDS", logging.DEBUG if trace else logging.INFO)
         self.set_systemlog_filename(deployment_id, log_file_location, deployment_location)
         self.configure_console_logger(trace=trace)
-        self.configure_file_logger(trace=trace)
+        self.configure_file_logger(trace=trace, flush_interval=flush_interval, fsync_interval=fsync_interval)
 
     def set_systemlog_filename(self, deployment_id: str, log_file_location: Path, deployment_location: Path) -> None:
         """Create the logfile name.
@@ -31,11 +42,8 @@ class SystemLogger(logging.getLoggerClass()):  # type: ignore
         Once the logfile has been created, it will then set the 'self.log_file_name'
         attribute, which is used the configure_file_logger method.
         """
-        # A list of locations to try to create the logfile
-        locations = [log_file_location, deployment_location, Path.cwd()]
-
         # Getting the first valid path from the available choices
-        valid = [loc for loc in locations if loc.is_dir()][0]
+        valid = state_file_location(log_file_location, deployment_location)
 
         # using the chosen path to return the logfile name
         log_file_name = valid / (deployment_id + ".log")
@@ -46,9 +54,23 @@ class SystemLogger(logging.getLoggerClass()):  # type: ignore
         # Then set the log_file_name attribute to the newly created path
         self.log_file_name = log_file_name
 
-    def configure_file_logger(self, trace: bool = False) -> None:
-        """Set up logging to file."""
-        file_out = logging.FileHandler(self.log_file_name)
+    def configure_file_logger(
+        self, trace: bool = False, flush_interval: float | None = None, fsync_interval: float = 0.0
+    ) -> None:
+        """Set up logging to file.
+
+        Args:
+            trace: Whether debug messages are written.
+            flush_interval: If given, records are queued and written by a background thread,
+                which flushes the file once they are this many seconds old, rather than each
+                record being written and flushed by the thread logging it.
+            fsync_interval: The least number of seconds between fsyncs by the background thread.
+        """
+        file_out: logging.Handler
+        if flush_interval is None:
+            file_out = logging.FileHandler(self.log_file_name)
+        else:
+            file_out = BackgroundFileHandler(self.log_file_name, flush_interval, fsync_interval)
         if trace:
             file_out.setLevel(logging.DEBUG)
         else:
@@ -1,22 +1,184 @@
 """File to hold logic for refreshing an oauth2 access token."""
 
+import base64
+import json
+import logging
+import threading
+import time
+from collections.abc import Callable
+
 import requests
 
 from apds_pusher.config_parser import Configuration
 
+#: Seconds between attempts of a background refresh which failed
+BACKGROUND_RETRY_SECONDS = 30.0
+
 
 class AccessCodeError(Exception):
     """Exception raised when errors in the refreshed access token."""
 
+    def __init__(self, *args: object, status_code: int | None = None) -> None:
+        """Store the HTTP status code returned by the auth provider, if there was a response."""
+        super().__init__(*args)
+        self.status_code = status_code
+
+
+def _token_time(access_token: str, claim: str) -> float | None:
+    """Return a time claim of a JWT access token, or None if it cannot be read."""
+    try:
+        payload = access_token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims[claim])
+    except (IndexError, ValueError, KeyError, TypeError):
+        return None
+
+
+def token_expiry(access_token: str) -> float | None:
+    """Return the expiry time ('exp' claim) of a JWT access token, or None if it cannot be read.
+
+    The token's signature is not checked, the expiry is only used to refresh in good time.
+    """
+    return _token_time(access_token, "exp")
+
+
+class TokenManager:
+    """Holds the access and refresh tokens from the device flow, refreshing the access token ahead of expiry.
+
+    A single instance is shared by every pusher in a process, so a token refreshed by
+    one pusher is used by all of them. Refreshes are single-flight: however many
+    uploads find the token expired or refused at once, one refresh call is made.
+    """
+
+    # pylint: disable=R0913,R0917
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        access_token: str,
+        refresh_token: str,
+        refresher: Callable[[str], str] | None = None,
+        refresh_margin: float = 300.0,
+        logger: logging.Logger | None = None,
+    ) -> None:
+        """Hold the tokens returned by the device flow.
+
+        Args:
+            access_token: The current access token.
+            refresh_token: The refresh token used to get new access tokens.
+            refresher: Returns a new access token given the refresh token. May be set later.
+            refresh_margin: Seconds before expiry at which the access token is refreshed, at
+                most half the token's lifetime, so a short lived token is not refreshed for
+                every call made with it.
+            logger: Logs background refreshes.
+        """
+        self.refresh_token = refresh_token
+        self.refresher = refresher
+        self.refresh_margin = refresh_margin
+        self.logger = logger
+        self.lock = threading.Lock()
+        self._access_token = access_token
+        self.expires_at = token_expiry(access_token)
+        self.issued_at = _token_time(access_token, "iat") or time.time()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def access_token(self) -> str:
+        """The current access token, which may be about to expire."""
+        return self._access_token
+
+    @access_token.setter
+    def access_token(self, access_token: str) -> None:
+        self._access_token = access_token
+        self.expires_at = token_expiry(access_token)
+        # Taken as issued now if the token does not say, as it has just been received
+        self.issued_at = _token_time(access_token, "iat") or time.time()
+        self._wakeup.set()
+
+    def _refresh_at(self) -> float | None:
+        """When the access token is due to be refreshed, or None if its expiry is unknown."""
+        if self.expires_at is None:
+            return None
+        margin = min(self.refresh_margin, max(0.0, self.expires_at - self.issued_at) / 2)
+        return self.expires_at - margin
+
+    def is_expiring(self) -> bool:
+        """Whether the access token has expired, or will within the refresh margin."""
+        refresh_at = self._refresh_at()
+        return refresh_at is not None and time.time() >= refresh_at
+
+    def get(self) -> str:
+        """Return an access token, refreshing it first if it is expiring."""
+        access_token = self._access_token
+        if self.is_expiring():
+            return self.refresh(access_token)
+        return access_token
+
+    def refresh(self, stale_token: str | None = None) -> str:
+        """Refresh the access token and return the new one.
+
+        Args:
+            stale_token: The access token that was found expired or refused. If it has
+                already been replaced, by a refresh on another thread, no call is made.
+
+        Raises:
+            AccessCodeError: If no refresher has been set, or the refresh failed.
+        """
+        with self.lock:
+            if stale_token is not None and stale_token != self._access_token:
+                return self._access_token
+            if self.refresher is None:
+                raise AccessCodeError("No way to refresh the access token has been set")
+            self.access_token = self.refresher(self.refresh_token)
+            return self._access_token
+
+    def start_background_refresh(self) -> None:
+        """Start a thread refreshing the access token before it expires, if not already running."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._refresh_ahead, name="token-refresh", daemon=True)
+        self._thread.start()
+
+    def stop_background_refresh(self) -> None:
+        """Stop the background refresh thread."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _refresh_ahead(self) -> None:
+        while not self._stopped.is_set():
+            # Sleep until the refresh is due, or the token is replaced, or never if its expiry is unknown
+            refresh_at = self._refresh_at()
+            timeout = None if refresh_at is None else max(0.0, refresh_at - time.time())
+            if self._wakeup.wait(timeout):
+                self._wakeup.clear()
+                continue
+            try:
+                self.refresh(self._access_token)
+                if self.logger is not None:
+                    self.logger.info("Access token refreshed ahead of its expiry")
+            except Exception as exc:  # pylint: disable=broad-except
+                if self.logger is not None:
+                    self.logger.error("Background refresh of the access token failed: %r", exc)
+            if self.is_expiring():
+                # The refresh failed, or gave a token as short lived, so wait before trying again
+                self._stopped.wait(BACKGROUND_RETRY_SECONDS)
+
 
 # pylint: disable=R0801
-def get_access_token_from_refresh_token(refresh_token: str, config: Configuration) -> str:
+def get_access_token_from_refresh_token(
+    refresh_token: str, config: Configuration, session: requests.Session | None = None
+) -> str:
     """Retrieve the access tokens for expired tokens using refresh tokens.
 
     The access tokens are returned for expired access tokens
     Args:
        refresh_token dict : details of the access token for which a refresh token is required
        config :A configuration class object
+       session : The pusher's shared HTTP session, a new connection is made if not given
 
     Returns :
         the access token
@@ -33,16 +195,17 @@ def get_access_token_from_refresh_token(refresh_token: str, config: Configuratio
     }
     headers = {"content-type": "application/json"}
     try:
-        res = requests.post(
+        res = (session or requests).post(
             "https://" + auth_domain + "/oauth/token",
             headers=headers,
             json=payload,
-            timeout=600,
+            timeout=config.http_timeout,
         )
         res.raise_for_status()
 
     except requests.exceptions.HTTPError as errhttp:
-        raise AccessCodeError("Http Error while refreshing token") from errhttp
+        status_code = errhttp.response.status_code if errhttp.response is not None else None
+        raise AccessCodeError("Http Error while refreshing token", status_code=status_code) from errhttp
     except requests.exceptions.ConnectionError as errconn:
         raise AccessCodeError("Connection Error while refreshing token") from errconn
     except requests.exceptions.Timeout as errtimeout:
@@ -51,6 +214,8 @@ def get_access_token_from_refresh_token(refresh_token: str, config: Configuratio
         raise AccessCodeError("Unknown error while refreshing token") from errreq
 
     if "error" in res.json():
-        raise AccessCodeError(f"Refresh token not generated. \nError: {res.json()['error_description']}")
+        raise AccessCodeError(
+            f"Refresh token not generated. \nError: {res.json()['error_description']}", status_code=res.status_code
+        )
     access_token_details = res.json()
     return access_token_details["access_token"]
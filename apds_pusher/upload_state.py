@@ -0,0 +1,299 @@
+"""Local index of the upload state of every file seen for a deployment."""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable
+from pathlib import Path
+from typing import NamedTuple
+
+from apds_pusher.utils.deployment_utils import state_file_location
+
+#: Status of a file sent to the archive by this pusher.
+UPLOADED = "uploaded"
+#: Status of a file found to already be held by the archive.
+HELD = "held"
+#: Status of a file whose last upload attempt failed.
+FAILED = "failed"
+#: Status of a file which failed in too many cycles, and is no longer retried.
+DEAD_LETTER = "dead-letter"
+
+
+class UploadRecord(NamedTuple):
+    """The stored upload state of a single file."""
+
+    path: str
+    size: int
+    mtime: float
+    sha256: str | None
+    status: str
+    attempts: int
+    response: str | None
+    updated_at: float
+
+
+def file_sha256(file_location: Path, chunk_size: int = 64 * 1024) -> str:
+    """Return the sha256 of a file, read a chunk at a time."""
+    digest = hashlib.sha256()
+    with open(file_location, "rb") as file:
+        while chunk := file.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadStateStore:
+    """An SQLite index of the files uploaded for a deployment, keyed by path.
+
+    Each file's size and modification time are stored with its upload status, so a
+    file which has already been sent, and not changed since, can be recognised with a
+    single primary key lookup instead of a call to the holdings endpoint.
+
+    The database also holds the spool, the queue of files found by scans that are
+    still to be sent. Files only leave the spool once the archive has confirmed it
+    holds them, in the same transaction as their state is recorded, so the files
+    waiting to be sent survive the pusher stopping at any point. A file that fails
+    stays in the spool with a count of the cycles it failed in and the time it is
+    next due, until it is sent or moved to the dead-letter status.
+    """
+
+    def __init__(self, save_file_location: Path, deployment_location: Path, deployment_id: str) -> None:
+        """Open, creating if needed, the state database for a deployment.
+
+        It will be created in the first of these locations that exists
+        - The location specified in the config file (save_file_location)
+        - The location of the deployment
+        - The current working directory.
+        """
+        valid = state_file_location(save_file_location, deployment_location)
+        self.file_path = valid / f"deployment-{deployment_id}-state.sqlite3"
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.file_path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS uploads (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                sha256 TEXT,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                response TEXT,
+                updated_at REAL NOT NULL
+            ) WITHOUT ROWID"""
+        )
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS spool (
+                path TEXT PRIMARY KEY,
+                enqueued_at REAL NOT NULL,
+                failures INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0
+            ) WITHOUT ROWID"""
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS markers (name TEXT PRIMARY KEY, value REAL NOT NULL) WITHOUT ROWID"
+        )
+
+    def get(self, file_location: Path) -> UploadRecord | None:
+        """Return the stored state of a file, if it has been seen before."""
+        with self._lock:
+            row = self._connection.execute("SELECT * FROM uploads WHERE path = ?", (str(file_location),)).fetchone()
+        return UploadRecord(*row) if row else None
+
+    def is_uploaded(self, file_location: Path, file_stat: os.stat_result | None = None) -> bool:
+        """Check if a file is known to be in the archive and is unchanged since.
+
+        Args:
+            file_location: The file to check.
+            file_stat: The file's stat result, if already known, to avoid another stat call.
+        """
+        record = self.get(file_location)
+        if record is None or record.status not in (UPLOADED, HELD):
+            return False
+        file_stat = file_stat or file_location.stat()
+        return record.size == file_stat.st_size and record.mtime == file_stat.st_mtime
+
+    # pylint: disable=R0917
+    def _upsert(  # pylint: disable=too-many-arguments
+        self,
+        file_location: Path,
+        status: str,
+        response: str | None,
+        attempts: int = 0,
+        sha256: str | None = None,
+        dequeue: bool = False,
+        retry_at: float | None = None,
+        file_stat: os.stat_result | None = None,
+        hash_file: bool = False,
+    ) -> None:
+        try:
+            file_stat = file_stat or file_location.stat()
+            if hash_file and sha256 is None:
+                sha256 = file_sha256(file_location)
+        except FileNotFoundError:
+            # The file has been removed locally since it was scanned, there is nothing to index
+            if dequeue:
+                self.dequeue(file_location)
+            return
+        with self._lock, self._transaction():
+            self._connection.execute(
+                """INSERT INTO uploads (path, size, mtime, sha256, status, attempts, response, updated_at)
+                VALUES (:path, :size, :mtime, :sha256, :status, :attempts, :response, :now)
+                ON CONFLICT (path) DO UPDATE SET
+                    size = :size, mtime = :mtime, sha256 = coalesce(:sha256, sha256), status = :status,
+                    attempts = attempts + :attempts, response = :response, updated_at = :now""",
+                {
+                    "path": str(file_location),
+                    "size": file_stat.st_size,
+                    "mtime": file_stat.st_mtime,
+                    "sha256": sha256,
+                    "status": status,
+                    "attempts": attempts,
+                    "response": response,
+                    "now": time.time(),
+                },
+            )
+            if dequeue:
+                self._connection.execute("DELETE FROM spool WHERE path = ?", (str(file_location),))
+            elif retry_at is not None:
+                self._connection.execute(
+                    "UPDATE spool SET failures = failures + 1, next_attempt_at = ? WHERE path = ?",
+                    (retry_at, str(file_location)),
+                )
+
+    def _transaction(self) -> sqlite3.Connection:
+        """A context manager committing the statements in it together, the lock must be held."""
+        self._connection.execute("BEGIN")
+        return self._connection
+
+    # pylint: disable=R0917
+    def mark_uploaded(  # pylint: disable=too-many-arguments
+        self,
+        file_location: Path,
+        response: str,
+        attempts: int,
+        sha256: str | None = None,
+        file_stat: os.stat_result | None = None,
+    ) -> None:
+        """Record a file as sent to the archive, and take it off the spool.
+
+        Args:
+            file_location: The file which was sent.
+            response: The response from the archive.
+            attempts: The number of attempts made.
+            sha256: The sha256 of the file sent, the file is hashed if it is not given.
+            file_stat: The stat result from when the file was scanned, so the size and
+                modification time stored are those of the file sent. The file is stat'ed
+                if it is not given.
+        """
+        self._upsert(
+            file_location, UPLOADED, response, attempts, sha256, dequeue=True, file_stat=file_stat, hash_file=True
+        )
+
+    # pylint: disable=R0917
+    def mark_failed(  # pylint: disable=too-many-arguments
+        self,
+        file_location: Path,
+        response: str,
+        attempts: int,
+        retry_at: float | None = None,
+        file_stat: os.stat_result | None = None,
+    ) -> None:
+        """Record that every attempt to send a file failed.
+
+        Args:
+            file_location: The file which was not sent.
+            response: The last response or exception from the archive.
+            attempts: The number of attempts made.
+            retry_at: When the file is next due to be sent, counting the failure against it in
+                the spool. If None the file stays due, without the failure being counted.
+            file_stat: The stat result from when the file was scanned, the file is stat'ed if
+                it is not given.
+        """
+        self._upsert(file_location, FAILED, response, attempts, retry_at=retry_at, file_stat=file_stat)
+
+    def mark_dead_letter(
+        self, file_location: Path, response: str, attempts: int, file_stat: os.stat_result | None = None
+    ) -> None:
+        """Record that a file failed in too many cycles to be retried, and take it off the spool."""
+        self._upsert(file_location, DEAD_LETTER, response, attempts, dequeue=True, file_stat=file_stat)
+
+    def mark_held(self, file_location: Path, file_stat: os.stat_result | None = None) -> None:
+        """Record a file as already held by the archive, so it was not sent, and take it off the spool."""
+        self._upsert(file_location, HELD, None, dequeue=True, file_stat=file_stat)
+
+    def enqueue(self, files: Iterable[Path]) -> list[Path]:
+        """Add files to the spool to be sent, files already waiting keep their place and retry time.
+
+        Returns:
+            The files given which are due to be sent, leaving out those waiting to be retried.
+        """
+        files = list(files)
+        now = time.time()
+        with self._lock, self._transaction():
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO spool (path, enqueued_at) VALUES (?, ?)", ((str(file), now) for file in files)
+            )
+            waiting = {
+                path for (path,) in self._connection.execute("SELECT path FROM spool WHERE next_attempt_at > ?", (now,))
+            }
+        return [file for file in files if str(file) not in waiting]
+
+    def dequeue(self, file_location: Path) -> None:
+        """Take a file off the spool without sending it."""
+        with self._lock:
+            self._connection.execute("DELETE FROM spool WHERE path = ?", (str(file_location),))
+
+    def pending(self, now: float | None = None) -> list[Path]:
+        """The files in the spool due to be sent, those being retried first and then the oldest."""
+        with self._lock:
+            rows = self._connection.execute(
+                """SELECT path FROM spool WHERE next_attempt_at <= ?
+                ORDER BY failures > 0 DESC, enqueued_at, path""",
+                (time.time() if now is None else now,),
+            ).fetchall()
+        return [Path(path) for (path,) in rows]
+
+    def retried(self) -> set[Path]:
+        """The files in the spool which have failed to be sent in an earlier cycle."""
+        with self._lock:
+            rows = self._connection.execute("SELECT path FROM spool WHERE failures > 0").fetchall()
+        return {Path(path) for (path,) in rows}
+
+    def spooled_failures(self, file_location: Path) -> int:
+        """The number of cycles a spooled file has failed to be sent in, 0 if it is not spooled."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT failures FROM spool WHERE path = ?", (str(file_location),)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def dead_letters(self) -> list[UploadRecord]:
+        """The files no longer retried after failing in too many cycles."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT * FROM uploads WHERE status = ? ORDER BY path", (DEAD_LETTER,)
+            ).fetchall()
+        return [UploadRecord(*row) for row in rows]
+
+    def get_marker(self, name: str) -> float | None:
+        """Return the time stored under a name, if any."""
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM markers WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_marker(self, name: str, value: float) -> None:
+        """Store a time under a name, such as when the last full scan was made."""
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO markers (name, value) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = ?",
+                (name, value, value),
+            )
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._connection.close()
@@ -4,10 +4,13 @@ import json
 import sys
 import time
 from pathlib import Path
+from typing import NamedTuple
 
 import click
 
+from apds_pusher.bandwidth import parse_schedule
 from apds_pusher.config_parser import Configuration, ParserException
+from apds_pusher.scheduler import check_priority_rules
 
 
 class DeploymentNotFoundError(Exception):
@@ -18,6 +21,28 @@ class DeploymentError(Exception):
     """Exception raised when trying to start archival for Deployments."""
 
 
+class DeploymentSettings(NamedTuple):
+    """The options a deployment was registered with, used by the daemon to run it."""
+
+    data_directory: Path
+    mode: str
+    is_production: bool
+    is_dry_run: bool
+    is_recursive: bool
+
+
+def state_file_location(preferred_location: Path, deployment_location: Path) -> Path:
+    """Return the directory a deployment's log and local state files are kept in.
+
+    This is the first of these locations that exists
+    - The location specified in the config file (preferred_location)
+    - The location of the deployment
+    - The current working directory.
+    """
+    locations = [Path(preferred_location), Path(deployment_location)]
+    return next((location for location in locations if location.is_dir()), Path.cwd())
+
+
 def check_delete_active_deployments(deployment_id: str, config: Configuration) -> bool:
     """Checks and deletes if archival for a deployment is going on.
 
@@ -34,6 +59,7 @@ def check_delete_active_deployments(deployment_id: str, config: Configuration) -
         try:
             if deployment_id_file.exists():
                 deployment_id_file.unlink()
+                deployment_id_file.with_suffix(".json").unlink(missing_ok=True)
                 return True
             raise DeploymentNotFoundError(f"Cannot stop. No archival started for deployment_id {deployment_id}")
 
@@ -72,6 +98,33 @@ def check_add_active_deployments(deployment_id: str, config: Configuration) -> t
     return True, deployment_id_file
 
 
+def write_deployment_settings(deployment_file: Path, settings: DeploymentSettings) -> Path:
+    """Store the options for a deployment next to its active deployment file.
+
+    Args:
+        deployment_file: The active deployment file created for the deployment
+        settings: The options the deployment was registered with
+    Returns:
+        The path of the settings file.
+    """
+    settings_file = deployment_file.with_suffix(".json")
+    settings_dict = settings._asdict()
+    settings_dict["data_directory"] = str(settings.data_directory)
+    settings_file.write_text(json.dumps(settings_dict), encoding="utf-8")
+    return settings_file
+
+
+def read_deployment_settings(deployment_file: Path) -> DeploymentSettings | None:
+    """Read the options stored for a deployment, or None if it was not registered for the daemon."""
+    settings_file = deployment_file.with_suffix(".json")
+    try:
+        settings_dict = json.loads(settings_file.read_text(encoding="utf-8"))
+        settings_dict["data_directory"] = Path(settings_dict["data_directory"])
+        return DeploymentSettings(**settings_dict)
+    except (OSError, ValueError, TypeError, KeyError):
+        return None
+
+
 def load_configuration_file(config_path: Path) -> Configuration:
     """Load a configuration file JSON into a Configuration instance."""
     # load the json file or exit if it's bad
@@ -88,6 +141,15 @@ def load_configuration_file(config_path: Path) -> Configuration:
     if not isinstance(config.archive_checker_frequency, int):
         raise click.ClickException("'archive_checker_frequency' in the config file needs to be a integer.") from None
 
+    if config.transfer_engine not in ("threads", "asyncio"):
+        raise click.ClickException("'transfer_engine' in the config file needs to be 'threads' or 'asyncio'.") from None
+
+    try:
+        parse_schedule(config.bandwidth_schedule)
+        check_priority_rules(config.upload_priority, config.upload_priority_weights)
+    except ValueError as exc:
+        raise click.ClickException(exc.args[0]) from None
+
     click.echo(message="Configuration accepted")
 
     return config
@@ -0,0 +1,247 @@
+"""A local stand-in for the BODC Archive API, for tests and trial runs.
+
+The server implements the holdings, archive and resumable upload endpoints used by
+the pusher, keeping everything it receives in memory. It can be started from the
+command line to point a pusher's ``bodc_archive_url`` at::
+
+    python -m apds_pusher.utils.stub_archive_server --port 8080
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import PurePosixPath
+from urllib.parse import unquote, urlsplit
+
+_FILENAME_PATTERN = re.compile(rb'filename="([^"]*)"')
+_READ_SIZE = 64 * 1024
+
+
+class StubArchiveServer(ThreadingHTTPServer):
+    """An in-memory stand-in for the Archive API."""
+
+    daemon_threads = True
+    # Enough for a burst of new connections from many uploads starting at once
+    request_queue_size = 1024
+
+    def __init__(self, address: tuple[str, int] = ("127.0.0.1", 0), access_token: str | None = None) -> None:
+        """Start listening on the given address.
+
+        Args:
+            address: The host and port to listen on, port 0 picks a free port.
+            access_token: If given, requests must carry it as a Bearer token or receive a 401.
+        """
+        super().__init__(address, _StubArchiveHandler)
+        self.access_token = access_token
+        self.lock = threading.Lock()
+        self.holdings: dict[str, set[str]] = defaultdict(set)
+        self.uploads: dict[str, dict] = {}
+        self.bytes_received = 0
+        self.requests: list[tuple[str, str]] = []
+        #: Status codes returned, in order, instead of handling the next requests.
+        self.fail_next: list[int] = []
+        #: Seconds waited before answering each request, to stand in for a stalled archive.
+        self.response_delay = 0.0
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        """The base URL of the archive, to be used as 'bodc_archive_url'."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def handle_error(self, request: object, client_address: object) -> None:
+        """Keep quiet about clients which go away before they are answered, such as an abandoned upload."""
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)  # type: ignore[arg-type]
+
+    def start(self) -> "StubArchiveServer":
+        """Serve requests from a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving requests and close the socket."""
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "StubArchiveServer":
+        """Start the server for the duration of a with block."""
+        return self.start()
+
+    def __exit__(self, *_: object) -> None:
+        """Stop the server at the end of a with block."""
+        self.stop()
+
+
+class _StubArchiveHandler(BaseHTTPRequestHandler):
+    """Request handler for the stub archive."""
+
+    server: StubArchiveServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: object) -> None:  # pylint: disable=redefined-builtin  # noqa: A002
+        """Keep the request log quiet."""
+
+    def _send_json(self, status: int, body: dict | None = None, headers: dict | None = None) -> None:
+        payload = json.dumps(body or {}).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(payload)
+
+    def _token_refused(self) -> bool:
+        token = self.server.access_token
+        return bool(token) and self.headers.get("Authorization") != f"Bearer {token}"
+
+    def handle_expect_100(self) -> bool:
+        """Refuse a request with a bad token before its body is sent, as the archive would."""
+        if self._token_refused():
+            self._send_json(401, {"error": "invalid token"})
+            self.close_connection = True
+            return False
+        return super().handle_expect_100()
+
+    def _read_body(self) -> bytes | None:
+        length = int(self.headers.get("Content-Length", 0))
+        chunks = []
+        while length > 0:
+            chunk = self.rfile.read(min(_READ_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            chunks.append(chunk)
+        body = b"".join(chunks)
+        with self.server.lock:
+            self.server.bytes_received += len(body)
+        # None if the client stopped before sending all it said it would
+        return body if length <= 0 else None
+
+    def _handle(self) -> None:  # noqa: C901
+        path = PurePosixPath(unquote(urlsplit(self.path).path))
+        parts = path.parts[1:]
+        body = self._read_body()
+        with self.server.lock:
+            self.server.requests.append((self.command, self.path))
+            injected_status = self.server.fail_next.pop(0) if self.server.fail_next else None
+        if self.server.response_delay:
+            time.sleep(self.server.response_delay)
+        if injected_status:
+            self._send_json(injected_status)
+            return
+        if self._token_refused():
+            self._send_json(401, {"error": "invalid token"})
+            return
+        if body is None:
+            # A truncated upload is refused rather than stored as if it were the whole file
+            self.close_connection = True
+            self._send_json(400, {"error": "request body shorter than its Content-Length"})
+            return
+
+        match (self.command, parts):
+            case ("GET", ("holdings", deployment_id)):
+                self._send_holdings(deployment_id)
+            case ("HEAD", ("archiveFile" | "archiveRecovery", _)):
+                self._send_json(200)
+            case ("POST", ("archiveFile" | "archiveRecovery", deployment_id)):
+                filename = _FILENAME_PATTERN.search(body[:4096])
+                if not filename:
+                    self._send_json(400, {"error": "no file in request"})
+                    return
+                self._add_holding(deployment_id, filename.group(1).decode("utf-8"))
+                self._send_json(200)
+            case ("POST", ("archiveRecovery", deployment_id, "uploads")):
+                self._start_upload(deployment_id, json.loads(body))
+            case ("GET", ("archiveRecovery", _, "uploads", upload_id)) if upload_id in self.server.uploads:
+                self._send_json(200, {"parts": sorted(self.server.uploads[upload_id]["parts"])})
+            case ("PUT", ("archiveRecovery", _, "uploads", upload_id, "parts", part_number)) if (
+                upload_id in self.server.uploads
+            ):
+                with self.server.lock:
+                    self.server.uploads[upload_id]["parts"][int(part_number)] = body
+                self._send_json(200)
+            case ("POST", ("archiveRecovery", _, "uploads", upload_id, "commit")) if upload_id in self.server.uploads:
+                self._commit_upload(upload_id, json.loads(body))
+            case _:
+                self._send_json(404, {"error": "not found"})
+
+    do_GET = do_HEAD = do_POST = do_PUT = _handle
+
+    def _send_holdings(self, deployment_id: str) -> None:
+        holdings = self._holdings_json(deployment_id)
+        etag = '"' + hashlib.sha1(json.dumps(holdings).encode("utf-8")).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._send_json(200, {"files": holdings}, {"ETag": etag})
+
+    def _holdings_json(self, deployment_id: str) -> dict:
+        by_extension: dict[str, list] = defaultdict(list)
+        with self.server.lock:
+            for name in sorted(self.server.holdings[deployment_id]):
+                by_extension[PurePosixPath(name).suffix].append({"name": name})
+        holdings: dict = {}
+        for extension, files in by_extension.items():
+            holdings[f"{extension}_Count"] = len(files)
+            holdings[f"{extension}_files"] = files
+        return holdings
+
+    def _add_holding(self, deployment_id: str, filename: str) -> None:
+        with self.server.lock:
+            self.server.holdings[deployment_id].add(filename)
+
+    def _start_upload(self, deployment_id: str, request: dict) -> None:
+        upload_id = uuid.uuid4().hex
+        with self.server.lock:
+            self.server.uploads[upload_id] = {"deployment_id": deployment_id, "request": request, "parts": {}}
+        self._send_json(201, {"uploadId": upload_id})
+
+    def _commit_upload(self, upload_id: str, request: dict) -> None:
+        upload = self.server.uploads[upload_id]
+        if sorted(upload["parts"]) != list(range(request["parts"])):
+            self._send_json(409, {"error": "parts missing"})
+            return
+        content = b"".join(upload["parts"][number] for number in range(request["parts"]))
+        if len(content) != upload["request"]["size"] or hashlib.sha256(content).hexdigest() != request["sha256"]:
+            self._send_json(409, {"error": "assembled file does not match"})
+            return
+        with self.server.lock:
+            del self.server.uploads[upload_id]
+        self._add_holding(upload["deployment_id"], upload["request"]["filename"])
+        self._send_json(200)
+
+
+def main() -> None:
+    """Run the stub archive until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--access-token", default=None, help="Require this Bearer token on every request.")
+    args = parser.parse_args()
+
+    server = StubArchiveServer((args.host, args.port), args.access_token)
+    print(f"Stub archive listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Benchmark of the time a pusher's cycle spends logging, with trace on and off.
+
+Sends a deployment of small files to a stub archive running locally, then times
+a full rescan of the deployment, in which every file is found to be already sent,
+once with trace off and once with it on. No files are transferred by the rescan,
+so its time is the pusher's own work for each file, including its logging. Run
+from the top of the repository with::
+
+    python -m benchmarks.bench_logging --sizes 1000 10000 50000
+"""
+
+import argparse
+import contextlib
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from apds_pusher.config_parser import Configuration
+from apds_pusher.filepusher import FilePusher
+from apds_pusher.systemlogger import SystemLogger
+from apds_pusher.utils.stub_archive_server import StubArchiveServer
+
+
+def make_pusher(archive_url: str, deployment: Path, save_location: Path, trace: bool) -> FilePusher:
+    """A pusher for the deployment, keeping its state and logs in save_location."""
+    config = Configuration(
+        client_id="an_id",
+        auth0_tenant="a_tenant",
+        auth2_audience="an audience",
+        client_secret="a secret",
+        bodc_archive_url=archive_url,
+        file_formats=[".cac"],
+        archive_checker_frequency=1,
+        save_file_location=save_location,
+        log_file_location=save_location,
+        upload_workers=8,
+        # Every file is found again by each timed rescan, rather than resumed from the first scan
+        warm_restart=False,
+    )
+    deployment_file = save_location / "deployment.txt"
+    deployment_file.write_text("0")
+    logger = SystemLogger(deployment.name, save_location, deployment, trace=trace)
+    return FilePusher(
+        deployment.name, deployment, config, False, False, False, "token", "", deployment_file, logger, "NRT"
+    )
+
+
+def close_pusher(pusher: FilePusher) -> None:
+    """Close the pusher and its log files."""
+    pusher.close()
+    for handler in pusher.system_logger.handlers:
+        handler.close()
+
+
+def time_rescan(archive_url: str, deployment: Path, save_location: Path, trace: bool) -> tuple[float, int]:
+    """Time a full rescan of the already sent deployment, returning it and the bytes logged."""
+    pusher = make_pusher(archive_url, deployment, save_location, trace)
+    log_size = pusher.system_logger.log_file_name.stat().st_size
+    start = time.perf_counter()
+    pusher.push_files(pusher.retrieve_file_paths(1), set())
+    elapsed = time.perf_counter() - start
+    close_pusher(pusher)
+    return elapsed, pusher.system_logger.log_file_name.stat().st_size - log_size
+
+
+def main() -> None:
+    """Time a rescan with trace off and on over deployments of increasing size."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    args = parser.parse_args()
+
+    print(f"{'files':>8} {'trace off (s)':>14} {'trace on (s)':>13} {'log off (B)':>12} {'log on (B)':>12}")
+    # The console handler writes to the stderr it is created with, which is discarded
+    with (
+        tempfile.TemporaryDirectory() as directory,
+        StubArchiveServer() as server,
+        open(os.devnull, "w", encoding="utf-8") as devnull,
+        contextlib.redirect_stderr(devnull),
+    ):
+        root = Path(directory)
+        for size in args.sizes:
+            deployment = root / f"deployment{size}"
+            save_location = root / f"save{size}"
+            deployment.mkdir()
+            save_location.mkdir()
+            for number in range(size):
+                (deployment / f"{number:08d}.cac").write_bytes(b"x" * 64)
+            pusher = make_pusher(server.url, deployment, save_location, trace=False)
+            pusher.send_files_to_api(1)
+            close_pusher(pusher)
+
+            off_time, off_bytes = time_rescan(server.url, deployment, save_location, trace=False)
+            on_time, on_bytes = time_rescan(server.url, deployment, save_location, trace=True)
+            print(f"{size:>8} {off_time:>14.3f} {on_time:>13.3f} {off_bytes:>12} {on_bytes:>12}")
+
+
+if __name__ == "__main__":
+    main()
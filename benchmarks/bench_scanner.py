@@ -0,0 +1,75 @@
+"""Benchmark of the deployment scan time against the size of the deployment tree.
+
+Compares the single pass scanner with the previous approach of one recursive glob
+per file format followed by an lstat of every match. Run from the top of the
+repository with::
+
+    python -m benchmarks.bench_scanner --sizes 1000 10000 100000
+"""
+
+import argparse
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from apds_pusher.scanner import scan_deployment
+
+FILE_FORMATS = [".sbd", ".tbd", ".dbd", ".ebd", ".mbd", ".nbd", ".cac", ".mlg"]
+FILES_PER_DIRECTORY = 500
+
+
+def build_tree(root: Path, size: int) -> None:
+    """Create a deployment tree of 'size' files, spread over sub-directories."""
+    for number in range(size):
+        directory = root / f"dir{number // FILES_PER_DIRECTORY:04d}"
+        directory.mkdir(exist_ok=True)
+        # One in five files is not a glider file, as with log and text files in real deployments
+        suffix = ".txt" if number % 5 == 0 else FILE_FORMATS[number % len(FILE_FORMATS)]
+        (directory / f"{number:08d}{suffix}").touch()
+
+
+def glob_per_format(root: Path, modified_after: float) -> list[Path]:
+    """The previous search, one walk of the tree per format."""
+    file_paths: list[Path] = []
+    for file_format in FILE_FORMATS:
+        unfiltered = list(root.glob(f"**/*{file_format}"))
+        file_paths.extend(filter(lambda file: file.lstat().st_mtime > modified_after, unfiltered))
+    return file_paths
+
+
+def single_pass(root: Path, modified_after: float) -> list[Path]:
+    """The single pass scanner."""
+    return [scanned.path for scanned in scan_deployment(root, FILE_FORMATS, True, modified_after)]
+
+
+def best_of(repeats: int, function: Callable[..., list], *args: object) -> tuple[float, int]:
+    """Return the fastest of several runs, and the number of files found."""
+    timings, found = [], 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        found = len(function(*args))
+        timings.append(time.perf_counter() - start)
+    return min(timings), found
+
+
+def main() -> None:
+    """Time both searches over trees of increasing size."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'files':>10} {'matches':>10} {'glob per format (s)':>20} {'single pass (s)':>16} {'speed up':>9}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            root = Path(directory)
+            build_tree(root, size)
+            glob_time, glob_found = best_of(args.repeats, glob_per_format, root, 0.0)
+            scan_time, scan_found = best_of(args.repeats, single_pass, root, 0.0)
+            assert glob_found == scan_found
+            print(f"{size:>10} {scan_found:>10} {glob_time:>20.4f} {scan_time:>16.4f} {glob_time / scan_time:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
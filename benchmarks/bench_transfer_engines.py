@@ -0,0 +1,112 @@
+"""Benchmark of the thread based and asyncio transfer engines against the stub archive.
+
+Uploads the same set of files through each engine, with the same number of uploads
+in flight, to a stub archive running locally. Run from the top of the repository
+with::
+
+    python -m benchmarks.bench_transfer_engines --files 500 --size 65536 --in-flight 8 64 256
+"""
+
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from apds_pusher.async_engine import AsyncHTTPClient, send_to_archive_async
+from apds_pusher.config_parser import Configuration
+from apds_pusher.http_session import create_session
+from apds_pusher.send_to_archive import send_to_archive_api
+from apds_pusher.utils.stub_archive_server import StubArchiveServer
+
+LOGGER = logging.getLogger("benchmark")
+
+
+def make_config(archive_url: str, in_flight: int, save_location: Path) -> Configuration:
+    """A configuration for the stub archive allowing 'in_flight' connections at once."""
+    return Configuration(
+        client_id="an_id",
+        auth0_tenant="a_tenant",
+        auth2_audience="an audience",
+        client_secret="a secret",
+        bodc_archive_url=archive_url,
+        file_formats=[".cac"],
+        archive_checker_frequency=1,
+        save_file_location=save_location,
+        log_file_location=save_location,
+        upload_workers=in_flight,
+        http_max_connections_per_host=in_flight,
+    )
+
+
+def upload_with_threads(config: Configuration, files: list[Path]) -> int:
+    """Upload the files using requests, one worker thread per upload in flight."""
+    session = create_session(config)
+    with ThreadPoolExecutor(max_workers=config.upload_workers) as executor:
+        results = list(
+            executor.map(
+                lambda file: send_to_archive_api(
+                    file, "bench", "token", config.bodc_archive_url, "NRT", LOGGER, config, session=session
+                ),
+                files,
+            )
+        )
+    session.close()
+    return results.count("Success")
+
+
+async def _upload_with_asyncio(config: Configuration, files: list[Path]) -> int:
+    client = AsyncHTTPClient(config.http_max_connections_per_host)
+    results = await asyncio.gather(
+        *(
+            send_to_archive_async(client, file, "bench", "token", config.bodc_archive_url, "NRT", LOGGER, config)
+            for file in files
+        )
+    )
+    await client.close()
+    return results.count("Success")
+
+
+def upload_with_asyncio(config: Configuration, files: list[Path]) -> int:
+    """Upload the files on one event loop, with at most 'in_flight' connections open."""
+    return asyncio.run(_upload_with_asyncio(config, files))
+
+
+def main() -> None:
+    """Time both engines uploading to the stub archive."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--size", type=int, default=64 * 1024, help="Size of each file in bytes")
+    parser.add_argument("--in-flight", type=int, nargs="+", default=[8, 64, 256])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory, StubArchiveServer() as server:
+        root = Path(directory)
+        files = []
+        for number in range(args.files):
+            file = root / f"{number:06d}.cac"
+            file.write_bytes(b"x" * args.size)
+            files.append(file)
+
+        print(
+            f"{'in flight':>10} {'threads (s)':>12} {'asyncio (s)':>12} {'files/s threads':>16} {'files/s asyncio':>16}"
+        )
+        for in_flight in args.in_flight:
+            config = make_config(server.url, in_flight, root)
+            timings = []
+            for engine in (upload_with_threads, upload_with_asyncio):
+                start = time.perf_counter()
+                sent = engine(config, files)
+                timings.append(time.perf_counter() - start)
+                assert sent == len(files)
+            threads_time, asyncio_time = timings
+            print(
+                f"{in_flight:>10} {threads_time:>12.3f} {asyncio_time:>12.3f} "
+                f"{len(files) / threads_time:>16.1f} {len(files) / asyncio_time:>16.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
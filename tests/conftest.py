@@ -0,0 +1,12 @@
+"""Shared fixtures for the tests."""
+
+import pytest
+
+from apds_pusher.utils.stub_archive_server import StubArchiveServer
+
+
+@pytest.fixture(name="archive_server")
+def archive_server_fixture():
+    """A local stand-in for the Archive API, running for the duration of a test."""
+    with StubArchiveServer() as server:
+        yield server
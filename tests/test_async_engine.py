@@ -0,0 +1,193 @@
+# pylint: disable=duplicate-code
+"""Tests for the asyncio transfer engine, run against the stub archive."""
+
+import asyncio
+import logging
+import time
+from pathlib import Path
+
+import pytest
+
+from apds_pusher.async_engine import (
+    AsyncHTTPClient,
+    AsyncTransferEngine,
+    AsyncTransportError,
+    send_to_archive_async,
+)
+from apds_pusher.bandwidth import BandwidthLimiter
+from apds_pusher.config_parser import Configuration
+from apds_pusher.filepusher import FilePusher
+from apds_pusher.send_to_archive import AuthenticationError, FileUploadError
+
+LOGGER = logging.getLogger("test")
+
+
+@pytest.fixture(name="config")
+def config_fixture(tmp_path, archive_server):
+    """A configuration pointing at the stub archive and using the asyncio engine."""
+    save_location = tmp_path / "save"
+    save_location.mkdir()
+    log_location = tmp_path / "logs"
+    log_location.mkdir()
+
+    return Configuration(
+        client_id="an_id",
+        auth0_tenant="a_tenant",
+        auth2_audience="an audience",
+        client_secret="a secret",
+        bodc_archive_url=archive_server.url,
+        file_formats=[".cac"],
+        archive_checker_frequency=1000,
+        save_file_location=save_location,
+        log_file_location=log_location,
+        upload_chunk_size=1024,
+        upload_workers=16,
+        transfer_engine="asyncio",
+        retry_base_delay=0.0,
+    )
+
+
+def make_files(directory: Path, count: int) -> list[Path]:
+    """Create glider files of a few chunks each."""
+    directory.mkdir(exist_ok=True)
+    files = []
+    for number in range(count):
+        file = directory / f"file{number}.cac"
+        file.write_bytes(bytes([number]) * 5000)
+        files.append(file)
+    return files
+
+
+async def send_all(config: Configuration, files: list[Path], access_token: str = "a_token") -> list:
+    """Send files concurrently on one client, returning the results or exceptions."""
+    client = AsyncHTTPClient(max_connections_per_host=4, timeout=config.http_timeout)
+    try:
+        return await asyncio.gather(
+            *(
+                send_to_archive_async(client, file, "441", access_token, config.bodc_archive_url, "NRT", LOGGER, config)
+                for file in files
+            ),
+            return_exceptions=True,
+        )
+    finally:
+        await client.close()
+
+
+def test_files_are_sent_concurrently(config, archive_server, tmp_path):
+    """Test many files are uploaded at once over a few pooled connections."""
+    files = make_files(tmp_path / "gliders", 40)
+
+    results = asyncio.run(send_all(config, files))
+
+    assert results == ["Success"] * 40
+    assert archive_server.holdings["441"] == {file.name for file in files}
+    assert archive_server.bytes_received > 40 * 5000
+
+
+@pytest.mark.parametrize(
+    "status, exception_type",
+    [(500, FileUploadError), (401, AuthenticationError), (404, FileNotFoundError)],
+)
+def test_error_responses_raise_as_requests_backend(config, archive_server, tmp_path, status, exception_type):
+    """Test the archive's error responses raise the same exceptions as the requests backend."""
+    archive_server.fail_next = [status]
+
+    (result,) = asyncio.run(send_all(config, make_files(tmp_path / "gliders", 1)))
+
+    assert isinstance(result, exception_type)
+
+
+def test_failed_upload_returns_fail(config, archive_server, tmp_path):
+    """Test a rejected upload is reported as a failure rather than raised."""
+    archive_server.fail_next = [400]
+
+    assert asyncio.run(send_all(config, make_files(tmp_path / "gliders", 1))) == ["Fail"]
+
+
+def test_refused_upload_sends_no_body_with_expect_continue(config, archive_server, tmp_path):
+    """Test a large upload with a refused token is stopped before its body is sent."""
+    archive_server.access_token = "good"
+    config.expect_continue_threshold = 1000
+    files = make_files(tmp_path / "gliders", 2)
+
+    (refused,) = asyncio.run(send_all(config, files[:1], access_token="bad"))
+    assert isinstance(refused, AuthenticationError)
+    assert archive_server.bytes_received == 0
+
+    assert asyncio.run(send_all(config, files[1:], access_token="good")) == ["Success"]
+    assert archive_server.holdings["441"] == {files[1].name}
+
+
+def test_stalled_upload_fails_after_read_timeout(config, archive_server, tmp_path):
+    """Test an upload fails once the archive stops answering for longer than the read timeout."""
+    config.http_read_timeout = 0.2
+    archive_server.response_delay = 2.0
+
+    started = time.monotonic()
+    (result,) = asyncio.run(send_all(config, make_files(tmp_path / "gliders", 1)))
+
+    assert isinstance(result, AsyncTransportError)
+    assert time.monotonic() - started < 1.0
+
+
+def test_time_held_back_by_the_bandwidth_limit_does_not_count_towards_the_deadline(config, archive_server, tmp_path):
+    """Test an upload paced by the limiter more slowly than upload_min_throughput is not timed out."""
+    config.http_read_timeout = 0.2
+    config.upload_min_throughput = 100_000
+    limiter = BandwidthLimiter(10_000)
+    (file,) = make_files(tmp_path / "gliders", 1)
+
+    async def send():
+        client = AsyncHTTPClient(timeout=config.http_timeout)
+        try:
+            return await send_to_archive_async(
+                client, file, "441", "a_token", config.bodc_archive_url, "NRT", LOGGER, config, limiter=limiter
+            )
+        finally:
+            await client.close()
+
+    started = time.monotonic()
+    result = asyncio.run(send())
+
+    assert result == "Success"
+    # Well past the deadline of 0.25 seconds for the file, as 5000 bytes take 0.5 seconds at the limit
+    assert time.monotonic() - started > config.upload_deadline(file.stat().st_size)
+
+
+def test_unreachable_archive_raises(config, archive_server, tmp_path):
+    """Test transport failures are raised as connection errors."""
+    archive_server.stop()
+
+    (result,) = asyncio.run(send_all(config, make_files(tmp_path / "gliders", 1)))
+    assert isinstance(result, AsyncTransportError)
+    assert isinstance(result, ConnectionError)
+
+
+def test_engine_runs_coroutines_from_other_threads(config, archive_server, tmp_path):
+    """Test the engine's event loop can be handed uploads and its results collected."""
+    file = make_files(tmp_path / "gliders", 1)[0]
+    engine = AsyncTransferEngine(config)
+    try:
+        future = engine.submit(
+            send_to_archive_async(engine.client, file, "441", "a_token", config.bodc_archive_url, "NRT", LOGGER, config)
+        )
+        assert future.result(timeout=10) == "Success"
+    finally:
+        engine.close()
+
+
+def test_pusher_uploads_with_asyncio_engine(config, archive_server, tmp_path):
+    """Test a pusher configured for the asyncio engine sends its files through it."""
+    files = make_files(tmp_path / "gliders", 12)
+    archive_server.fail_next = [500]
+    pusher = FilePusher(
+        "441", tmp_path / "gliders", config, False, False, False, "", "", tmp_path / "441.txt", LOGGER, "NRT"
+    )
+    try:
+        results = dict(pusher.upload_files(files))
+    finally:
+        pusher.close()
+
+    assert results == dict.fromkeys(files, True)
+    assert archive_server.holdings["441"] == {file.name for file in files}
+    assert pusher.engine is not None and pusher.engine.loop.is_closed()
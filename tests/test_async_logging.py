@@ -0,0 +1,138 @@
+"""Tests for writing log files from a background thread."""
+
+import logging
+import time
+
+import pytest
+
+from apds_pusher.async_logging import BackgroundFileHandler, BackgroundFileWriter
+from apds_pusher.savefilelogger import FileLogger
+from apds_pusher.systemlogger import SystemLogger
+
+
+@pytest.fixture(name="log_file")
+def log_file_fixture(tmp_path):
+    """The path of a log file to be written."""
+    return tmp_path / "test.log"
+
+
+def test_lines_are_buffered_until_flushed(log_file):
+    """Check queued lines are written through the open file once flushed."""
+    writer = BackgroundFileWriter(log_file, flush_interval=60)
+    writer.write("first line\n")
+    writer.write("second line\n")
+    time.sleep(0.1)
+    assert log_file.read_text() == ""
+
+    writer.flush()
+    assert log_file.read_text() == "first line\nsecond line\n"
+    writer.close()
+
+
+def test_quiet_writer_flushes_after_interval(log_file):
+    """Check the last lines reach the file once they are flush_interval old, without more being written."""
+    writer = BackgroundFileWriter(log_file, flush_interval=0.05)
+    writer.write("a line\n")
+
+    deadline = time.monotonic() + 5
+    while log_file.read_text() != "a line\n" and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert log_file.read_text() == "a line\n"
+    writer.close()
+
+
+def test_close_writes_and_fsyncs_everything_queued(log_file, mocker):
+    """Check closing the writer drains the queue and fsyncs the file."""
+    fsync = mocker.patch("apds_pusher.async_logging.os.fsync")
+    writer = BackgroundFileWriter(log_file, flush_interval=60)
+    for number in range(1000):
+        writer.write(f"line {number}\n")
+
+    writer.close()
+    writer.close()
+
+    assert log_file.read_text().splitlines() == [f"line {number}" for number in range(1000)]
+    assert fsync.call_count == 1
+    assert not writer._thread.is_alive()  # pylint: disable=protected-access
+
+
+class FailingFile:
+    """Stands in for the writer's file, failing to write until told otherwise."""
+
+    def __init__(self, real_file, error):
+        """Wrap the real file, raising error from every write."""
+        self.real_file = real_file
+        self.error = error
+
+    def write(self, text):
+        """Raise the error, if any, otherwise write the text."""
+        if self.error is not None:
+            raise self.error
+        return self.real_file.write(text)
+
+    def __getattr__(self, name):
+        """Pass everything else to the real file."""
+        return getattr(self.real_file, name)
+
+
+def test_write_errors_are_reported_and_writing_continues(log_file, capsys):
+    """Check a failing disk is reported once on stderr, without stopping the writer or blocking flushes."""
+    writer = BackgroundFileWriter(log_file, flush_interval=60)
+    failing = FailingFile(writer._file, OSError(28, "No space left on device"))  # pylint: disable=protected-access
+    writer._file = failing  # pylint: disable=protected-access
+    writer.write("lost line\n")
+    writer.write("another lost line\n")
+    writer.flush()
+
+    assert writer._thread.is_alive()  # pylint: disable=protected-access
+    assert capsys.readouterr().err.count("No space left on device") == 1
+
+    failing.error = None
+    writer.write("kept line\n")
+    writer.close()
+    assert log_file.read_text() == "kept line\n"
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_flush_returns_once_the_writer_thread_has_died(log_file, mocker):
+    """Check waiting for a flush does not block forever if the writer thread has stopped."""
+    mocker.patch("apds_pusher.async_logging._ALIVE_CHECK_INTERVAL", 0.01)
+    writer = BackgroundFileWriter(log_file, flush_interval=60)
+    writer._file = FailingFile(writer._file, SystemExit())  # pylint: disable=protected-access
+    writer.write("a line\n")
+
+    writer.flush()
+    writer.close()
+
+    assert not writer._thread.is_alive()  # pylint: disable=protected-access
+
+
+def test_handler_writes_formatted_records(log_file):
+    """Check records are formatted and written by the background handler."""
+    handler = BackgroundFileHandler(log_file, flush_interval=60)
+    handler.setFormatter(logging.Formatter("%(levelname)s - %(message)s"))
+    logger = logging.getLogger("test_async_logging")
+    logger.addHandler(handler)
+    try:
+        logger.warning("a %s message", "queued")
+        handler.flush()
+        assert log_file.read_text() == "WARNING - a queued message\n"
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+
+def test_loggers_write_in_the_background(tmp_path):
+    """Check the system logger and save file logger use a background writer when given a flush interval."""
+    system_logger = SystemLogger("1234", tmp_path, tmp_path, flush_interval=60)
+    file_logger = FileLogger(tmp_path, tmp_path, "1234", flush_interval=60)
+    (file_handler,) = [handler for handler in system_logger.handlers if isinstance(handler, BackgroundFileHandler)]
+
+    system_logger.info("info message from test")
+    file_logger.write_to_log_file("a-test-file.cac")
+    file_handler.close()
+    file_logger.close()
+
+    assert "info message from test" in (tmp_path / "1234.log").read_text()
+    assert '"path": "a-test-file.cac"' in file_logger.file_path.read_text()
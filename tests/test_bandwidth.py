@@ -0,0 +1,129 @@
+# pylint: disable=duplicate-code
+"""Tests for the bandwidth limiter, including the rate achieved against the stub archive."""
+
+import logging
+import time
+from datetime import datetime
+
+import pytest
+
+from apds_pusher.bandwidth import BandwidthLimiter, ScheduleWindow, ThrottledBytes, parse_schedule
+from apds_pusher.config_parser import Configuration
+from apds_pusher.filepusher import FilePusher
+
+
+class FakeClock:
+    """A clock which moves forward only when slept on."""
+
+    def __init__(self) -> None:
+        """Start the clock at 0."""
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        """The current time."""
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        """Move the clock forward."""
+        self.now += seconds
+
+
+@pytest.fixture(name="clock")
+def clock_fixture():
+    """A clock for the limiter, starting at 0."""
+    return FakeClock()
+
+
+def test_concurrent_senders_share_the_limit(clock):
+    """Test bytes taken together are paced at the limit, with no more than a second's burst saved up."""
+    limiter = BandwidthLimiter(1000, clock=clock, sleep=clock.sleep)
+
+    assert limiter.reserve(500) == 0.5
+    # A second sender queues behind the first rather than sending at the full limit too
+    assert limiter.reserve(500) == 1.0
+
+    clock.now = 10.0
+    assert limiter.reserve(1000) == 0.0
+    assert limiter.consume(500) == 0.5
+    assert clock.now == 10.5
+
+
+def test_schedule_sets_the_limit_by_time_of_day(clock):
+    """Test the first schedule window covering the time of day sets the limit, including past midnight."""
+    schedule = parse_schedule(
+        [{"start": "22:00", "end": "06:00", "limit": 0}, {"start": "08:00", "end": "18:00", "limit": 500}]
+    )
+    moment = datetime(2024, 5, 1, 3, 0)
+    limiter = BandwidthLimiter(2000, schedule, clock=clock, sleep=clock.sleep, now=lambda: moment)
+
+    assert schedule[0] == ScheduleWindow(datetime(1, 1, 1, 22).time(), datetime(1, 1, 1, 6).time(), 0)
+    assert limiter.current_limit() == 0
+    assert limiter.reserve(10_000) == 0.0
+    moment = datetime(2024, 5, 1, 12, 0)
+    assert limiter.current_limit() == 500
+    moment = datetime(2024, 5, 1, 19, 30)
+    assert limiter.current_limit() == 2000
+
+
+@pytest.mark.parametrize(
+    "entry",
+    [
+        {"start": "08:00", "limit": 5},
+        {"start": "8am", "end": "10:00", "limit": 5},
+        {"start": "08:00", "end": "10:00", "limit": -1},
+    ],
+)
+def test_invalid_schedule_raises(entry):
+    """Test schedule entries with missing or invalid fields are refused."""
+    with pytest.raises(ValueError):
+        parse_schedule([entry])
+
+
+def test_throttled_bytes_are_sent_in_paced_chunks(clock):
+    """Test a resumable upload part is sent a chunk at a time, waiting on the limiter."""
+    body = ThrottledBytes(b"x" * 2500, BandwidthLimiter(1000, clock=clock, sleep=clock.sleep), 1000)
+
+    assert [len(chunk) for chunk in body] == [1000, 1000, 500]
+    assert len(body) == 2500
+    assert clock.now == 2.5
+
+
+@pytest.mark.parametrize("transfer_engine", ["threads", "asyncio"])
+def test_uploads_are_held_to_the_limit(archive_server, tmp_path, transfer_engine):
+    """Test concurrent uploads to the stub archive together send at the configured rate."""
+    glider_dir = tmp_path / "gliders"
+    glider_dir.mkdir()
+    files = []
+    for number in range(4):
+        file = glider_dir / f"file{number}.cac"
+        file.write_bytes(b"x" * 100_000)
+        files.append(file)
+    config = Configuration(
+        client_id="an_id",
+        auth0_tenant="a_tenant",
+        auth2_audience="an audience",
+        client_secret="a secret",
+        bodc_archive_url=archive_server.url,
+        file_formats=[".cac"],
+        archive_checker_frequency=1000,
+        save_file_location=tmp_path,
+        log_file_location=tmp_path,
+        upload_chunk_size=8192,
+        upload_workers=4,
+        transfer_engine=transfer_engine,
+        bandwidth_limit=400_000,
+    )
+    pusher = FilePusher(
+        "441", glider_dir, config, False, False, False, "", "", tmp_path / "441.txt", logging.getLogger("test"), "NRT"
+    )
+
+    started = time.monotonic()
+    try:
+        results = dict(pusher.upload_files(files))
+    finally:
+        pusher.close()
+    elapsed = time.monotonic() - started
+
+    assert results == dict.fromkeys(files, True)
+    achieved_rate = archive_server.bytes_received / elapsed
+    assert 0.8 * 400_000 < achieved_rate < 1.05 * 400_000
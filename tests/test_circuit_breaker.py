@@ -0,0 +1,127 @@
+"""Tests for the archive circuit breaker."""
+
+import asyncio
+
+import pytest
+
+from apds_pusher.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from apds_pusher.send_to_archive import AuthenticationError, FileUploadError
+
+
+class FakeClock:
+    """A clock which only moves when told to."""
+
+    def __init__(self) -> None:
+        """Start the clock at 0."""
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        """The current time."""
+        return self.now
+
+
+@pytest.fixture(name="clock")
+def clock_fixture():
+    """A clock for the breaker, starting at 0."""
+    return FakeClock()
+
+
+@pytest.fixture(name="breaker")
+def breaker_fixture(clock):
+    """A breaker opening after 3 failures, for 10 seconds at first and 25 at most."""
+    return CircuitBreaker(failure_threshold=3, reset_timeout=10.0, max_reset_timeout=25.0, clock=clock)
+
+
+def fail(exc):
+    """A function raising exc."""
+
+    def func():
+        raise exc
+
+    return func
+
+
+def test_opens_after_consecutive_failures(breaker):
+    """Test only consecutive connection errors and server errors open the breaker."""
+    for exc in (ConnectionError(), FileUploadError(status_code=503)):
+        with pytest.raises(type(exc)):
+            breaker.call(fail(exc))
+    # A refused token shows the archive is up
+    with pytest.raises(AuthenticationError):
+        breaker.call(fail(AuthenticationError()))
+    assert breaker.consecutive_failures == 0
+
+    for _ in range(3):
+        with pytest.raises(TimeoutError):
+            breaker.call(fail(TimeoutError()))
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "not called")
+    assert breaker.metrics() == {
+        "state": OPEN,
+        "consecutive_failures": 3,
+        "times_opened": 1,
+        "rejected_calls": 1,
+        "reset_timeout": 10.0,
+    }
+
+
+def test_half_open_probes_at_increasing_intervals(breaker, clock):
+    """Test a single probe is let through once the breaker has been open long enough."""
+    breaker.failure_threshold = 1
+    with pytest.raises(ConnectionError):
+        breaker.call(fail(ConnectionError()))
+
+    clock.now = 9.0
+    assert not breaker.is_available()
+    clock.now = 10.0
+    assert breaker.is_available()
+
+    breaker.check()
+    assert breaker.state == HALF_OPEN
+    # Only one call probes the archive at a time
+    assert not breaker.is_available()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+    breaker.record(ConnectionError())
+    assert breaker.state == OPEN
+    clock.now = 29.0
+    assert not breaker.is_available()
+    clock.now = 30.0
+    with pytest.raises(ConnectionError):
+        breaker.call(fail(ConnectionError()))
+    assert breaker.reset_timeout == 25.0
+
+    clock.now = 55.0
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CLOSED
+    assert breaker.reset_timeout == 10.0
+
+
+def test_async_calls_are_counted(breaker):
+    """Test coroutines called through the breaker count towards opening it."""
+
+    async def unavailable():
+        raise FileUploadError(status_code=500)
+
+    async def call_three_times():
+        for _ in range(3):
+            with pytest.raises(FileUploadError):
+                await breaker.call_async(unavailable)
+
+    asyncio.run(call_three_times())
+
+    assert breaker.state == OPEN
+
+
+def test_disabled_breaker_never_opens(breaker):
+    """Test a failure threshold of 0 lets every call through."""
+    breaker.failure_threshold = 0
+    for _ in range(5):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail(ConnectionError()))
+
+    assert breaker.state == CLOSED
+    assert breaker.call(lambda: "ok") == "ok"
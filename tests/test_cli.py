@@ -7,7 +7,7 @@ import pytest
 from click.testing import CliRunner
 
 from apds_pusher import config_parser
-from apds_pusher.__main__ import recovery
+from apds_pusher.__main__ import process_deployment, recovery
 from apds_pusher.utils.deployment_utils import load_configuration_file
 
 
@@ -83,6 +83,7 @@ def test_recovery_command(config_path_recovery, tmp_path, mocker):
         False,
         True,
         "Recovery",
+        register_only=False,
     )
 
 
@@ -93,3 +94,18 @@ def test_recovery_missing_args():
 
     assert result.exit_code != 0, result
     assert "Usage: recovery" in result.output  # More flexible assertion
+
+
+def test_pusher_is_closed_when_it_exits(config_path, tmp_path, mocker):
+    """Check the pusher's session and local state are closed when the pusher stops the program."""
+    mocker.patch("apds_pusher.__main__.SystemLogger")
+    mocker.patch("apds_pusher.__main__.get_current_version", return_value="1.0.0")
+    mocker.patch("apds_pusher.__main__.check_add_active_deployments", return_value=(True, tmp_path / "1234.txt"))
+    mocker.patch("apds_pusher.__main__.login", return_value=("token", "refresh"))
+    pusher = mocker.patch("apds_pusher.__main__.filepusher.FilePusher").return_value
+    pusher.run.side_effect = SystemExit
+
+    with pytest.raises(SystemExit):
+        process_deployment("1234", tmp_path, config_path, False, False, False, False, "NRT")
+
+    pusher.close.assert_called_once_with()
@@ -28,7 +28,22 @@ def test_dataclass_creation(config_dict):
     """Check that the dataclass is correctly populated when instantiated using the class method."""
     config = config_parser.Configuration.from_dict_validated(config_dict)
 
-    assert config_dict == asdict(config)
+    assert config_dict == {key: value for key, value in asdict(config).items() if key in config_dict}
+
+
+def test_optional_fields_use_defaults(config_dict):
+    """Check that optional fields can be omitted and fall back to their defaults."""
+    config = config_parser.Configuration.from_dict_validated(config_dict)
+
+    assert config.upload_workers == 1
+
+
+def test_optional_fields_can_be_set(config_dict):
+    """Check that optional fields given in the config are used."""
+    config_dict["upload_workers"] = 4
+    config = config_parser.Configuration.from_dict_validated(config_dict)
+
+    assert config.upload_workers == 4
 
 
 def test_additional_value_error(config_dict):
@@ -72,3 +87,16 @@ def test_bad_pathfields_raise_exception(config_dict, path_field, bad_path):
         config_dict = config_parser.Configuration.from_dict_validated(config_dict)
 
     assert exc.value.args[0] == f"{path_field} is an invalid path."
+
+
+def test_upload_deadline_scales_with_file_size(config_dict):
+    """Check uploads are given the read timeout plus time to send the file at the slowest expected speed."""
+    config_dict.update(http_connect_timeout=5.0, http_read_timeout=30.0, upload_min_throughput=1000)
+    config = config_parser.Configuration.from_dict_validated(config_dict)
+
+    assert config.http_timeout == (5.0, 30.0)
+    assert config.upload_deadline(0) == 30.0
+    assert config.upload_deadline(1_000_000) == 1030.0
+
+    config.upload_min_throughput = 0
+    assert config.upload_deadline(1_000_000) is None
@@ -0,0 +1,192 @@
+# pylint: disable=duplicate-code
+"""Tests for the multi-deployment daemon."""
+
+import logging
+from concurrent.futures import wait
+from pathlib import Path
+
+import pytest
+
+from apds_pusher.config_parser import Configuration
+from apds_pusher.daemon import DeploymentDaemon
+from apds_pusher.filepusher import FilePusher
+from apds_pusher.token_refresher import TokenManager
+from apds_pusher.utils.deployment_utils import (
+    DeploymentSettings,
+    check_add_active_deployments,
+    check_delete_active_deployments,
+    read_deployment_settings,
+    write_deployment_settings,
+)
+
+
+@pytest.fixture(name="config")
+def config_fixture(tmp_path):
+    """A configuration with an upload pool shared between deployments."""
+    save_location = tmp_path / "save"
+    save_location.mkdir()
+    log_location = tmp_path / "logs"
+    log_location.mkdir()
+
+    return Configuration(
+        client_id="an_id",
+        auth0_tenant="a_tenant",
+        auth2_audience="an audience",
+        client_secret="a secret",
+        bodc_archive_url="url",
+        file_formats=[".cac"],
+        archive_checker_frequency=1000,
+        save_file_location=save_location,
+        log_file_location=log_location,
+        upload_workers=8,
+    )
+
+
+def register(config: Configuration, deployment_id: str, data_directory: Path) -> Path:
+    """Register a deployment for the daemon, as 'start --register-only' does."""
+    data_directory.mkdir()
+    _, deployment_file = check_add_active_deployments(deployment_id, config)
+    write_deployment_settings(deployment_file, DeploymentSettings(data_directory, "NRT", False, False, False))
+    return deployment_file
+
+
+@pytest.fixture(name="daemon")
+def daemon_fixture(config, mocker):
+    """A daemon whose pushers record the cycles they are asked to run."""
+    mocker.patch("apds_pusher.filepusher.FilePusher.run_cycle", autospec=True)
+    instance = DeploymentDaemon(config, TokenManager("access", "refresh"), mocker.Mock(), logging.getLogger("test"))
+    yield instance
+    instance.close()
+
+
+def run_pass(daemon: DeploymentDaemon) -> None:
+    """Run one scheduling pass of the daemon and wait for the cycles it starts."""
+    daemon.run_once()
+    wait(daemon.running.values())
+
+
+def test_deployment_settings_round_trip(tmp_path):
+    """Test the settings a deployment is registered with can be read back."""
+    deployment_file = tmp_path / "123.txt"
+    settings = DeploymentSettings(tmp_path / "data", "Recovery", True, False, True)
+
+    write_deployment_settings(deployment_file, settings)
+
+    assert read_deployment_settings(deployment_file) == settings
+    assert read_deployment_settings(tmp_path / "456.txt") is None
+
+
+def test_stopping_removes_settings(config, tmp_path):
+    """Test stopping a registered deployment also removes its settings."""
+    deployment_file = register(config, "123", tmp_path / "data")
+
+    check_delete_active_deployments("123", config)
+
+    assert not deployment_file.exists()
+    assert not deployment_file.with_suffix(".json").exists()
+
+
+def test_daemon_runs_registered_deployments(config, daemon, tmp_path):
+    """Test one daemon runs cycles for each registered deployment, sharing its resources."""
+    register(config, "dep1", tmp_path / "data1")
+    register(config, "dep2", tmp_path / "data2")
+    # A deployment started without --register-only is left to its own process
+    check_add_active_deployments("dep3", config)
+
+    run_pass(daemon)
+
+    assert set(daemon.pushers) == {"dep1", "dep2"}
+    cycles_run = [(call.args[0].deployment_id, call.args[1]) for call in FilePusher.run_cycle.call_args_list]
+    assert sorted(cycles_run) == [("dep1", 1), ("dep2", 1)]
+    for pusher in daemon.pushers.values():
+        assert pusher.tokens is daemon.tokens
+        assert pusher.session is daemon.session
+        assert pusher.executor is daemon.upload_executor
+        assert pusher.breaker is daemon.breaker
+        assert pusher.limiter is daemon.limiter
+        assert pusher.max_in_flight == 4
+
+
+def test_daemon_waits_until_cycles_are_due(config, daemon, tmp_path):
+    """Test a deployment is not run again before its next cycle is due."""
+    register(config, "dep1", tmp_path / "data1")
+
+    run_pass(daemon)
+    run_pass(daemon)
+    pusher = daemon.pushers["dep1"]
+    assert pusher.run_cycle.call_count == 1
+
+    daemon.next_due["dep1"] = 0
+    run_pass(daemon)
+    pusher.run_cycle.assert_called_with(pusher, 2)
+
+
+def test_daemon_limits_concurrent_deployments(config, daemon, tmp_path):
+    """Test no more than daemon_max_concurrent_deployments cycles are started at once."""
+    config.daemon_max_concurrent_deployments = 1
+    register(config, "dep1", tmp_path / "data1")
+    register(config, "dep2", tmp_path / "data2")
+
+    daemon.run_once()
+
+    assert len(daemon.running) == 1
+
+
+def test_daemon_drops_stopped_deployments(config, daemon, tmp_path):
+    """Test a deployment is no longer run once it has been stopped."""
+    register(config, "dep1", tmp_path / "data1")
+    register(config, "dep2", tmp_path / "data2")
+    run_pass(daemon)
+
+    check_delete_active_deployments("dep1", config)
+    run_pass(daemon)
+
+    assert set(daemon.pushers) == {"dep2"}
+    assert daemon.pushers["dep2"].max_in_flight == 8
+
+
+def test_shared_tokens_are_refreshed_by_the_daemon(config, daemon, tmp_path, mocker):
+    """Test the shared tokens keep the daemon's refresher and logger once the first deployment is stopped."""
+    refreshed = mocker.patch("apds_pusher.daemon.get_access_token_from_refresh_token", return_value="new access")
+    register(config, "dep1", tmp_path / "data1")
+    run_pass(daemon)
+    check_delete_active_deployments("dep1", config)
+    register(config, "dep2", tmp_path / "data2")
+    run_pass(daemon)
+
+    assert daemon.tokens.refresher == daemon.request_access_token
+    assert daemon.tokens.logger is daemon.system_logger
+    assert daemon.tokens.refresh_margin == config.token_refresh_margin
+    assert daemon.tokens.refresh("access") == "new access"
+    refreshed.assert_called_once_with("refresh", config, daemon.session)
+
+
+def test_deployment_that_cannot_start_is_retried(config, daemon, tmp_path, mocker):
+    """Test a deployment whose pusher cannot be created does not stop the others, and is tried again."""
+    register(config, "dep1", tmp_path / "data1")
+    register(config, "dep2", tmp_path / "data2")
+    create_pusher = DeploymentDaemon.create_pusher
+    failures = []
+
+    def failing_once(self, deployment_id, *args):
+        if deployment_id == "dep1" and not failures:
+            failures.append(deployment_id)
+            raise OSError("state database is not writable")
+        return create_pusher(self, deployment_id, *args)
+
+    mocker.patch.object(DeploymentDaemon, "create_pusher", autospec=True, side_effect=failing_once)
+    run_pass(daemon)
+    assert set(daemon.pushers) == {"dep2"}
+
+    run_pass(daemon)
+    assert set(daemon.pushers) == {"dep1", "dep2"}
+
+
+def test_event_driven_uploads_are_reported_as_unused(config, mocker):
+    """Test the daemon warns that it does not watch for new files."""
+    config.event_driven_uploads = True
+    log = mocker.Mock()
+
+    DeploymentDaemon(config, TokenManager("access", "refresh"), mocker.Mock(), log).close()
+
+    log.warning.assert_called_once()
@@ -1,13 +1,24 @@
 # pylint: disable=duplicate-code
 """Tests for the system logger."""
 
+import base64
+import dataclasses
+import hashlib
+import json
 import logging
+import os
+import sys
+import time
 from pathlib import Path
 
 import pytest
 
 from apds_pusher.config_parser import Configuration
-from apds_pusher.filepusher import FilePusher
+from apds_pusher.filepusher import WATERMARK_OVERLAP, FilePusher
+from apds_pusher.multipart_stream import UploadDeadlineError
+from apds_pusher.scanner import scan_deployment
+from apds_pusher.send_to_archive import AuthenticationError, FileUploadError, HoldingsAccessError
+from apds_pusher.token_refresher import AccessCodeError
 
 
 @pytest.fixture(name="config")
@@ -29,6 +40,7 @@ def config_dict_fixture(tmp_path):
         archive_checker_frequency=1000,
         save_file_location=Path(save_location),
         log_file_location=Path(log_location),
+        retry_base_delay=0.0,
     )
 
 
@@ -67,3 +79,657 @@ def test_retrieve_glider_file_paths(tmp_path, config):
 
     # Check that the required files match the ones that were actually retrieved
     assert set(retrieved_files) == {tmp_path / "gliders/" / fname for fname in test_filenames}
+
+
+@pytest.fixture(name="populated_pusher")
+def populated_pusher_fixture(tmp_path, config, mocker):
+    """A FilePusher with a deployment directory containing glider files."""
+    glider_dir = tmp_path / "gliders/"
+    glider_dir.mkdir()
+    deployment_file = tmp_path / "file.txt"
+    deployment_file.write_text("1234.56")
+    for number in range(12):
+        (glider_dir / f"file{number}.cac").touch()
+
+    mocker.patch(
+        "apds_pusher.filepusher.HoldingsCache.refresh",
+        return_value={"file0.cac", "file1.cac"},
+    )
+    log = logging.getLogger("test")
+    return FilePusher("123", glider_dir, config, True, True, False, "token", "", deployment_file, log, "NRT")
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_send_files_to_api_with_workers(populated_pusher, mocker, workers):
+    """Check every new file is uploaded and logged once, whether or not the worker pool is used."""
+    populated_pusher.config.upload_workers = workers
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", return_value="Success")
+
+    populated_pusher.send_files_to_api(1)
+
+    assert mock_send.call_count == 10
+    sent = {call.args[0].name for call in mock_send.call_args_list}
+    assert sent == {f"file{number}.cac" for number in range(2, 12)}
+
+    log_contents = populated_pusher.file_logger.file_path.read_text()
+    assert all(f"file{number}.cac" in log_contents for number in range(2, 12))
+    assert float(Path(populated_pusher.deployment_file).read_text()) > 1234.56
+
+
+def test_uploads_are_recorded_in_the_ledger(populated_pusher, mocker):
+    """Check the ledger records the size, sha256, attempts and response of each file sent."""
+    mocker.patch("apds_pusher.filepusher.send_to_archive_api", return_value="Success")
+    log_info = mocker.spy(populated_pusher.system_logger, "info")
+
+    populated_pusher.send_files_to_api(1)
+
+    records = populated_pusher.file_logger.tail(100)
+    assert len(records) == 10
+    record = next(record for record in records if record["path"].endswith("file2.cac"))
+    file = Path(record["path"])
+    assert record["bytes"] == file.stat().st_size
+    assert record["sha256"] == hashlib.sha256(file.read_bytes()).hexdigest()
+    assert record["attempts"] == 1
+    assert record["response"] == "Success"
+    assert record["status"] == "uploaded"
+    assert record["latency"] >= 0
+    assert any(call.args[0].startswith("Sent %s files") and call.args[1] == 10 for call in log_info.call_args_list)
+
+
+def test_ledger_uses_the_sha256_computed_while_sending(populated_pusher, mocker):
+    """Check a file sent is not read again to record its sha256 when the upload computed it."""
+
+    def fake_send(file, *_, digests=None, **__):
+        digests[file] = f"sha256 of {file.name}"
+        return "Success"
+
+    mocker.patch("apds_pusher.filepusher.send_to_archive_api", side_effect=fake_send)
+    file_sha256 = mocker.patch("apds_pusher.filepusher.file_sha256")
+
+    populated_pusher.send_files_to_api(1)
+
+    file_sha256.assert_not_called()
+    records = populated_pusher.file_logger.tail(100)
+    assert {record["sha256"] for record in records} == {f"sha256 of file{number}.cac" for number in range(2, 12)}
+    assert populated_pusher.upload_state.get(populated_pusher.deployment_location / "file2.cac").sha256 == (
+        "sha256 of file2.cac"
+    )
+    assert not populated_pusher.digests
+
+
+def test_send_files_to_api_retries_failed_uploads(populated_pusher, mocker):
+    """Check a failing file is retried three times in a worker without stopping the others."""
+    populated_pusher.config.upload_workers = 4
+
+    def fake_send(file, *_, **__):
+        if file.name == "file5.cac":
+            raise FileUploadError
+        return "Success"
+
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", side_effect=fake_send)
+
+    populated_pusher.send_files_to_api(1)
+
+    assert mock_send.call_count == 9 + 3
+    statuses = {Path(record["path"]).name: record["status"] for record in populated_pusher.file_logger.tail(10)}
+    assert statuses.pop("file5.cac") == "failed"
+    assert set(statuses.values()) == {"uploaded"}
+
+
+def test_failed_uploads_back_off_and_stop_on_non_retryable_errors(populated_pusher, mocker):
+    """Check retries wait between attempts, and a rejected endpoint is not retried."""
+    populated_pusher.config.upload_workers = 1
+    sleep = mocker.patch("time.sleep")
+
+    def fake_send(file, *_, **__):
+        if file.name == "file5.cac":
+            raise FileUploadError(status_code=503)
+        if file.name == "file6.cac":
+            raise FileNotFoundError
+        return "Success"
+
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", side_effect=fake_send)
+    populated_pusher.retry_policy = dataclasses.replace(populated_pusher.retry_policy, sleep=sleep)
+
+    populated_pusher.send_files_to_api(1)
+
+    attempts = [call.args[0].name for call in mock_send.call_args_list]
+    assert attempts.count("file5.cac") == 3
+    assert attempts.count("file6.cac") == 1
+    assert sleep.call_count == 2
+
+
+def test_upload_past_its_deadline_is_left_for_a_later_cycle(populated_pusher, mocker):
+    """Check a file sent too slowly is not retried at once, nor counted as the archive failing."""
+    populated_pusher.config.upload_workers = 1
+    populated_pusher.breaker.failure_threshold = 1
+
+    def fake_send(file, *_, **__):
+        if file.name == "file5.cac":
+            raise UploadDeadlineError
+        return "Success"
+
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", side_effect=fake_send)
+    populated_pusher.send_files_to_api(1)
+
+    assert mock_send.call_count == 10
+    assert populated_pusher.breaker.metrics()["times_opened"] == 0
+    assert populated_pusher.upload_state.spooled_failures(populated_pusher.deployment_location / "file5.cac") == 1
+
+
+def test_rejected_uploads_are_retried(populated_pusher, mocker):
+    """Check an upload the archive answers with a status that is not raised, such as 400, is tried again."""
+    populated_pusher.config.upload_workers = 1
+    sleep = mocker.patch("time.sleep")
+    populated_pusher.retry_policy = dataclasses.replace(populated_pusher.retry_policy, sleep=sleep)
+    results = iter(["Fail", "Success"])
+
+    def fake_send(file, *_, **__):
+        return next(results) if file.name == "file5.cac" else "Success"
+
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", side_effect=fake_send)
+    populated_pusher.send_files_to_api(1)
+
+    assert [call.args[0].name for call in mock_send.call_args_list].count("file5.cac") == 2
+    assert sleep.call_count == 1
+    assert populated_pusher.upload_state.get(populated_pusher.deployment_location / "file5.cac").status == "uploaded"
+
+
+def test_failed_file_is_retried_by_later_cycles_until_dead_lettered(populated_pusher, mocker):
+    """Check a file failing every attempt is sent first by a cycle after its backoff, then dead-lettered."""
+    populated_pusher.config.upload_workers = 1
+    populated_pusher.requeue_policy = dataclasses.replace(populated_pusher.requeue_policy, max_attempts=2)
+    for file in populated_pusher.deployment_location.iterdir():
+        os.utime(file, (1000, 1000))
+
+    def fake_send(file, *_, **__):
+        if file.name == "file5.cac":
+            raise FileUploadError
+        return "Success"
+
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", side_effect=fake_send)
+    populated_pusher.send_files_to_api(1)
+    assert populated_pusher.upload_state.spooled_failures(populated_pusher.deployment_location / "file5.cac") == 1
+
+    mock_send.reset_mock()
+    populated_pusher.send_files_to_api(2)
+    assert not mock_send.called
+
+    (populated_pusher.deployment_location / "file11.cac").write_text("new data")
+    mocker.patch("time.time", return_value=time.time() + 400)
+    populated_pusher.send_files_to_api(3)
+
+    assert [call.args[0].name for call in mock_send.call_args_list] == ["file5.cac"] * 3 + ["file11.cac"]
+    (dead_letter,) = populated_pusher.upload_state.dead_letters()
+    assert dead_letter.path == str(populated_pusher.deployment_location / "file5.cac")
+    assert not populated_pusher.upload_state.pending()
+
+
+def test_holdings_call_is_retried(populated_pusher, mocker):
+    """Check a transient failure to fetch the holdings is retried."""
+    populated_pusher.holdings_cache.refresh.side_effect = [HoldingsAccessError(status_code=502), {"file0.cac"}]
+
+    assert populated_pusher.get_existing_glider_files_for_deployment() == {"file0.cac"}
+
+
+def test_concurrent_auth_failures_refresh_token_once(populated_pusher, mocker):
+    """Check workers rejected with the same expired token only trigger a single refresh."""
+    populated_pusher.config.upload_workers = 4
+    mock_refresh = mocker.patch("apds_pusher.filepusher.get_access_token_from_refresh_token", return_value="new-token")
+
+    def fake_send(_file, _deployment_id, access_token, *_, **__):
+        if access_token != "new-token":
+            raise AuthenticationError
+        return "Success"
+
+    mocker.patch("apds_pusher.filepusher.send_to_archive_api", side_effect=fake_send)
+
+    populated_pusher.send_files_to_api(1)
+
+    assert mock_refresh.call_count == 1
+    assert populated_pusher.access_token == "new-token"
+
+
+def test_expiring_token_is_refreshed_before_upload(populated_pusher, mocker):
+    """Check a token about to expire is refreshed once, before any file is sent with it."""
+    populated_pusher.config.upload_workers = 4
+    claims = {"iat": time.time() - 3600, "exp": time.time() + 10}
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip("=")
+    populated_pusher.access_token = f"header.{payload}.signature"
+    mock_refresh = mocker.patch("apds_pusher.filepusher.get_access_token_from_refresh_token", return_value="new-token")
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", return_value="Success")
+
+    populated_pusher.send_files_to_api(1)
+
+    assert mock_refresh.call_count == 1
+    assert {call.args[2] for call in mock_send.call_args_list} == {"new-token"}
+
+
+def test_failed_token_refresh_is_retried_like_other_failures(populated_pusher, mocker):
+    """Check a token that could not be refreshed fails the attempt, not the cycle, and the file is recorded."""
+    populated_pusher.config.upload_workers = 1
+    sleep = mocker.patch("time.sleep")
+    populated_pusher.retry_policy = dataclasses.replace(populated_pusher.retry_policy, sleep=sleep)
+    claims = {"iat": time.time() - 3600, "exp": time.time() + 10}
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip("=")
+    populated_pusher.access_token = f"header.{payload}.signature"
+    mocker.patch(
+        "apds_pusher.filepusher.get_access_token_from_refresh_token",
+        side_effect=[AccessCodeError("auth provider unavailable"), "new-token"],
+    )
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", return_value="Success")
+
+    populated_pusher.send_files_to_api(1)
+
+    assert mock_send.call_count == 10
+    assert {call.args[2] for call in mock_send.call_args_list} == {"new-token"}
+    assert sleep.call_count == 1
+
+    mocker.patch("apds_pusher.filepusher.get_access_token_from_refresh_token", side_effect=AccessCodeError)
+    populated_pusher.access_token = f"header.{payload}.signature"
+    new_file = populated_pusher.deployment_location / "file12.cac"
+    new_file.write_text("new data")
+    populated_pusher.send_files_to_api(2)
+
+    assert populated_pusher.upload_state.get(new_file).status == "failed"
+    assert populated_pusher.upload_state.spooled_failures(new_file) == 1
+
+
+def test_failed_token_refresh_for_preflight_ends_the_cycle(populated_pusher, mocker):
+    """Check a token that could not be refreshed for the preflight probe ends the cycle without an error."""
+    populated_pusher.config.preflight_probe = True
+    mocker.patch.object(populated_pusher.tokens, "is_expiring", return_value=True)
+    mocker.patch("apds_pusher.filepusher.get_access_token_from_refresh_token", side_effect=AccessCodeError)
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", return_value="Success")
+
+    populated_pusher.run_cycle(1)
+
+    mock_send.assert_not_called()
+    assert Path(populated_pusher.deployment_file).read_text() == "1234.56"
+
+
+def test_preflight_refreshes_refused_token_before_sending(populated_pusher, mocker):
+    """Check a token refused by the preflight probe is refreshed before any file is sent."""
+    populated_pusher.config.preflight_probe = True
+    mock_probe = mocker.patch("apds_pusher.filepusher.probe_archive", side_effect=[AuthenticationError, None])
+    mock_refresh = mocker.patch("apds_pusher.filepusher.get_access_token_from_refresh_token", return_value="new-token")
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", return_value="Success")
+
+    populated_pusher.send_files_to_api(1)
+
+    assert mock_probe.call_count == 2
+    assert mock_refresh.call_count == 1
+    assert {call.args[2] for call in mock_send.call_args_list} == {"new-token"}
+
+
+@pytest.mark.parametrize("error", [FileNotFoundError, AuthenticationError])
+def test_failed_preflight_sends_no_files(populated_pusher, mocker, error):
+    """Check no file is sent, and the cycle ends, when the preflight probe is refused."""
+    populated_pusher.config.preflight_probe = True
+    mocker.patch("apds_pusher.filepusher.probe_archive", side_effect=error)
+    mocker.patch("apds_pusher.filepusher.get_access_token_from_refresh_token", return_value="new token")
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", return_value="Success")
+
+    populated_pusher.run_cycle(1)
+
+    mock_send.assert_not_called()
+    assert Path(populated_pusher.deployment_file).read_text() == "1234.56"
+
+
+def test_failed_preflight_waits_for_the_next_cycle(populated_pusher, mocker, tmp_path, monkeypatch):
+    """Check a refused preflight probe is not retried straight away by the run loop."""
+    monkeypatch.chdir(tmp_path)
+    populated_pusher.config.preflight_probe = True
+    probe = mocker.patch("apds_pusher.filepusher.probe_archive", side_effect=FileNotFoundError)
+    mocker.patch.object(populated_pusher, "check_deployment_not_stopped", return_value=True)
+    mocker.patch.object(populated_pusher.tokens, "start_background_refresh")
+    wait_for_next_cycle = mocker.patch.object(populated_pusher, "wait_for_next_cycle", side_effect=SystemExit)
+
+    with pytest.raises(SystemExit):
+        populated_pusher.run()
+
+    assert probe.call_count == 1
+    wait_for_next_cycle.assert_called_once()
+    assert not list(tmp_path.glob("Error_cycle_*.txt"))
+
+
+def test_unavailable_archive_skips_the_rest_of_the_cycle(populated_pusher, mocker):
+    """Check uploads stop once the circuit breaker opens, and following cycles are skipped."""
+    populated_pusher.config.upload_workers = 1
+    populated_pusher.breaker.failure_threshold = 3
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", side_effect=ConnectionError)
+
+    populated_pusher.run_cycle(2)
+
+    # The first file's three attempts open the breaker, and no other file is tried
+    assert mock_send.call_count == 3
+    assert populated_pusher.breaker.state == "open"
+    # The skipped files are found again by the next cycle's scan
+    assert Path(populated_pusher.deployment_file).read_text() == "1234.56"
+
+    populated_pusher.run_cycle(3)
+
+    assert mock_send.call_count == 3
+    assert populated_pusher.holdings_cache.refresh.call_count == 1
+
+
+def test_files_are_sent_in_priority_order(populated_pusher, mocker):
+    """Check a cycle's uploads are started with the most wanted files first."""
+    populated_pusher.config.upload_workers = 1
+    populated_pusher.config.upload_priority = ("smallest", "newest")
+    for number in range(2, 12):
+        file = populated_pusher.deployment_location / f"file{number}.cac"
+        file.write_bytes(b"x" * (number % 3))
+        os.utime(file, (number, number))
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", return_value="Success")
+
+    populated_pusher.send_files_to_api(1)
+
+    sent = [call.args[0].name for call in mock_send.call_args_list]
+    assert sent == [f"file{number}.cac" for number in (9, 6, 3, 10, 7, 4, 11, 8, 5, 2)]
+
+
+def test_retried_files_are_sent_before_priority_order(populated_pusher, mocker):
+    """Check a file retried from an earlier cycle is sent first, however low its priority."""
+    populated_pusher.config.upload_workers = 1
+    populated_pusher.config.upload_priority = ("smallest",)
+    populated_pusher.requeue_policy = dataclasses.replace(populated_pusher.requeue_policy, base_delay=0.0)
+    big_file = populated_pusher.deployment_location / "file5.cac"
+    big_file.write_bytes(b"x" * 1000)
+
+    def fail_big_file(file, *_, **__):
+        if file == big_file:
+            raise FileUploadError
+        return "Success"
+
+    mocker.patch("apds_pusher.filepusher.send_to_archive_api", side_effect=fail_big_file)
+    populated_pusher.send_files_to_api(1)
+    for number in range(20, 23):
+        (populated_pusher.deployment_location / f"file{number}.cac").touch()
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", return_value="Success")
+
+    populated_pusher.send_files_to_api(2)
+
+    sent = [call.args[0].name for call in mock_send.call_args_list]
+    assert sent[0] == "file5.cac"
+    assert sorted(sent[1:]) == ["file20.cac", "file21.cac", "file22.cac"]
+
+
+def test_already_sent_files_are_skipped(populated_pusher, mocker):
+    """Check files recorded as sent, and unchanged, are not uploaded again on a later cycle."""
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", return_value="Success")
+    populated_pusher.send_files_to_api(1)
+    assert mock_send.call_count == 10
+
+    mock_send.reset_mock()
+    (populated_pusher.deployment_location / "file3.cac").write_text("changed")
+    populated_pusher.send_files_to_api(1)
+
+    assert [call.args[0].name for call in mock_send.call_args_list] == ["file3.cac"]
+    assert populated_pusher.upload_state.get(populated_pusher.deployment_location / "file0.cac").status == "held"
+
+
+def test_unsent_files_stay_spooled_after_a_crash(populated_pusher, mocker, config):
+    """Check files not confirmed before the pusher stops are sent on restart, without a full rescan."""
+    populated_pusher.config.upload_workers = 1
+    for file in populated_pusher.deployment_location.iterdir():
+        os.utime(file, (1000, 1000))
+
+    def crash_after_three(file, *_, **__):
+        if mock_send.call_count > 3:
+            raise KeyboardInterrupt
+        return "Success"
+
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", side_effect=crash_after_three)
+    with pytest.raises(KeyboardInterrupt):
+        populated_pusher.send_files_to_api(1)
+    populated_pusher.upload_state.close()
+    assert Path(populated_pusher.deployment_file).read_text() == "1234.56"
+
+    restarted = FilePusher(
+        "123",
+        populated_pusher.deployment_location,
+        config,
+        True,
+        True,
+        False,
+        "token",
+        "",
+        populated_pusher.deployment_file,
+        logging.getLogger("test"),
+        "NRT",
+    )
+    assert len(restarted.upload_state.pending()) == 12 - 3
+    last_scan = restarted.upload_state.get_marker(restarted.scan_marker)
+    scan = mocker.patch("apds_pusher.filepusher.scan_deployment", wraps=scan_deployment)
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", return_value="Success")
+    restarted.send_files_to_api(1)
+
+    assert scan.call_args.args[3] == last_scan - WATERMARK_OVERLAP
+    assert mock_send.call_count == 7
+    assert not restarted.upload_state.pending()
+
+
+def test_files_written_while_stopped_are_sent_after_a_crash(populated_pusher, mocker, config):
+    """Check a restart resumes from when the spooled scan started, not the time the start command wrote."""
+    populated_pusher.config.upload_workers = 1
+    for file in populated_pusher.deployment_location.iterdir():
+        os.utime(file, (1000, 1000))
+    scan_called_at = []
+
+    def timed_scan(*args):
+        scan_called_at.append(time.time())
+        yield from scan_deployment(*args)
+
+    def crash_after_three(*_, **__):
+        if mock_send.call_count > 3:
+            raise KeyboardInterrupt
+        return "Success"
+
+    mocker.patch("apds_pusher.filepusher.scan_deployment", side_effect=timed_scan)
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", side_effect=crash_after_three)
+    with pytest.raises(KeyboardInterrupt):
+        populated_pusher.send_files_to_api(1)
+    last_scan = populated_pusher.upload_state.get_marker(populated_pusher.scan_marker)
+    assert last_scan <= scan_called_at[0]
+    written_while_stopped = populated_pusher.deployment_location / "stopped.cac"
+    written_while_stopped.write_text("written while the pusher was stopped")
+    os.utime(written_while_stopped, (last_scan + 1, last_scan + 1))
+
+    restarted = restart_pusher(populated_pusher, config)
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", return_value="Success")
+    restarted.send_files_to_api(1)
+
+    assert "stopped.cac" in {call.args[0].name for call in mock_send.call_args_list}
+    assert mock_send.call_count == 12 - 2 - 3 + 1
+    assert not restarted.upload_state.pending()
+    restarted.close()
+
+
+def restart_pusher(pusher, config):
+    """Close a pusher and start a new one for its deployment, as the start command does."""
+    pusher.close()
+    Path(pusher.deployment_file).write_text(str(time.time()))
+    return FilePusher(
+        "123",
+        pusher.deployment_location,
+        config,
+        True,
+        True,
+        False,
+        "token",
+        "",
+        pusher.deployment_file,
+        logging.getLogger("test"),
+        "NRT",
+    )
+
+
+def test_warm_restart_scans_only_files_modified_since_the_last_scan(populated_pusher, mocker, config):
+    """Check a restart resumes from the last scan, finding files written while the pusher was stopped."""
+    populated_pusher.config.upload_workers = 1
+    mocker.patch("apds_pusher.filepusher.send_to_archive_api", return_value="Success")
+    populated_pusher.send_files_to_api(1)
+    last_scan = populated_pusher.upload_state.get_marker(populated_pusher.scan_marker)
+    written_while_stopped = populated_pusher.deployment_location / "stopped.cac"
+    written_while_stopped.write_text("written while the pusher was stopped")
+    os.utime(written_while_stopped, (last_scan + 1, last_scan + 1))
+
+    restarted = restart_pusher(populated_pusher, config)
+    scan = mocker.patch("apds_pusher.filepusher.scan_deployment", wraps=scan_deployment)
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", return_value="Success")
+    restarted.send_files_to_api(1)
+
+    assert scan.call_args.args[3] == last_scan - WATERMARK_OVERLAP
+    assert [call.args[0].name for call in mock_send.call_args_list] == ["stopped.cac"]
+    restarted.close()
+
+
+@pytest.mark.parametrize("change", [{"warm_restart": False}, {"file_formats": [".cac", ".sbd"]}])
+def test_restart_scans_everything_without_a_matching_scan(populated_pusher, mocker, config, change):
+    """Check the whole deployment is scanned when warm restarts are turned off, or the scan settings have changed."""
+    mocker.patch("apds_pusher.filepusher.send_to_archive_api", return_value="Success")
+    populated_pusher.send_files_to_api(1)
+
+    restarted = restart_pusher(populated_pusher, dataclasses.replace(config, **change))
+    scan = mocker.patch("apds_pusher.filepusher.scan_deployment", wraps=scan_deployment)
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", return_value="Success")
+    restarted.send_files_to_api(1)
+
+    assert scan.call_args.args[3] is None
+    assert mock_send.call_count == 0
+    restarted.close()
+
+
+def test_uploads_start_before_the_scan_finishes(populated_pusher, mocker):
+    """Check files are spooled and sent batch by batch as the scan finds them."""
+    populated_pusher.config.upload_workers = 1
+    mocker.patch("apds_pusher.filepusher.SPOOL_BATCH_SIZE", 2)
+    events = []
+
+    def recording_scan(*args):
+        for scanned in scan_deployment(*args):
+            events.append("found")
+            yield scanned
+
+    def recording_send(*_, **__):
+        events.append("sent")
+        return "Success"
+
+    mocker.patch("apds_pusher.filepusher.scan_deployment", side_effect=recording_scan)
+    mocker.patch("apds_pusher.filepusher.send_to_archive_api", side_effect=recording_send)
+    populated_pusher.send_files_to_api(1)
+
+    assert events.count("found") == 12
+    assert events.count("sent") == 10
+    assert events.index("sent") < 3
+    assert not populated_pusher.upload_state.pending()
+
+
+def test_file_written_during_a_cycle_is_sent_by_the_next(populated_pusher, mocker):
+    """Check the watermark is taken when the scan starts, so files written while uploading are not missed."""
+    populated_pusher.config.upload_workers = 1
+    late_file = populated_pusher.deployment_location / "late.cac"
+
+    def write_late_file(file, *_, **__):
+        if not late_file.exists():
+            late_file.write_text("written during the cycle")
+        return "Success"
+
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", side_effect=write_late_file)
+    populated_pusher.send_files_to_api(1)
+    assert "late.cac" not in {call.args[0].name for call in mock_send.call_args_list}
+
+    mock_send.reset_mock()
+    populated_pusher.send_files_to_api(2)
+    assert [call.args[0].name for call in mock_send.call_args_list] == ["late.cac"]
+
+
+def test_file_modified_while_it_was_sent_is_sent_again(populated_pusher, mocker):
+    """Check a file is recorded as it was scanned, so changes made during its upload are sent by the next cycle."""
+    populated_pusher.config.upload_workers = 1
+    growing_file = populated_pusher.deployment_location / "file3.cac"
+    appended = []
+
+    def append_while_sending(file, *_, **__):
+        if file == growing_file and not appended:
+            with open(file, "a", encoding="utf-8") as open_file:
+                open_file.write("more data")
+            appended.append(file)
+        return "Success"
+
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", side_effect=append_while_sending)
+    populated_pusher.send_files_to_api(1)
+    mock_send.reset_mock()
+    populated_pusher.send_files_to_api(2)
+
+    assert [call.args[0].name for call in mock_send.call_args_list] == ["file3.cac"]
+
+
+def test_file_removed_after_it_was_sent_does_not_stop_the_cycle(populated_pusher, mocker):
+    """Check a file removed before it could be recorded is taken off the spool and the other files are sent."""
+    populated_pusher.config.upload_workers = 2
+
+    def remove_after_sending(file, *_, **__):
+        if file.name == "file3.cac":
+            file.unlink()
+        return "Success"
+
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", side_effect=remove_after_sending)
+    populated_pusher.send_files_to_api(1)
+
+    assert mock_send.call_count == 10
+    assert not populated_pusher.upload_state.pending()
+
+
+def test_files_still_being_written_are_held_back(populated_pusher, mocker):
+    """Check recently modified files stay spooled until they have settled."""
+    populated_pusher.config.file_quiescence_period = 60
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", return_value="Success")
+
+    populated_pusher.send_files_to_api(1)
+    assert not mock_send.called
+    assert len(populated_pusher.upload_state.pending()) == 10
+
+    for file in populated_pusher.deployment_location.iterdir():
+        os.utime(file, (time.time() - 120, time.time() - 120))
+    populated_pusher.send_files_to_api(2)
+    assert mock_send.call_count == 10
+    assert not populated_pusher.upload_state.pending()
+
+
+def test_retrieve_glider_file_paths_filters_after_first_cycle(tmp_path, config):
+    """Tests that files modified before the last push are not retrieved after the first cycle."""
+    glider_dir = tmp_path / "gliders/"
+    (glider_dir / "sub").mkdir(parents=True)
+
+    deployment_file = tmp_path / "file.txt"
+    deployment_file.write_text("2000")
+
+    for filename, mtime in [("old.cac", 1000), ("new.sbd", 3000), ("sub/new.tbd", 3000), ("new.csv", 3000)]:
+        (glider_dir / filename).touch()
+        os.utime(glider_dir / filename, (mtime, mtime))
+
+    log = logging.getLogger("test")
+    instance = FilePusher("123", glider_dir, config, True, True, True, "", "", deployment_file, log, "NRT")
+
+    assert set(instance.retrieve_file_paths(2)) == {glider_dir / "new.sbd", glider_dir / "sub/new.tbd"}
+    assert len(instance.retrieve_file_paths(1)) == 3
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is only available on Linux")
+def test_watched_files_are_sent_between_scans(populated_pusher, mocker):
+    """Check files reported by the watcher are sent before the next periodic scan is due."""
+    populated_pusher.config.event_driven_uploads = True
+    populated_pusher.config.archive_checker_frequency = 0.01
+    mocker.patch("apds_pusher.inotify_watcher.EVENT_BATCH_SECONDS", 0.05)
+    mock_send = mocker.patch("apds_pusher.filepusher.send_to_archive_api", return_value="Success")
+    mocker.patch.object(populated_pusher, "check_deployment_not_stopped", return_value=True)
+    populated_pusher.start_watcher()
+
+    (populated_pusher.deployment_location / "new.cac").write_text("new file")
+    populated_pusher.wait_for_next_cycle()
+    populated_pusher.watcher.close()
+
+    assert [call.args[0].name for call in mock_send.call_args_list] == ["new.cac"]
+    assert populated_pusher.upload_state.is_uploaded(populated_pusher.deployment_location / "new.cac")
@@ -0,0 +1,118 @@
+"""Tests for the local holdings cache."""
+
+import logging
+
+import pytest
+import responses
+
+from apds_pusher.holdings_cache import HoldingsCache
+
+ARCHIVE_URL = "https://submit-data.bodc.ac.uk/apds-archive-beta/"
+HOLDINGS_URL = ARCHIVE_URL + "holdings/441"
+
+
+def _holdings(*names, count=None):
+    return {"files": {".cac_Count": len(names) if count is None else count, ".cac_files": [{"name": n} for n in names]}}
+
+
+@pytest.fixture(name="save_location")
+def save_location_fixture(tmp_path):
+    """A save file location for the cache."""
+    save_location = tmp_path / "save"
+    save_location.mkdir()
+    return save_location
+
+
+def test_unchanged_holdings_are_not_downloaded_again(save_location, tmp_path, archive_server):
+    """Check a conditional refresh keeps the cached list when the holdings have not changed."""
+    archive_server.holdings["441"].update({"a.cac", "b.cac"})
+    cache = HoldingsCache(save_location, tmp_path, "441", 10)
+    log = logging.getLogger("test")
+
+    assert cache.refresh(archive_server.url, None, log) == {"a.cac", "b.cac"}
+    assert cache.etag
+
+    # The pusher sends a file, which the archive now holds too
+    cache.add("c.cac")
+    archive_server.holdings["441"].add("c.cac")
+    assert cache.refresh(archive_server.url, None, log) == {"a.cac", "b.cac", "c.cac"}
+
+    # Another client sends a file, the changed holdings are downloaded
+    archive_server.holdings["441"].add("d.cac")
+    assert cache.refresh(archive_server.url, None, log) == {"a.cac", "b.cac", "c.cac", "d.cac"}
+
+
+@responses.activate
+def test_not_modified_response_uses_cache(save_location, tmp_path):
+    """Check a 304 response leaves the cache, including files added locally, as it was."""
+    responses.add(responses.GET, HOLDINGS_URL, json=_holdings("a.cac"), headers={"ETag": '"v1"'})
+    responses.add(responses.GET, HOLDINGS_URL, status=304)
+    cache = HoldingsCache(save_location, tmp_path, "441", 10)
+    log = logging.getLogger("test")
+
+    cache.refresh(ARCHIVE_URL, None, log)
+    cache.add("b.cac")
+
+    assert cache.refresh(ARCHIVE_URL, None, log) == {"a.cac", "b.cac"}
+    assert responses.calls[1].request.headers["If-None-Match"] == '"v1"'
+
+
+@responses.activate
+def test_cache_survives_restart(save_location, tmp_path):
+    """Check the cache is loaded from disk by a new instance."""
+    responses.add(responses.GET, HOLDINGS_URL, json=_holdings("a.cac"), headers={"ETag": '"v1"'})
+    cache = HoldingsCache(save_location, tmp_path, "441", 10)
+    cache.refresh(ARCHIVE_URL, None, logging.getLogger("test"))
+    cache.add("b.cac")
+    cache.save()
+
+    reloaded = HoldingsCache(save_location, tmp_path, "441", 10)
+    assert reloaded.filenames == {"a.cac", "b.cac"}
+    assert reloaded.etag == '"v1"'
+
+
+@responses.activate
+def test_full_refresh_every_n_cycles(save_location, tmp_path):
+    """Check the whole list is fetched again, without an ETag, every N refreshes."""
+    responses.add(responses.GET, HOLDINGS_URL, json=_holdings("a.cac"), headers={"ETag": '"v1"'})
+    cache = HoldingsCache(save_location, tmp_path, "441", 3)
+    for _ in range(4):
+        cache.refresh(ARCHIVE_URL, None, logging.getLogger("test"))
+
+    conditional = ["If-None-Match" in call.request.headers for call in responses.calls]
+    assert conditional == [False, True, True, False]
+
+
+@responses.activate
+def test_incremental_refresh_merges_new_files(save_location, tmp_path):
+    """Check only files added since the last refresh are requested when a since parameter is set."""
+    responses.add(responses.GET, HOLDINGS_URL, json=_holdings("a.cac", "b.cac"))
+    responses.add(responses.GET, HOLDINGS_URL, json=_holdings("c.cac", count=3))
+    cache = HoldingsCache(save_location, tmp_path, "441", 10, since_parameter="since")
+
+    cache.refresh(ARCHIVE_URL, None, logging.getLogger("test"))
+    assert cache.refresh(ARCHIVE_URL, None, logging.getLogger("test")) == {"a.cac", "b.cac", "c.cac"}
+    assert "since=" in responses.calls[1].request.url
+
+
+@responses.activate
+def test_inconsistent_incremental_refresh_fetches_everything(save_location, tmp_path):
+    """Check a full fetch is made when the archive reports more files than the cache holds."""
+    responses.add(responses.GET, HOLDINGS_URL, json=_holdings("a.cac"))
+    responses.add(responses.GET, HOLDINGS_URL, json=_holdings("c.cac", count=4))
+    responses.add(responses.GET, HOLDINGS_URL, json=_holdings("a.cac", "b.cac", "c.cac", "d.cac"))
+    cache = HoldingsCache(save_location, tmp_path, "441", 10, since_parameter="since")
+
+    cache.refresh(ARCHIVE_URL, None, logging.getLogger("test"))
+    filenames = cache.refresh(ARCHIVE_URL, None, logging.getLogger("test"))
+
+    assert filenames == {"a.cac", "b.cac", "c.cac", "d.cac"}
+    assert len(responses.calls) == 3
+    assert "since=" not in responses.calls[2].request.url
+
+
+def test_corrupt_cache_is_ignored(save_location, tmp_path):
+    """Check an unreadable cache file results in a full fetch."""
+    (save_location / "deployment-441-holdings.json").write_text("{not json")
+
+    assert HoldingsCache(save_location, tmp_path, "441", 10).filenames is None
@@ -0,0 +1,64 @@
+# pylint: disable=duplicate-code
+"""Tests for the shared HTTP session."""
+
+import pytest
+import responses
+
+from apds_pusher import config_parser
+from apds_pusher.http_session import create_session
+from apds_pusher.send_to_archive import call_holdings_endpoint
+from apds_pusher.token_refresher import get_access_token_from_refresh_token
+
+
+@pytest.fixture(name="pusher_config")
+def fixture_pusher_config():
+    """Creating instance of config class."""
+    return config_parser.Configuration(
+        client_id="a_clientid",
+        client_secret="A secret",
+        auth2_audience="an audience",
+        auth0_tenant="a_tenant.com",
+        bodc_archive_url="https://submit-data.bodc.ac.uk/apds-archive-beta/",
+        file_formats=[".dat"],
+        archive_checker_frequency=100,
+        save_file_location="a_path",
+        log_file_location="a_path",
+        http_pool_connections=3,
+        http_max_connections_per_host=7,
+    )
+
+
+def test_session_pools_sized_from_config(pusher_config):
+    """Check the mounted adapters use the pool sizes from the configuration."""
+    session = create_session(pusher_config)
+
+    for prefix in ("https://", "http://"):
+        adapter = session.get_adapter(prefix + "example.com")
+        assert adapter._pool_connections == 3  # pylint: disable=protected-access
+        assert adapter._pool_maxsize == 7  # pylint: disable=protected-access
+        assert adapter._pool_block  # pylint: disable=protected-access
+    assert session.headers["Connection"] == "keep-alive"
+
+
+@responses.activate
+def test_calls_are_made_through_the_given_session(pusher_config, mocker):
+    """Check the holdings and token calls use the shared session rather than new connections."""
+    responses.add(
+        responses.GET,
+        "https://submit-data.bodc.ac.uk/apds-archive-beta/holdings/441",
+        json={"files": {}},
+    )
+    responses.add(
+        responses.POST,
+        "https://a_tenant.com/oauth/token",
+        json={"access_token": "New_access_token"},
+    )
+    session = create_session(pusher_config)
+    spy_get = mocker.spy(session, "get")
+    spy_post = mocker.spy(session, "post")
+
+    call_holdings_endpoint(pusher_config.bodc_archive_url, "441", session)
+    get_access_token_from_refresh_token("a_refresh_token", pusher_config, session)
+
+    assert spy_get.call_count == 1
+    assert spy_post.call_count == 1
@@ -0,0 +1,59 @@
+"""Tests for the inotify file watcher."""
+
+import os
+import sys
+
+import pytest
+
+from apds_pusher.inotify_watcher import InotifyWatcher
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is only available on Linux")
+
+
+@pytest.fixture(name="deployment_dir")
+def deployment_dir_fixture(tmp_path):
+    """An empty deployment directory."""
+    deployment_dir = tmp_path / "gliders"
+    deployment_dir.mkdir()
+    return deployment_dir
+
+
+@pytest.fixture(name="watcher")
+def watcher_fixture(deployment_dir, monkeypatch):
+    """A recursive watcher for .sbd and .tbd files."""
+    monkeypatch.setattr("apds_pusher.inotify_watcher.EVENT_BATCH_SECONDS", 0.05)
+    watcher = InotifyWatcher(deployment_dir, [".sbd", ".tbd"], True)
+    yield watcher
+    watcher.close()
+
+
+def test_written_file_is_reported(deployment_dir, watcher):
+    """Check a matching file is reported once it has been written and closed."""
+    (deployment_dir / "file1.sbd").write_bytes(b"data")
+    (deployment_dir / "notes.txt").write_bytes(b"data")
+
+    assert watcher.wait(5) == [deployment_dir / "file1.sbd"]
+
+
+def test_moved_in_file_is_reported(deployment_dir, watcher, tmp_path):
+    """Check a file renamed into the directory is reported."""
+    staged = tmp_path / "file2.tbd"
+    staged.write_bytes(b"data")
+    os.rename(staged, deployment_dir / "file2.tbd")
+
+    assert watcher.wait(5) == [deployment_dir / "file2.tbd"]
+
+
+def test_new_sub_directory_is_watched(deployment_dir, watcher):
+    """Check files in sub-directories created after the watcher started are reported."""
+    sub_directory = deployment_dir / "new"
+    sub_directory.mkdir()
+    assert watcher.wait(0.2) == []
+
+    (sub_directory / "file3.sbd").write_bytes(b"data")
+    assert watcher.wait(5) == [sub_directory / "file3.sbd"]
+
+
+def test_timeout_without_files(watcher):
+    """Check waiting returns nothing once the timeout passes."""
+    assert watcher.wait(0.1) == []
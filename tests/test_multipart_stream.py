@@ -0,0 +1,78 @@
+"""Tests for the streamed multipart upload body."""
+
+import hashlib
+import os
+import time
+
+import pytest
+from urllib3.filepost import encode_multipart_formdata
+
+from apds_pusher.multipart_stream import MultipartFileStream, UploadDeadlineError
+
+
+@pytest.fixture(name="glider_file")
+def glider_file_fixture(tmp_path):
+    """A file with random binary content to be uploaded."""
+    glider_file = tmp_path / "a file.sbd"
+    glider_file.write_bytes(os.urandom(100_000))
+    return glider_file
+
+
+def test_body_matches_in_memory_encoding(glider_file):
+    """Check the streamed body is byte for byte what requests would have built in memory."""
+    stream = MultipartFileStream(glider_file, chunk_size=4096, boundary="abc123")
+    expected_body, expected_content_type = encode_multipart_formdata(
+        [("data", (glider_file.name, glider_file.read_bytes(), "multipart/form-data"))], boundary="abc123"
+    )
+
+    assert b"".join(stream) == expected_body
+    assert len(stream) == len(expected_body)
+    assert stream.content_type == expected_content_type
+
+
+def test_file_is_read_in_bounded_chunks(glider_file):
+    """Check no part of the body yielded is larger than the chunk size."""
+    stream = MultipartFileStream(glider_file, chunk_size=4096)
+    chunks = list(stream)
+
+    assert max(len(chunk) for chunk in chunks[1:-1]) <= 4096
+    assert len(chunks) == 2 + 25
+
+
+def test_body_can_be_sent_again(glider_file):
+    """Check a retried request re-reads the file from the start."""
+    stream = MultipartFileStream(glider_file)
+
+    assert b"".join(stream) == b"".join(stream)
+
+
+def test_sha256_is_computed_as_the_file_is_read(glider_file):
+    """Check the file's sha256 is known once the body has been read, and not before."""
+    stream = MultipartFileStream(glider_file, chunk_size=4096)
+    assert stream.sha256 is None
+
+    b"".join(stream)
+
+    assert stream.sha256 == hashlib.sha256(glider_file.read_bytes()).hexdigest()
+
+
+def test_truncated_file_raises(glider_file):
+    """Check a file shrinking mid-send is not passed off as a complete upload."""
+    stream = MultipartFileStream(glider_file)
+    glider_file.write_bytes(b"short")
+
+    with pytest.raises(OSError):
+        b"".join(stream)
+
+
+def test_slow_send_fails_at_deadline(glider_file):
+    """Check a body still being sent after its time limit raises, and a new send starts a new limit."""
+    stream = MultipartFileStream(glider_file, chunk_size=4096, time_limit=0.05)
+    chunks = iter(stream)
+    next(chunks)
+    next(chunks)
+    time.sleep(0.1)
+
+    with pytest.raises(UploadDeadlineError):
+        next(chunks)
+    assert len(b"".join(stream)) == len(stream)
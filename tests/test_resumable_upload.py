@@ -0,0 +1,140 @@
+# pylint: disable=duplicate-code
+"""Tests for resumable uploads of Recovery mode files."""
+
+import hashlib
+import logging
+import os
+from pathlib import Path
+
+import pytest
+import requests
+
+from apds_pusher.config_parser import Configuration
+from apds_pusher.resumable_upload import UploadProgress, send_resumable_upload
+from apds_pusher.send_to_archive import send_to_archive_api
+
+
+@pytest.fixture(name="config")
+def config_fixture(tmp_path, archive_server):
+    """A configuration sending Recovery files of 1 KB or more in 1 KB parts to the stub archive."""
+    save_location = tmp_path / "save"
+    save_location.mkdir()
+    config = Configuration(
+        client_id="an_id",
+        auth0_tenant="a_tenant",
+        auth2_audience="an audience",
+        client_secret="a secret",
+        bodc_archive_url=archive_server.url,
+        file_formats=[".zip"],
+        archive_checker_frequency=1000,
+        save_file_location=save_location,
+        log_file_location=save_location,
+        resumable_upload_threshold=1024,
+        resumable_part_size=1024,
+        resumable_part_attempts=2,
+    )
+    config.create_deployment_location()
+    (config.deployment_location / "441.txt").write_text("1234.56")
+    return config
+
+
+@pytest.fixture(name="archive_file")
+def archive_file_fixture(tmp_path):
+    """A recovery archive which will be sent in 5 parts."""
+    archive_file = tmp_path / "deployment.zip"
+    archive_file.write_bytes(os.urandom(4 * 1024 + 100))
+    return archive_file
+
+
+def _part_requests(archive_server):
+    return [path for method, path in archive_server.requests if method == "PUT"]
+
+
+def test_large_recovery_file_sent_in_parts(config, archive_server, archive_file):
+    """Check a recovery file above the threshold is sent in parts and committed."""
+    digests = {}
+    result = send_to_archive_api(
+        archive_file,
+        "441",
+        "a_token",
+        archive_server.url,
+        "Recovery",
+        logging.getLogger("test"),
+        config,
+        digests=digests,
+    )
+
+    assert result == "Success"
+    assert digests == {archive_file: hashlib.sha256(archive_file.read_bytes()).hexdigest()}
+    assert len(_part_requests(archive_server)) == 5
+    assert archive_server.holdings["441"] == {"deployment.zip"}
+    assert not UploadProgress(config.save_file_location, archive_file.parent, "441").get(archive_file)
+
+
+def test_interrupted_upload_resumes_from_missing_part(config, archive_server, archive_file, mocker):
+    """Check an upload that loses its connection carries on from where it stopped."""
+    session = requests.Session()
+    real_put = session.put
+
+    def dropping_put(url, **kwargs):
+        if url.endswith("/parts/2"):
+            raise requests.exceptions.ConnectionError("link dropped")
+        return real_put(url, **kwargs)
+
+    mocker.patch.object(session, "put", side_effect=dropping_put)
+    archive_url = archive_server.url + "archiveRecovery/441"
+    with pytest.raises(requests.exceptions.ConnectionError):
+        send_resumable_upload(archive_file, archive_url, "441", "a_token", logging.getLogger("test"), config, session)
+
+    progress = UploadProgress(config.save_file_location, archive_file.parent, "441").get(archive_file)
+    assert progress["parts"] == [0, 1]
+
+    # A fresh session, as if the pusher had been restarted
+    archive_server.requests.clear()
+    send_resumable_upload(archive_file, archive_url, "441", "a_token", logging.getLogger("test"), config)
+
+    assert [Path(path).name for path in _part_requests(archive_server)] == ["2", "3", "4"]
+    assert archive_server.holdings["441"] == {"deployment.zip"}
+    assert not UploadProgress(config.save_file_location, archive_file.parent, "441").get(archive_file)
+
+
+def test_failed_part_is_retried(config, archive_server, archive_file):
+    """Check a server error on a part only resends that part."""
+    archive_url = archive_server.url + "archiveRecovery/441"
+    session = requests.Session()
+    real_put = session.put
+    failed = []
+
+    def failing_once_put(url, **kwargs):
+        if url.endswith("/parts/1") and not failed:
+            failed.append(url)
+            archive_server.fail_next.append(503)
+        return real_put(url, **kwargs)
+
+    session.put = failing_once_put
+    send_resumable_upload(archive_file, archive_url, "441", "a_token", logging.getLogger("test"), config, session)
+
+    assert [Path(path).name for path in _part_requests(archive_server)] == ["0", "1", "1", "2", "3", "4"]
+    assert archive_server.holdings["441"] == {"deployment.zip"}
+
+
+def test_expired_session_starts_again(config, archive_server, archive_file):
+    """Check an upload the archive no longer knows about is started from the first part."""
+    archive_url = archive_server.url + "archiveRecovery/441"
+    progress = UploadProgress(config.save_file_location, archive_file.parent, "441")
+    progress.start(archive_file, "an-expired-upload", 1024)
+    progress.add_part(archive_file, 0)
+
+    send_resumable_upload(archive_file, archive_url, "441", "a_token", logging.getLogger("test"), config)
+
+    assert len(_part_requests(archive_server)) == 5
+    assert archive_server.holdings["441"] == {"deployment.zip"}
+
+
+def test_changed_file_is_not_resumed(config, archive_file):
+    """Check progress is ignored once the file has been modified."""
+    progress = UploadProgress(config.save_file_location, archive_file.parent, "441")
+    progress.start(archive_file, "an-upload", 1024)
+    archive_file.write_bytes(b"new contents")
+
+    assert progress.get(archive_file) is None
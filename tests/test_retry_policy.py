@@ -0,0 +1,86 @@
+"""Tests for the retry policy."""
+
+import pytest
+import requests
+
+from apds_pusher.retry_policy import RetryPolicy
+from apds_pusher.send_to_archive import FileUploadError
+
+
+@pytest.fixture(name="delays")
+def delays_fixture():
+    """The delays a policy was asked to sleep for."""
+    return []
+
+
+@pytest.fixture(name="policy")
+def policy_fixture(delays):
+    """A policy retrying server errors, which records its delays rather than sleeping."""
+    return RetryPolicy(
+        max_attempts=4,
+        base_delay=1.0,
+        max_delay=3.0,
+        jitter=False,
+        retry_on=(ConnectionError, FileUploadError),
+        sleep=delays.append,
+    )
+
+
+def failing(*exceptions):
+    """A function raising the given exceptions in turn, then returning 'ok'."""
+    remaining = list(exceptions)
+    calls = []
+
+    def func(*args, **kwargs):
+        calls.append((args, kwargs))
+        if remaining:
+            raise remaining.pop(0)
+        return "ok"
+
+    return func, calls
+
+
+def test_retries_with_capped_exponential_backoff(policy, delays):
+    """Test delays double after each failed attempt up to the maximum delay."""
+    func, calls = failing(ConnectionError(), FileUploadError(status_code=503), ConnectionError())
+
+    assert policy.call(func, 1, key="value") == "ok"
+
+    assert calls == [((1,), {"key": "value"})] * 4
+    assert delays == [1.0, 2.0, 3.0]
+
+
+def test_gives_up_after_max_attempts(policy, delays):
+    """Test the last exception is raised once every attempt has failed."""
+    func, calls = failing(*[ConnectionError()] * 4)
+
+    with pytest.raises(ConnectionError):
+        policy.call(func)
+
+    assert len(calls) == 4
+    assert len(delays) == 3
+
+
+@pytest.mark.parametrize(
+    "exception",
+    [FileUploadError(status_code=400), ValueError(), requests.exceptions.HTTPError()],
+)
+def test_non_retryable_failures_are_raised_at_once(policy, delays, exception):
+    """Test exceptions of the wrong type, or with a status code not retried, are not retried."""
+    func, calls = failing(exception)
+
+    with pytest.raises(type(exception)):
+        policy.call(func)
+
+    assert len(calls) == 1
+    assert not delays
+
+
+def test_jitter_spreads_delays_below_the_backoff():
+    """Test jittered delays are random but never more than the backoff delay."""
+    policy = RetryPolicy(base_delay=2.0, max_delay=100.0, jitter=True)
+
+    delays = [policy.delay(3) for _ in range(200)]
+
+    assert all(0 <= delay <= 8.0 for delay in delays)
+    assert len(set(delays)) > 1
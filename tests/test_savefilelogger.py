@@ -1,8 +1,11 @@
 """Tests for the savefile logger."""
 
+import json
 import sys
 from pathlib import Path
 
+import pytest
+
 from apds_pusher import savefilelogger
 
 
@@ -24,7 +27,7 @@ def test_logfile_in_logfile_folder(tmp_path):
     instance.write_to_log_file("test")
 
     # Assert file has been created in the correct place (log folder)
-    assert Path(temporary_directory, "deployment-1234-log.out").is_file()
+    assert Path(temporary_directory, "deployment-1234-ledger.jsonl").is_file()
 
 
 def test_logfile_in_glider_folder(tmp_path):
@@ -46,7 +49,7 @@ def test_logfile_in_glider_folder(tmp_path):
     instance.write_to_log_file("test")
 
     # Assert file has been created
-    assert Path(temporary_glider_folder, "deployment-1234-log.out").is_file()
+    assert Path(temporary_glider_folder, "deployment-1234-ledger.jsonl").is_file()
 
 
 def test_filewrite(tmp_path):
@@ -67,6 +70,79 @@ def test_filewrite(tmp_path):
     instance.write_to_log_file(filename)
 
     # Assert file has been created
-    path_to_file = Path(temporary_log_folder, "deployment-1234-log.out")
+    path_to_file = Path(temporary_log_folder, "deployment-1234-ledger.jsonl")
     file_contents = path_to_file.read_text(encoding=sys.getdefaultencoding())
     assert filename in file_contents
+
+
+def test_ledger_is_appended_to_across_restarts(tmp_path):
+    """Check each record is a line of JSON, and a new logger appends to the ledger rather than replacing it."""
+    first = savefilelogger.FileLogger(tmp_path, tmp_path, "1234")
+    first.write_to_log_file("one.cac", status="uploaded", bytes=10, latency=0.5, attempts=1)
+    second = savefilelogger.FileLogger(tmp_path, tmp_path, "1234")
+    second.write_to_log_file("two.cac", status="uploaded", bytes=30, latency=0.5, attempts=2)
+
+    records = [json.loads(line) for line in second.file_path.read_text().splitlines()]
+    assert [record["path"] for record in records] == ["one.cac", "two.cac"]
+    assert records[1]["deployment_id"] == "1234"
+    assert records[1]["attempts"] == 2
+    assert "time" in records[1]
+
+
+def test_ledger_is_rotated(tmp_path):
+    """Check the ledger moves to numbered backups once it would grow past max_bytes, keeping only the newest."""
+    instance = savefilelogger.FileLogger(tmp_path, tmp_path, "1234", max_bytes=300, backups=2)
+    for number in range(20):
+        instance.write_to_log_file(f"file{number}.cac", status="uploaded")
+
+    backups = sorted(tmp_path.glob("deployment-1234-ledger.jsonl.*"))
+    assert [backup.name[-1] for backup in backups] == ["1", "2"]
+    assert all(path.stat().st_size <= 300 for path in [instance.file_path, *backups])
+    assert instance.tail(1)[0]["path"] == "file19.cac"
+    # No records are lost between the ledger and its latest backup
+    records = [json.loads(line) for line in backups[0].read_text().splitlines()] + instance.tail(20)
+    paths = [record["path"] for record in records]
+    assert paths == [f"file{number}.cac" for number in range(20 - len(paths), 20)]
+
+
+def test_tail_reads_the_last_records(tmp_path, monkeypatch):
+    """Check tail returns the last records, oldest first, however the blocks it reads split the ledger."""
+    monkeypatch.setattr(savefilelogger, "TAIL_BLOCK_SIZE", 37)
+    instance = savefilelogger.FileLogger(tmp_path, tmp_path, "1234", flush_interval=60)
+    for number in range(50):
+        instance.write_to_log_file(f"file{number}.cac")
+
+    assert [record["path"] for record in instance.tail(3)] == ["file47.cac", "file48.cac", "file49.cac"]
+    assert len(instance.tail(100)) == 50
+    assert instance.tail(0) == []
+    instance.close()
+
+
+def test_throughput_of_uploaded_records():
+    """Check only files sent are summarised, at the rate they were sent one after another."""
+    records = [
+        {"time": "2024-01-01T00:00:01.000+00:00", "status": "uploaded", "bytes": 100, "latency": 1.0},
+        {"time": "2024-01-01T00:00:02.000+00:00", "status": "uploaded", "bytes": 300, "latency": 1.0},
+        {"time": "2024-01-01T00:00:07.000+00:00", "status": "failed", "bytes": 1000, "latency": 5.0},
+    ]
+
+    assert savefilelogger.throughput(records) == {
+        "files": 2,
+        "bytes": 400,
+        "mean_latency": 1.0,
+        "bytes_per_second": 200.0,
+    }
+    assert savefilelogger.throughput([])["bytes_per_second"] == 0.0
+
+
+def test_throughput_of_overlapping_uploads_is_taken_over_the_time_they_took():
+    """Check uploads sent at the same time by several workers are not summarised as if sent one by one."""
+    records = [
+        {"time": f"2024-01-01T00:00:02.{number}00+00:00", "status": "uploaded", "bytes": 1000, "latency": 2.0}
+        for number in range(4)
+    ]
+
+    summary = savefilelogger.throughput(records)
+
+    assert summary["mean_latency"] == 2.0
+    assert summary["bytes_per_second"] == pytest.approx(4000 / 2.3)
@@ -0,0 +1,85 @@
+"""Tests for the deployment directory scanner."""
+
+import os
+from pathlib import Path
+
+import pytest
+
+from apds_pusher.scanner import compile_format_matcher, scan_deployment
+
+
+@pytest.fixture(name="deployment_dir")
+def deployment_dir_fixture(tmp_path):
+    """A deployment directory with glider files at the top level and in a sub-directory."""
+    deployment_dir = tmp_path / "gliders"
+    (deployment_dir / "sub" / "deeper").mkdir(parents=True)
+    for name in ["file1.cac", "file2.sbd", "notes.txt", "sub/file3.tbd", "sub/deeper/file4.cac", "sub/other.csv"]:
+        (deployment_dir / name).write_text(name)
+    # A directory named like a glider file is not a file to upload
+    (deployment_dir / "folder.cac").mkdir()
+    return deployment_dir
+
+
+@pytest.mark.parametrize(
+    "file_formats,name,expected",
+    [
+        ([".cac"], "file1.cac", True),
+        ([".cac"], "file1.cacx", False),
+        (["*.json", "*.csv"], "data.csv", True),
+        ([".sbd", ".tbd"], "data.tbd", True),
+        ([".sbd", ".tbd"], "data.sbd.bak", False),
+    ],
+)
+def test_format_matcher(file_formats, name, expected):
+    """Check a name is matched against all the formats at once."""
+    assert bool(compile_format_matcher(file_formats)(name)) is expected
+
+
+def test_non_recursive_scan(deployment_dir):
+    """Check only the top level is searched when not recursive."""
+    found = {scanned.path for scanned in scan_deployment(deployment_dir, [".cac", ".sbd", ".tbd"], False)}
+
+    assert found == {deployment_dir / "file1.cac", deployment_dir / "file2.sbd"}
+
+
+def test_recursive_scan_matches_glob(deployment_dir):
+    """Check a recursive scan finds the same files as a glob for each format."""
+    file_formats = [".cac", ".sbd", ".tbd"]
+    found = {scanned.path for scanned in scan_deployment(deployment_dir, file_formats, True)}
+
+    globbed = {path for fmt in file_formats for path in deployment_dir.glob(f"**/*{fmt}") if path.is_file()}
+    assert found == globbed
+    assert len(found) == 4
+
+
+def test_stat_results_are_returned(deployment_dir):
+    """Check each file comes with its stat result from the listing."""
+    for scanned in scan_deployment(deployment_dir, [".cac"], True):
+        assert scanned.stat.st_size == len(scanned.path.relative_to(deployment_dir).as_posix())
+
+
+def test_modified_after_filter(deployment_dir):
+    """Check only files modified after the given time are returned."""
+    for path in deployment_dir.rglob("*"):
+        os.utime(path, (1000, 1000))
+    os.utime(deployment_dir / "sub" / "file3.tbd", (3000, 3000))
+
+    found = [scanned.path for scanned in scan_deployment(deployment_dir, [".cac", ".tbd"], True, 2000)]
+
+    assert found == [Path(deployment_dir / "sub" / "file3.tbd")]
+
+
+def test_symlinks_are_found_with_their_targets_stat(deployment_dir, tmp_path):
+    """Check a linked file has its target's size and mtime, so it matches what was uploaded."""
+    target = tmp_path / "elsewhere.cac"
+    target.write_text("the target file")
+    os.utime(target, (3000, 3000))
+    (deployment_dir / "linked.cac").symlink_to(target)
+    (deployment_dir / "linked-folder.cac").symlink_to(deployment_dir / "sub", target_is_directory=True)
+    (deployment_dir / "broken.cac").symlink_to(tmp_path / "missing.cac")
+
+    found = {scanned.path.name: scanned.stat for scanned in scan_deployment(deployment_dir, [".cac"], False)}
+
+    assert set(found) == {"file1.cac", "linked.cac"}
+    assert found["linked.cac"].st_size == len("the target file")
+    assert found["linked.cac"].st_mtime == 3000
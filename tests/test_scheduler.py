@@ -0,0 +1,84 @@
+"""Tests for the ordering of uploads by priority rules."""
+
+import os
+
+import pytest
+
+from apds_pusher.scheduler import check_priority_rules, prioritise
+
+FORMATS = [".sbd", ".tbd", ".cac"]
+
+
+@pytest.fixture(name="files")
+def files_fixture(tmp_path):
+    """Glider files of varied formats, sizes and ages, by name."""
+    specs = {
+        "big_old.cac": (5000, 100),
+        "small_new.tbd": (10, 400),
+        "mid_mid.sbd": (500, 300),
+        "small_old.sbd": (10, 200),
+    }
+    files = {}
+    for name, (size, mtime) in specs.items():
+        file = tmp_path / name
+        file.write_bytes(b"x" * size)
+        os.utime(file, (mtime, mtime))
+        files[name] = file
+    return files
+
+
+def names(files):
+    """The names of the files, in order."""
+    return [file.name for file in files]
+
+
+def test_no_rules_keeps_scan_order(files):
+    """Check the files are left in the order found without any rules."""
+    assert prioritise(list(files.values()), (), FORMATS) == list(files.values())
+
+
+@pytest.mark.parametrize(
+    "rules, expected",
+    [
+        (["format"], ["mid_mid.sbd", "small_old.sbd", "small_new.tbd", "big_old.cac"]),
+        (["newest"], ["small_new.tbd", "mid_mid.sbd", "small_old.sbd", "big_old.cac"]),
+        (["smallest", "newest"], ["small_new.tbd", "small_old.sbd", "mid_mid.sbd", "big_old.cac"]),
+        (["format", "smallest"], ["small_old.sbd", "mid_mid.sbd", "small_new.tbd", "big_old.cac"]),
+    ],
+)
+def test_rules_order_files(files, rules, expected):
+    """Check files are ordered by the first rule, ties broken by the next."""
+    assert names(prioritise(list(files.values()), rules, FORMATS)) == expected
+
+
+def test_weighted_rule_sums_scaled_ranks(files):
+    """Check the weighted rule balances the other rules by their weights."""
+    ordered = prioritise(list(files.values()), ["weighted"], FORMATS, weights={"format": 0, "newest": 1, "smallest": 3})
+
+    assert names(ordered) == ["small_new.tbd", "small_old.sbd", "mid_mid.sbd", "big_old.cac"]
+
+
+def test_given_stats_are_used(files):
+    """Check the stat results from the scan are used rather than taken again."""
+    stats = {file: file.stat() for file in files.values()}
+    stats[files["big_old.cac"]] = os.stat_result((0, 0, 0, 0, 0, 0, 1, 0, 10_000, 0))
+
+    assert names(prioritise(list(files.values()), ["newest"], FORMATS, stats))[0] == "big_old.cac"
+
+
+def test_retried_files_come_first(files):
+    """Check files being retried are put before the others, each ordered by the rules."""
+    retried = {files["big_old.cac"], files["mid_mid.sbd"]}
+
+    ordered = prioritise(list(files.values()), ["smallest"], FORMATS, retried=retried)
+
+    assert names(ordered) == ["mid_mid.sbd", "big_old.cac", "small_new.tbd", "small_old.sbd"]
+
+
+def test_unknown_rules_are_refused():
+    """Check rules and weights which are not known are refused."""
+    check_priority_rules(["format", "weighted"], {"smallest": 2})
+    with pytest.raises(ValueError):
+        check_priority_rules(["largest"])
+    with pytest.raises(ValueError):
+        check_priority_rules(["weighted"], {"weighted": 1})
@@ -1,9 +1,22 @@
 """Tests for code which interacts with the API."""
 
+import socket
+import time
+
 import pytest
+import requests
 import responses
 
-from apds_pusher.send_to_archive import HoldingsAccessError, call_holdings_endpoint, return_existing_glider_files
+from apds_pusher.config_parser import Configuration
+from apds_pusher.multipart_stream import MultipartFileStream, UploadDeadlineError
+from apds_pusher.send_to_archive import (
+    AuthenticationError,
+    HoldingsAccessError,
+    call_holdings_endpoint,
+    probe_archive,
+    return_existing_glider_files,
+    send_to_archive_api,
+)
 
 valid_holdings_json = {
     "files": {
@@ -60,3 +73,101 @@ def test_set_is_constructed_from_json(valid_holdings_call):
     assert len(response) == 2
     assert response == {"ad21ffc1.cac", "4fca660c.cac"}
     assert isinstance(response, set)
+
+
+@responses.activate
+def test_file_is_streamed_to_archive(tmp_path, mocker):
+    """Check the upload is sent as a streamed multipart body with a known length."""
+    glider_file = tmp_path / "file1.sbd"
+    glider_file.write_bytes(b"glider data" * 1000)
+    responses.add(responses.POST, "https://submit-data.bodc.ac.uk/apds-archive-beta/archiveFile/441", status=200)
+    config = mocker.Mock(upload_chunk_size=1024)
+
+    result = send_to_archive_api(
+        glider_file,
+        "441",
+        "a_token",
+        "https://submit-data.bodc.ac.uk/apds-archive-beta/",
+        "NRT",
+        mocker.Mock(),
+        config,
+    )
+
+    assert result == "Success"
+    request = responses.calls[0].request
+    assert isinstance(request.body, MultipartFileStream)
+    assert request.headers["Content-Length"] == str(len(request.body))
+    assert request.headers["Content-Type"].startswith("multipart/form-data; boundary=")
+    assert request.headers["Authorization"] == "Bearer a_token"
+
+
+def test_probe_detects_refused_token_and_missing_endpoint(archive_server, mocker):
+    """Check the preflight probe reports auth and routing failures without sending a file."""
+    archive_server.access_token = "good"
+    logger = mocker.Mock()
+
+    probe_archive("441", "good", archive_server.url, "NRT", logger)
+    with pytest.raises(AuthenticationError):
+        probe_archive("441", "bad", archive_server.url, "Recovery", logger)
+    with pytest.raises(FileNotFoundError):
+        probe_archive("441", "good", archive_server.url + "wrong/", "NRT", logger)
+
+    assert [method for method, _ in archive_server.requests] == ["HEAD"] * 3
+    assert archive_server.bytes_received == 0
+
+
+def test_stalled_archive_fails_after_read_timeout(archive_server, tmp_path, mocker):
+    """Check an upload to an archive which stops answering fails after the read timeout."""
+    glider_file = tmp_path / "file1.sbd"
+    glider_file.write_bytes(b"glider data" * 1000)
+    config = Configuration(
+        client_id="an_id",
+        auth0_tenant="a_tenant",
+        auth2_audience="an audience",
+        client_secret="a secret",
+        bodc_archive_url=archive_server.url,
+        file_formats=[".sbd"],
+        archive_checker_frequency=1,
+        save_file_location=tmp_path,
+        log_file_location=tmp_path,
+        http_read_timeout=0.2,
+    )
+    archive_server.response_delay = 2.0
+
+    started = time.monotonic()
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        send_to_archive_api(glider_file, "441", "a_token", archive_server.url, "NRT", mocker.Mock(), config)
+
+    assert time.monotonic() - started < 1.0
+
+
+def test_upload_past_its_deadline_is_not_reported_as_a_connection_failure(archive_server, tmp_path, mocker):
+    """Check an upload too slow for its deadline raises its own error, not one retried as a transport failure."""
+    glider_file = tmp_path / "file1.sbd"
+    glider_file.write_bytes(b"glider data" * 100000)
+    config = mocker.Mock(upload_chunk_size=1024, http_timeout=(5, 5))
+    config.upload_deadline.return_value = 0.0
+
+    with pytest.raises(UploadDeadlineError) as exc_info:
+        send_to_archive_api(glider_file, "441", "a_token", archive_server.url, "NRT", mocker.Mock(), config)
+
+    assert not isinstance(exc_info.value, (OSError, requests.exceptions.RequestException))
+    assert not archive_server.holdings["441"]
+
+
+def test_truncated_upload_is_refused_by_the_stub_archive(archive_server):
+    """Check the stub archive does not hold a file whose upload stopped before all of it was sent."""
+    host, port = archive_server.server_address[:2]
+    body = b'--abc\r\nContent-Disposition: form-data; name="data"; filename="file1.sbd"\r\n\r\nglider'
+    with socket.create_connection((host, port)) as connection:
+        connection.sendall(
+            b"POST /archiveFile/441 HTTP/1.1\r\n"
+            b"Content-Type: multipart/form-data; boundary=abc\r\n"
+            + f"Content-Length: {len(body) + 1000}\r\n\r\n".encode()
+            + body
+        )
+        connection.shutdown(socket.SHUT_WR)
+        response = connection.makefile("rb").readline()
+
+    assert response.startswith(b"HTTP/1.1 400")
+    assert not archive_server.holdings["441"]
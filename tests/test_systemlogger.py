@@ -1,5 +1,6 @@
 """Tests for the system logger."""
 
+import logging
 import sys
 from pathlib import Path
 
@@ -174,3 +175,35 @@ def test_check_logging_critical(tmp_path, capfd, logging_instance):
     file_contents = path_to_file.read_text(encoding=sys.getdefaultencoding())
     assert "critical message from test" in file_contents
     assert "critical message from test" in captured_stdout
+
+
+class CountingMessage:
+    """A log message argument counting the times it is formatted."""
+
+    def __init__(self) -> None:
+        """Start with no formats counted."""
+        self.formatted = 0
+
+    def __str__(self) -> str:
+        """Count the format, returning the message."""
+        self.formatted += 1
+        return "an expensive message"
+
+
+def test_debug_messages_are_not_formatted_without_trace(logging_instance):
+    """Checks debug arguments are discarded before being formatted when trace is off."""
+    message = CountingMessage()
+
+    logging_instance.debug("debug message from test: %s", message)
+
+    assert not logging_instance.isEnabledFor(logging.DEBUG)
+    assert message.formatted == 0
+
+
+def test_debug_messages_are_formatted_with_trace(logging_instance_tracer):
+    """Checks debug arguments are formatted when trace is on."""
+    message = CountingMessage()
+
+    logging_instance_tracer.debug("debug message from test: %s", message)
+
+    assert message.formatted > 0
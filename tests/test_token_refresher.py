@@ -1,6 +1,13 @@
 # pylint: disable=duplicate-code
 """Test token refresher."""
 
+import base64
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
 import pytest
 import requests
 import responses
@@ -95,3 +102,72 @@ def test_get_access_token_from_refresh_token_exception(resp_body, expected, refr
         token_refresher.get_access_token_from_refresh_token(refresh_token, pusher_config)
 
     assert err.value.args[0] == expected
+
+
+def make_jwt(expires_at: float, lifetime: float = 3600) -> str:
+    """An unsigned JWT access token with the given expiry, issued lifetime seconds before it."""
+    claims = {"iat": expires_at - lifetime, "exp": expires_at}
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b"=").decode()
+    return f"header.{payload}.signature"
+
+
+def test_token_expiry_is_decoded():
+    """Check the expiry is read from a JWT, and left unknown for other tokens."""
+    assert token_refresher.token_expiry(make_jwt(1700000000)) == 1700000000
+    assert token_refresher.token_expiry("not-a-jwt") is None
+
+
+def test_expiring_token_is_refreshed_once_by_concurrent_callers():
+    """Check many threads finding the token expiring cause a single refresh."""
+    refresher = mock.Mock(side_effect=lambda _: (time.sleep(0.05), make_jwt(time.time() + 3600))[1])
+    tokens = token_refresher.TokenManager(make_jwt(time.time() + 10), "refresh", refresher, refresh_margin=60)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = set(executor.map(lambda _: tokens.get(), range(16)))
+
+    refresher.assert_called_once_with("refresh")
+    assert results == {tokens.access_token}
+    assert not tokens.is_expiring()
+
+
+def test_short_lived_token_is_refreshed_half_way_through_its_life():
+    """Check a token living no longer than the refresh margin is not refreshed as soon as it is issued."""
+    now = time.time()
+    tokens = token_refresher.TokenManager(make_jwt(now + 120, lifetime=120), "refresh", refresh_margin=300)
+    assert not tokens.is_expiring()
+
+    with mock.patch("time.time", return_value=now + 61):
+        assert tokens.is_expiring()
+
+    # Without an issue time the token is taken to be issued when it was received
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": now + 120}).encode()).rstrip(b"=").decode()
+    tokens.access_token = f"header.{payload}.signature"
+    assert not tokens.is_expiring()
+
+
+def test_refused_token_is_not_refreshed_twice():
+    """Check a refresh for a token already replaced returns the new token without a call."""
+    refresher = mock.Mock(return_value="new")
+    tokens = token_refresher.TokenManager("old", "refresh", refresher)
+
+    assert tokens.refresh("old") == "new"
+    assert tokens.refresh("old") == "new"
+    refresher.assert_called_once()
+
+
+def test_token_is_refreshed_in_the_background_before_expiry():
+    """Check the background thread replaces the token before it expires."""
+    refreshed = threading.Event()
+
+    def refresher(_):
+        refreshed.set()
+        return make_jwt(time.time() + 3600)
+
+    tokens = token_refresher.TokenManager(make_jwt(time.time() + 60.2), "refresh", refresher, refresh_margin=60)
+    tokens.start_background_refresh()
+    try:
+        assert refreshed.wait(5)
+    finally:
+        tokens.stop_background_refresh()
+
+    assert token_refresher.token_expiry(tokens.access_token) > time.time() + 3000
@@ -0,0 +1,172 @@
+"""Tests for the upload state store."""
+
+import hashlib
+import os
+import time
+
+import pytest
+
+from apds_pusher.upload_state import DEAD_LETTER, FAILED, HELD, UPLOADED, UploadStateStore
+
+
+@pytest.fixture(name="store")
+def store_fixture(tmp_path):
+    """An upload state store in a temporary save location."""
+    save_location = tmp_path / "save"
+    save_location.mkdir()
+    return UploadStateStore(save_location, tmp_path, "1234")
+
+
+@pytest.fixture(name="glider_file")
+def glider_file_fixture(tmp_path):
+    """A glider file to be recorded in the store."""
+    glider_file = tmp_path / "file1.sbd"
+    glider_file.write_bytes(b"glider data")
+    return glider_file
+
+
+def test_store_created_in_save_location(tmp_path, store):
+    """Check the database is created in the save file location."""
+    assert store.file_path == tmp_path / "save" / "deployment-1234-state.sqlite3"
+    assert store.file_path.is_file()
+
+
+def test_store_falls_back_to_the_deployment_location(tmp_path):
+    """Check the database is kept with the deployment if the save file location does not exist."""
+    store = UploadStateStore(tmp_path / "missing", tmp_path, "1234")
+
+    assert store.file_path == tmp_path / "deployment-1234-state.sqlite3"
+    store.close()
+
+
+def test_uploaded_file_is_recorded(store, glider_file):
+    """Check an uploaded file is stored with its size, hash, status and attempts."""
+    store.mark_uploaded(glider_file, "Success", 2)
+
+    record = store.get(glider_file)
+    assert record.status == UPLOADED
+    assert record.size == len(b"glider data")
+    assert record.sha256 == hashlib.sha256(b"glider data").hexdigest()
+    assert record.attempts == 2
+    assert record.response == "Success"
+    assert store.is_uploaded(glider_file)
+
+
+def test_file_is_recorded_as_it_was_scanned(store, glider_file):
+    """Check the stat result given is stored, so a file modified while it was sent is not treated as sent."""
+    scanned_stat = glider_file.stat()
+    glider_file.write_bytes(b"glider data written during the upload")
+    os.utime(glider_file, (scanned_stat.st_mtime + 10, scanned_stat.st_mtime + 10))
+
+    store.mark_uploaded(glider_file, "Success", 1, "a sha256", scanned_stat)
+
+    assert store.get(glider_file).size == len(b"glider data")
+    assert not store.is_uploaded(glider_file)
+
+
+def test_file_removed_after_it_was_sent(store, glider_file):
+    """Check a file removed before it could be hashed is taken off the spool without an error."""
+    store.enqueue([glider_file])
+    scanned_stat = glider_file.stat()
+    glider_file.unlink()
+
+    store.mark_uploaded(glider_file, "Success", 1, file_stat=scanned_stat)
+
+    assert store.get(glider_file) is None
+    assert not store.pending()
+
+
+def test_attempts_accumulate(store, glider_file):
+    """Check attempts from failed and later successful uploads are added together."""
+    store.mark_failed(glider_file, "FileUploadError()", 3)
+    assert store.get(glider_file).status == FAILED
+    assert not store.is_uploaded(glider_file)
+
+    store.mark_uploaded(glider_file, "Success", 1)
+    assert store.get(glider_file).attempts == 4
+
+
+def test_changed_file_is_not_uploaded(store, glider_file):
+    """Check a file modified since it was sent is no longer treated as uploaded."""
+    store.mark_held(glider_file)
+    assert store.get(glider_file).status == HELD
+    assert store.is_uploaded(glider_file)
+
+    glider_file.write_bytes(b"more glider data")
+    os.utime(glider_file, (1, 1))
+    assert not store.is_uploaded(glider_file)
+
+
+def test_state_persists_between_instances(tmp_path, store, glider_file):
+    """Check the state is still known after the pusher is restarted."""
+    store.mark_uploaded(glider_file, "Success", 1)
+    store.close()
+
+    reopened = UploadStateStore(tmp_path / "save", tmp_path, "1234")
+    assert reopened.is_uploaded(glider_file)
+
+
+def test_unknown_and_removed_files(store, tmp_path):
+    """Check files never seen are not uploaded, and removed files are ignored."""
+    missing_file = tmp_path / "missing.sbd"
+    assert store.get(missing_file) is None
+    store.mark_failed(missing_file, "FileNotFoundError()", 1)
+    assert store.get(missing_file) is None
+
+
+def test_spooled_files_leave_only_when_confirmed(tmp_path, store, glider_file):
+    """Check spooled files stay queued after failures and across restarts, until sent or held."""
+    other_file = tmp_path / "file2.sbd"
+    other_file.write_bytes(b"more glider data")
+    store.enqueue([glider_file, other_file])
+    store.enqueue([glider_file])
+    assert store.pending() == [glider_file, other_file]
+
+    store.mark_failed(glider_file, "FileUploadError()", 3)
+    store.mark_held(other_file)
+    store.close()
+
+    reopened = UploadStateStore(tmp_path / "save", tmp_path, "1234")
+    assert reopened.pending() == [glider_file]
+    reopened.mark_uploaded(glider_file, "Success", 1)
+    assert not reopened.pending()
+
+
+def test_markers_persist_between_instances(tmp_path, store):
+    """Check markers are stored and read back after a restart."""
+    assert store.get_marker("last_spooled_scan") is None
+    store.set_marker("last_spooled_scan", 1234.5)
+    store.close()
+
+    assert UploadStateStore(tmp_path / "save", tmp_path, "1234").get_marker("last_spooled_scan") == 1234.5
+
+
+def test_failed_files_wait_for_their_retry_time(tmp_path, store, glider_file):
+    """Check a failed file is held back until it is due, then sent ahead of newer files."""
+    other_file = tmp_path / "file2.sbd"
+    other_file.write_bytes(b"more glider data")
+    store.enqueue([glider_file])
+    store.enqueue([other_file])
+
+    store.mark_failed(glider_file, "FileUploadError()", 3, retry_at=2000.0)
+    assert store.spooled_failures(glider_file) == 1
+    assert store.retried() == {glider_file}
+    assert store.pending(now=1000.0) == [other_file]
+    assert store.pending(now=2000.0) == [glider_file, other_file]
+
+    store.mark_failed(glider_file, "CircuitOpenError()", 1)
+    assert store.spooled_failures(glider_file) == 1
+
+    store.mark_failed(glider_file, "FileUploadError()", 3, retry_at=time.time() + 3600)
+    assert store.enqueue([glider_file, other_file]) == [other_file]
+
+
+def test_dead_lettered_file_leaves_the_spool(store, glider_file):
+    """Check a dead-lettered file is no longer spooled and is listed with its last response."""
+    store.enqueue([glider_file])
+    store.mark_dead_letter(glider_file, "FileUploadError()", 3)
+
+    assert not store.pending()
+    (record,) = store.dead_letters()
+    assert (record.path, record.status, record.response) == (str(glider_file), DEAD_LETTER, "FileUploadError()")
+    assert not store.is_uploaded(glider_file)